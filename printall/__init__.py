@@ -0,0 +1,4 @@
+# printall/__init__.py
+"""PrintALL 全能打印助手的处理引擎 (与 Tk 界面无关的部分)"""
+
+__version__ = "0.1.0"
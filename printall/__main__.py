@@ -0,0 +1,11 @@
+# printall/__main__.py
+"""python -m printall: 命令行入口"""
+import sys
+import multiprocessing
+
+from .cli import main
+
+if __name__ == "__main__":
+    # 打包后的程序在 Windows 上启动工作进程需要此调用
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,440 @@
+# printall/bigimage.py
+"""
+超大图片 (如 300~600 DPI 的 A0 扫描件) 的分带处理。
+
+整张解码一张 A0 扫描件要占用几个 GB 内存, 可能在批量处理中途耗尽内存。像素数超过
+阈值的图片改为按水平带处理, 内存占用只与图片宽度和内存预算有关:
+
+- PNG (8 位, 非隔行): IDAT 数据流式解压、按行处理, 改写时其余行的数据原样重新压缩。
+  PNG 的行过滤依赖上一行, 需要还原像素的行按批拼成内存中的小 PNG 交给 Pillow 解码
+  (以上一行的像素作为不过滤的第一行), 每批的行数由内存预算决定;
+- BMP (未压缩 24/32 位): 按偏移直接读写需要的行;
+- JPEG: 读取时用 DCT 缩放解码 (draft) 得到缩小的图片; 重新编码只能整张进行,
+  由调用方按内存预算决定能否处理。
+
+Pillow 默认拒绝打开超过约 1.8 亿像素的图片 (防解压炸弹), 这里改由内存预算控制。
+"""
+import io
+import os
+import math
+import zlib
+import struct
+import logging
+import threading
+from typing import NamedTuple
+
+from .config import LOGGER_NAME, LARGE_IMAGE_MEGAPIXELS, LARGE_IMAGE_MEMORY_MB
+
+logger = logging.getLogger(LOGGER_NAME)
+
+# 可以分带处理的格式
+BANDED_FORMATS = ("PNG", "BMP")
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# PNG 颜色类型 -> (Pillow 模式, 每像素字节数), 只处理 8 位
+_PNG_COLOR_TYPES = {0: ("L", 1), 2: ("RGB", 3), 3: ("P", 1), 4: ("LA", 2), 6: ("RGBA", 4)}
+# 还原像素时需要随小 PNG 一起提供的辅助块
+_PNG_DECODE_CHUNKS = (b"PLTE", b"tRNS")
+# BMP 原始格式 -> Pillow 模式
+_BMP_RAWMODES = {"BGR": "RGB", "BGRX": "RGB", "BGRA": "RGBA"}
+
+_IO_CHUNK = 1024 * 1024
+# 每批最多处理这么多数据: 预算再大, 带也不必更高, 分批的开销已经可以忽略
+_MAX_BATCH_BYTES = 64 * 1024 * 1024
+_IDAT_CHUNK = 1024 * 1024
+# PNG 行过滤类型: 0 (None) 和 1 (Sub) 不依赖上一行
+_INDEPENDENT_FILTERS = (0, 1)
+
+_pixel_limit_lock = threading.Lock()
+
+
+class BandedImageError(Exception):
+    """图片结构不支持分带处理 (如隔行 PNG、16 位 PNG、压缩的 BMP)"""
+
+
+class ImageTooLargeError(Exception):
+    """图片不能分带处理, 整张解码又会超过内存预算"""
+
+
+class LargeImageLimits(NamedTuple):
+    megapixels: float = LARGE_IMAGE_MEGAPIXELS  # 超过此像素数 (百万) 的图片分带处理
+    memory_mb: int = LARGE_IMAGE_MEMORY_MB      # 处理一张大图片时的内存预算 (MB)
+
+    @property
+    def memory_bytes(self):
+        return self.memory_mb * 1024 * 1024
+
+    def is_large(self, size):
+        return size[0] * size[1] > self.megapixels * 1_000_000
+
+
+def open_image(path):
+    """Image.open, 但不受 Pillow 的像素数上限限制 (大图片由内存预算控制)"""
+    from PIL import Image
+
+    with _pixel_limit_lock:
+        limit = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            return Image.open(path)
+        finally:
+            Image.MAX_IMAGE_PIXELS = limit
+
+
+def decoded_bytes(size):
+    """整张解码后占用的内存 (Pillow 的 RGB 图片每像素 4 字节)"""
+    return size[0] * size[1] * 4
+
+
+def _rows_for(width, bytes_per_pixel, memory_bytes, multiple=1):
+    """内存预算内一批可以处理的行数, 取 multiple 的整数倍 (至少 multiple 行)"""
+    rows = int(min(memory_bytes, _MAX_BATCH_BYTES) // max(1, width * bytes_per_pixel))
+    return max(multiple, rows // multiple * multiple)
+
+
+# --- PNG ---
+
+def _write_chunk(f, chunk_type, data):
+    f.write(struct.pack(">I", len(data)) + chunk_type + data)
+    f.write(struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF))
+
+
+class _PngReader:
+    """按顺序读取 PNG: 文件头的各块、按行解压的 IDAT 数据、IDAT 之后的块"""
+
+    def __init__(self, f):
+        self._f = f
+        if f.read(8) != _PNG_SIGNATURE:
+            raise BandedImageError("不是 PNG 文件")
+        self.header_chunks = []   # IDAT 之前的块 [(类型, 数据)]
+        self.trailing_chunks = []  # IDAT 之后的块
+        while True:
+            length, chunk_type = self._chunk_header()
+            if chunk_type == b"IDAT":
+                self._idat_left = length
+                break
+            self.header_chunks.append((chunk_type, self._chunk_data(length)))
+        ihdr = dict(self.header_chunks).get(b"IHDR")
+        if ihdr is None:
+            raise BandedImageError("PNG 缺少 IHDR")
+        self.width, self.height, bit_depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", ihdr)
+        if bit_depth != 8 or color_type not in _PNG_COLOR_TYPES or interlace:
+            raise BandedImageError(f"不支持分带处理的 PNG (位深 {bit_depth}, 颜色类型 {color_type}, 隔行 {interlace})")
+        self.mode, self.channels = _PNG_COLOR_TYPES[color_type]
+        self.stride = self.width * self.channels
+
+    def _chunk_header(self):
+        header = self._f.read(8)
+        if len(header) < 8:
+            raise BandedImageError("PNG 文件不完整")
+        return struct.unpack(">I4s", header)
+
+    def _chunk_data(self, length):
+        data = self._f.read(length)
+        self._f.read(4)  # CRC
+        return data
+
+    def _idat_pieces(self):
+        while True:
+            while self._idat_left:
+                piece = self._f.read(min(self._idat_left, _IO_CHUNK))
+                if not piece:
+                    raise BandedImageError("PNG 文件不完整")
+                self._idat_left -= len(piece)
+                yield piece
+            self._f.read(4)  # CRC
+            length, chunk_type = self._chunk_header()
+            if chunk_type != b"IDAT":
+                break
+            self._idat_left = length
+        # IDAT 之后的块都很小, 读入内存原样写回
+        while True:
+            self.trailing_chunks.append((chunk_type, self._chunk_data(length)))
+            if chunk_type == b"IEND":
+                return
+            length, chunk_type = self._chunk_header()
+
+    def rows(self):
+        """逐行产出解压后的数据 (第一个字节为过滤类型), 不还原像素"""
+        row_length = 1 + self.stride
+        inflater = zlib.decompressobj()
+        buffer = bytearray()
+        emitted = 0
+        for piece in self._idat_pieces():
+            data = inflater.decompress(piece, _IO_CHUNK)
+            while True:
+                buffer += data
+                while len(buffer) >= row_length and emitted < self.height:
+                    yield bytes(buffer[:row_length])
+                    del buffer[:row_length]
+                    emitted += 1
+                if not inflater.unconsumed_tail:
+                    break
+                # 压缩率很高的数据分段解压, 解压出的数据不会一次占用大量内存
+                data = inflater.decompress(inflater.unconsumed_tail, _IO_CHUNK)
+        if emitted < self.height:
+            raise BandedImageError(f"PNG 图像数据不完整 ({emitted}/{self.height} 行)")
+
+    def decode(self, seed, rows):
+        """
+        把已过滤的 rows 还原为图片; seed 为上一行的像素数据 (原始字节), 第一行不依赖上一行时为 None。
+        """
+        if seed is not None:
+            rows = [b"\x00" + seed] + rows
+        buffer = io.BytesIO()
+        buffer.write(_PNG_SIGNATURE)
+        ihdr = dict(self.header_chunks)[b"IHDR"]
+        _write_chunk(buffer, b"IHDR", struct.pack(">II", self.width, len(rows)) + ihdr[8:])
+        for chunk_type, data in self.header_chunks:
+            if chunk_type in _PNG_DECODE_CHUNKS:
+                _write_chunk(buffer, chunk_type, data)
+        # 不压缩 (level 0) 只是加上 zlib 的块头, 几乎不耗时
+        _write_chunk(buffer, b"IDAT", zlib.compress(b"".join(rows), 0))
+        _write_chunk(buffer, b"IEND", b"")
+        buffer.seek(0)
+        image = open_image(buffer)
+        image.load()
+        if seed is not None:
+            image = image.crop((0, 1, self.width, len(rows)))
+        return image
+
+    def last_row(self, image):
+        """图片最后一行的原始字节, 作为下一批的 seed"""
+        return image.crop((0, image.height - 1, image.width, image.height)).tobytes()
+
+
+class _IdatWriter:
+    """把未过滤前的行数据重新压缩, 写成一系列 IDAT 块"""
+
+    def __init__(self, f):
+        self._f = f
+        self._deflater = zlib.compressobj(6)
+        self._pending = bytearray()
+
+    def write(self, row):
+        self._pending += self._deflater.compress(row)
+        if len(self._pending) >= _IDAT_CHUNK:
+            _write_chunk(self._f, b"IDAT", bytes(self._pending))
+            self._pending.clear()
+
+    def close(self):
+        self._pending += self._deflater.flush()
+        _write_chunk(self._f, b"IDAT", bytes(self._pending))
+        self._pending.clear()
+
+
+def _png_bands(path, memory_bytes, multiple):
+    with open(path, "rb") as f:
+        reader = _PngReader(f)
+        # 一批行的压缩前数据、小 PNG 和解码后的图片各占一份
+        batch = _rows_for(reader.width, reader.channels + 8, memory_bytes, multiple)
+        seed, rows, top = None, [], 0
+        for row in reader.rows():
+            rows.append(row)
+            if len(rows) == batch:
+                image = reader.decode(seed, rows)
+                seed = reader.last_row(image)
+                yield top, image
+                top += len(rows)
+                rows = []
+        if rows:
+            yield top, reader.decode(seed, rows)
+
+
+def _rewrite_png_band(path, top, bottom, edit, memory_bytes):
+    temp_path = path + ".band.tmp"
+    try:
+        with open(path, "rb") as src, open(temp_path, "wb") as dst:
+            reader = _PngReader(src)
+            if reader.mode == "P":
+                raise BandedImageError("调色板 PNG 不能在原调色板上混合水印")
+            dst.write(_PNG_SIGNATURE)
+            for chunk_type, data in reader.header_chunks:
+                _write_chunk(dst, chunk_type, data)
+            writer = _IdatWriter(dst)
+            batch = _rows_for(reader.width, reader.channels + 8, memory_bytes)
+            # 改写带之前的行原样写出; 只记下从最近一个不依赖上一行的行开始的数据,
+            # 用来还原带的第一行所依赖的像素
+            seed, pending, band = None, [], []
+            # 带之后的第一行如果依赖上一行, 也要还原后以不过滤的形式重新写出
+            last = min(bottom, reader.height - 1)
+            for y, row in enumerate(reader.rows()):
+                if y < top:
+                    writer.write(row)
+                    if row[0] in _INDEPENDENT_FILTERS:
+                        seed, pending = None, [row]
+                    else:
+                        pending.append(row)
+                    if len(pending) >= batch:
+                        seed = reader.last_row(reader.decode(seed, pending))
+                        pending = []
+                    continue
+                if y > last:
+                    writer.write(row)
+                    continue
+                band.append(row)
+                if y < last:
+                    continue
+                image = reader.decode(seed, pending + band)
+                first = len(pending)
+                edited = edit(image.crop((0, first, reader.width, first + bottom - top)))
+                if edited.mode != reader.mode:
+                    edited = edited.convert(reader.mode)
+                data = edited.tobytes()
+                if last == bottom:
+                    data += reader.last_row(image)
+                for offset in range(0, len(data), reader.stride):
+                    writer.write(b"\x00" + data[offset:offset + reader.stride])
+                pending = band = None
+            writer.close()
+            for chunk_type, data in reader.trailing_chunks:
+                _write_chunk(dst, chunk_type, data)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+# --- BMP ---
+
+def _bmp_layout(path):
+    """返回 (宽, 高, 像素数据偏移, 原始格式, 每行字节数, 行方向), 不支持时抛出 BandedImageError"""
+    with open_image(path) as image:
+        if image.format != "BMP" or len(image.tile) != 1 or image.tile[0][0] != "raw":
+            raise BandedImageError("不是未压缩的 BMP")
+        tile = image.tile[0]
+        rawmode, stride, orientation = tile[3]
+        if rawmode not in _BMP_RAWMODES:
+            raise BandedImageError(f"不支持分带处理的 BMP 格式: {rawmode}")
+        return image.width, image.height, tile[2], rawmode, stride, orientation
+
+
+def _bmp_block(width, height, offset, stride, orientation, top, count):
+    """[top, top + count) 行在文件中的起始偏移 (自下而上存储时这些行在文件中倒序连续存放)"""
+    first = height - top - count if orientation < 0 else top
+    return offset + first * stride, count * stride
+
+
+def _read_bmp_rows(f, layout, top, count, rawmode=None):
+    from PIL import Image
+
+    width, height, offset, file_rawmode, stride, orientation = layout
+    rawmode = rawmode or file_rawmode
+    start, length = _bmp_block(width, height, offset, stride, orientation, top, count)
+    f.seek(start)
+    data = f.read(length)
+    mode = "RGBA" if rawmode == "BGRA" else "RGB"
+    return Image.frombytes(mode, (width, count), data, "raw", rawmode, stride, orientation)
+
+
+def _bmp_bands(path, memory_bytes, multiple):
+    layout = _bmp_layout(path)
+    width, height = layout[:2]
+    batch = _rows_for(width, 8, memory_bytes, multiple)
+    with open(path, "rb") as f:
+        for top in range(0, height, batch):
+            yield top, _read_bmp_rows(f, layout, top, min(batch, height - top))
+
+
+def _rewrite_bmp_band(path, top, bottom, edit, memory_bytes):
+    from PIL import Image
+
+    layout = _bmp_layout(path)
+    width, height, offset, rawmode, stride, orientation = layout
+    with open(path, "r+b") as f:
+        band = _read_bmp_rows(f, layout, top, bottom - top)
+        edited = edit(band)
+        if edited.mode != band.mode:
+            edited = edited.convert(band.mode)
+        if rawmode == "BGRX":
+            # 第 4 个字节原样保留 (有的软件把它当作透明度)
+            extra = _read_bmp_rows(f, layout, top, bottom - top, rawmode="BGRA").getchannel("A")
+            edited = Image.merge("RGBA", (*edited.split(), extra))
+            rawmode = "BGRA"
+        start, _ = _bmp_block(width, height, offset, stride, orientation, top, bottom - top)
+        f.seek(start)
+        f.write(edited.tobytes("raw", rawmode, stride, orientation))
+
+
+# --- 对外接口 ---
+
+def iter_bands(path, memory_bytes, multiple=1):
+    """
+    按水平带从上到下读取图片, 产出 (带的第一行, 图片), 每批的内存不超过 memory_bytes。
+    除最后一带外, 每带的行数都是 multiple 的整数倍。不支持分带读取时抛出 BandedImageError。
+    """
+    with open_image(path) as image:
+        image_format = image.format
+    if image_format == "PNG":
+        return _png_bands(path, memory_bytes, multiple)
+    if image_format == "BMP":
+        return _bmp_bands(path, memory_bytes, multiple)
+    raise BandedImageError(f"不支持分带读取的格式: {image_format}")
+
+
+def rewrite_band(path, top, bottom, edit, memory_bytes):
+    """
+    只改写图片的 [top, bottom) 行: edit(带) 返回改好的同样大小的图片。
+    PNG 写入临时文件后替换原文件, BMP 在原文件中直接改写这些行。
+    不支持时抛出 BandedImageError (此时文件没有被改动)。
+    """
+    with open_image(path) as image:
+        image_format, height = image.format, image.height
+    top, bottom = max(0, top), min(height, bottom)
+    if top >= bottom:
+        return
+    if image_format == "PNG":
+        _rewrite_png_band(path, top, bottom, edit, memory_bytes)
+    elif image_format == "BMP":
+        _rewrite_bmp_band(path, top, bottom, edit, memory_bytes)
+    else:
+        raise BandedImageError(f"不支持分带改写的格式: {image_format}")
+
+
+def reduced_image(path, min_size, memory_bytes):
+    """
+    返回缩小后的图片, 尺寸不小于 min_size (不超过原图), 不整张解码原图:
+    JPEG 用 DCT 缩放解码, PNG/BMP 分带读取后按整数倍缩小再拼接;
+    其他图片整张解码不超过内存预算时整张解码后缩小, 否则抛出 ImageTooLargeError。
+    """
+    with open_image(path) as image:
+        width, height = image.size
+        if image.format == "JPEG":
+            image.draft("RGB", (min_size[0], min_size[1]))
+            image.load()
+            return image if image.mode in ("RGB", "L") else image.convert("RGB")
+    factor = max(1, min(width // max(1, min_size[0]), height // max(1, min_size[1])))
+    try:
+        return _reduce_in_bands(path, (width, height), factor, memory_bytes)
+    except BandedImageError as e:
+        needed = decoded_bytes((width, height))
+        if needed > memory_bytes:
+            raise ImageTooLargeError(
+                f"{width}x{height} 的图片不能分带读取 ({e}), 整张解码约需 {needed / 1024 / 1024:.0f} MB,"
+                f" 超过大图片内存预算 {memory_bytes / 1024 / 1024:.0f} MB"
+            )
+        logger.info(f"图片不能分带读取, 整张解码后缩小: {path} ({e})")
+    with open_image(path) as image:
+        image = _reducible(image)
+        return image.reduce(factor)
+
+
+def _reducible(image):
+    if image.mode in ("L", "LA", "RGB", "RGBA"):
+        return image
+    return image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+
+def _reduce_in_bands(path, size, factor, memory_bytes):
+    from PIL import Image
+
+    result = None
+    # 每带的行数是缩小倍数的整数倍, 各带缩小后拼接时没有接缝
+    for top, band in iter_bands(path, memory_bytes, multiple=factor):
+        band = _reducible(band)
+        if result is None:
+            result = Image.new(band.mode, (math.ceil(size[0] / factor), math.ceil(size[1] / factor)))
+        elif band.mode != result.mode:
+            band = band.convert(result.mode)
+        result.paste(band.reduce(factor), (0, top // factor))
+    return result
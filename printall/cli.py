@@ -0,0 +1,379 @@
+# printall/cli.py
+"""
+命令行入口, 不需要 Tk, 可以在无界面的服务器或任务调度器中运行:
+
+    printall watermark <文件夹> --types pdf,docx --workers 8
+    printall print <文件夹> --printer X --pages 1-2
+    printall print --resume        (继续上次中断的任务, 只处理未完成的文件)
+
+处理日志输出到 stderr, 结束时向 stdout 输出一行 JSON 汇总。
+退出码: 0 全部成功; 1 有文件处理失败; 2 参数错误; 3 环境问题 (文件夹、打印机、LibreOffice 等)。
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+
+from .config import LIBREOFFICE_PATH, LOGGER_NAME, LARGE_IMAGE_MEGAPIXELS, LARGE_IMAGE_MEMORY_MB
+
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_USAGE = 2
+EXIT_SETUP = 3
+
+# 命令行中的类型名 -> 水印类型
+WATERMARK_TYPE_ALIASES = {
+    "word": "word", "docx": "word",
+    "excel": "excel", "xlsx": "excel",
+    "pdf": "pdf",
+    "pic": "pic", "image": "pic", "jpg": "pic", "jpeg": "pic", "png": "pic", "bmp": "pic",
+}
+
+# 命令行中的类型名 -> 打印扩展名
+PRINT_TYPE_ALIASES = {
+    "doc": ("doc",), "docx": ("docx",), "word": ("doc", "docx"),
+    "pdf": ("pdf",),
+    "jpg": ("jpg",), "png": ("png",), "bmp": ("bmp",), "image": ("jpg", "png", "bmp"),
+}
+
+
+def _parse_types(value, aliases):
+    parsed = []
+    for name in value.split(","):
+        name = name.strip().lower().lstrip(".")
+        if not name:
+            continue
+        if name not in aliases:
+            raise argparse.ArgumentTypeError(
+                f"未知的文件类型: {name} (可选: {', '.join(sorted(aliases))})"
+            )
+        target = aliases[name]
+        for item in target if isinstance(target, tuple) else (target,):
+            if item not in parsed:
+                parsed.append(item)
+    if not parsed:
+        raise argparse.ArgumentTypeError("至少需要一种文件类型")
+    return parsed
+
+
+def _parse_page_range(value):
+    try:
+        low, _, high = value.partition("-")
+        low = int(low)
+        high = int(high) if high else low
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"页数范围格式应为 N 或 N-M: {value}")
+    if low < 0 or high < low:
+        raise argparse.ArgumentTypeError(f"无效的页数范围: {value}")
+    return low, high
+
+
+def build_parser():
+    from .watermark import PIC_POSITIONS, PDF_SAVE_MODE_LABELS, WatermarkOptions
+    from .printing import PrintOptions
+    from .impose import LAYOUT_NAMES
+
+    parser = argparse.ArgumentParser(prog="printall", description="PrintALL 批量水印与打印 (命令行)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="在 stderr 输出详细日志")
+    parser.add_argument("-q", "--quiet", action="store_true", help="不输出逐个文件的处理日志")
+    parser.add_argument(
+        "--metrics-dir", default=None,
+        help="把每个文件各阶段的耗时写入此目录 (JSON、CSV 和 Prometheus 文本格式)",
+    )
+    parser.add_argument(
+        "--journal-dir", default=None,
+        help="任务日志 (用于继续中断的任务) 所在的目录 (默认在用户数据目录中)",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    wm = subparsers.add_parser("watermark", help="批量添加水印 (直接修改原文件)")
+    wm.add_argument("folder", nargs="?")
+    _add_resume_argument(wm)
+    wm.add_argument(
+        "--types",
+        type=lambda v: _parse_types(v, WATERMARK_TYPE_ALIASES),
+        default=["word", "excel", "pic", "pdf"],
+        help="逗号分隔: word/docx, excel/xlsx, pdf, pic/jpg/png/bmp (默认全部)",
+    )
+    wm.add_argument("--workers", type=int, default=None, help="并行进程数 (默认等于 CPU 核心数)")
+    wm.add_argument("--opacity", type=int, default=WatermarkOptions.opacity, help="图片水印透明度 0-255")
+    wm.add_argument("--position", choices=PIC_POSITIONS, default=WatermarkOptions.position, help="图片水印位置")
+    wm.add_argument("--no-incremental", dest="incremental", action="store_false", help="不跳过上次处理后未变更的文件")
+    wm.add_argument("--pdf-save-mode", choices=list(PDF_SAVE_MODE_LABELS), default=WatermarkOptions.pdf_save_mode)
+    wm.add_argument("--pdf-incremental-min-mb", type=int, default=WatermarkOptions.pdf_incremental_min_mb)
+    wm.add_argument(
+        "--no-excel-streaming", dest="excel_streaming", action="store_false",
+        help="用 openpyxl 加载整个工作簿处理 .xlsx (默认直接修改其中的 XML)",
+    )
+    wm.add_argument(
+        "--no-word-streaming", dest="word_streaming", action="store_false",
+        help="用 python-docx 读写整个文档处理 .docx (默认只修改其中的页眉部件)",
+    )
+
+    _add_large_image_arguments(wm)
+
+    pr = subparsers.add_parser("print", help="批量打印")
+    pr.add_argument("folder", nargs="?")
+    _add_resume_argument(pr)
+    pr.add_argument("--printer", default=None, help="打印机名称 (默认使用系统默认打印机)")
+    pr.add_argument(
+        "--types",
+        type=lambda v: _parse_types(v, PRINT_TYPE_ALIASES),
+        default=None,
+        help="逗号分隔: doc, docx, pdf, jpg, png, bmp (默认全部)",
+    )
+    pr.add_argument("-r", "--recursive", action="store_true", help="包含子文件夹 (按相对路径的自然顺序打印)")
+    pr.add_argument("--pages", type=_parse_page_range, default=None, help="只打印页数在范围内的 Word/PDF, 如 1-2")
+    pr.add_argument("--estimate-pages", action="store_true", help="页数筛选时允许估算 .docx 页数 (更快, 可能不准)")
+    pr.add_argument("--margin", type=int, default=100, help="图片页边距 (300 DPI 下的像素)")
+    pr.add_argument(
+        "--prepare-workers", type=int, default=PrintOptions.prepare_workers,
+        help="合并图片、页数检查和转换的并行线程数 (与打印同时进行, 默认等于 CPU 核心数)",
+    )
+    pr.add_argument(
+        "--office-workers", type=int, default=PrintOptions.office_workers,
+        help="Word 页数检查和转换同时使用的 LibreOffice 实例数 (默认 CPU 核心数的一半, 最多 8 个)",
+    )
+    pr.add_argument(
+        "--layout", default=PrintOptions.layout, choices=LAYOUT_NAMES,
+        help="拼版: 1up 不拼版; 2up / 4up 每张纸两页/四页; booklet 小册子 (需双面短边翻转)",
+    )
+    pr.add_argument("--pack", action="store_true", help="2up/4up 时把多个短文档连续排在同一批纸上, 以文件名分隔")
+    pr.add_argument(
+        "--backend", default=PrintOptions.backend,
+        help="打印后端: auto / cups / ipp / win32-gdi / win32-raw / office / file:<目录> (测试用, 只保存PDF);"
+             " office 只打印 Word 原始文档, PDF 仍由系统打印后端提交",
+    )
+    pr.add_argument("--soffice", default=LIBREOFFICE_PATH, help="LibreOffice soffice 可执行文件路径")
+    _add_large_image_arguments(pr)
+    return parser
+
+
+def _add_resume_argument(parser):
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="继续上次中断的任务: 使用上次的文件夹和参数, 只处理没有完成 (包括失败) 的文件",
+    )
+
+
+def _add_large_image_arguments(parser):
+    parser.add_argument(
+        "--large-image-mp", dest="large_image_megapixels", type=float, default=LARGE_IMAGE_MEGAPIXELS,
+        help="像素数超过此值 (百万) 的图片分带处理, 不整张解码",
+    )
+    parser.add_argument(
+        "--large-image-memory-mb", dest="large_image_memory_mb", type=int, default=LARGE_IMAGE_MEMORY_MB,
+        help="处理一张大图片的内存预算 (MB), 无法在预算内处理的图片记为失败",
+    )
+
+
+def _setup_logging(verbose):
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    app_logger = logging.getLogger(LOGGER_NAME)
+    app_logger.handlers.clear()
+    app_logger.addHandler(handler)
+    app_logger.setLevel(logging.INFO if verbose else logging.WARNING)
+    app_logger.propagate = False
+
+
+def _emit(summary):
+    # 非 ASCII 字符转义输出, 不受控制台/管道编码影响
+    sys.stdout.write(json.dumps(summary) + "\n")
+    sys.stdout.flush()
+
+
+def _export_metrics(run_metrics, directory, log):
+    if not directory:
+        return
+    try:
+        paths = run_metrics.export(directory)
+    except OSError as e:
+        log(f"❌ 无法写入耗时统计: {e}")
+        return
+    log(f"耗时统计已写入: {', '.join(paths)}")
+
+
+def missing_watermark_dependencies(kinds, options):
+    """
+    返回因缺少依赖而无法处理的类型及原因 (与界面中禁用的选项一致)。
+    Word/Excel 默认直接修改压缩包中的 XML, 只有关闭流式处理时才需要 python-docx / openpyxl。
+    """
+    from .config import CHINESE_FONT_AVAILABLE, CHINESE_FONT_PATH
+    from .deps import PYMUPDF_AVAILABLE, OPENPYXL_AVAILABLE, DOCX_AVAILABLE
+
+    missing = []
+    if "pdf" in kinds and not PYMUPDF_AVAILABLE:
+        missing.append("处理 pdf 需要安装 PyMuPDF")
+    if "pdf" in kinds and not CHINESE_FONT_AVAILABLE:
+        missing.append(f"处理 pdf 需要中文字体文件, 未找到: {CHINESE_FONT_PATH}")
+    if "excel" in kinds and not options.excel_streaming and not OPENPYXL_AVAILABLE:
+        missing.append("--no-excel-streaming 需要安装 openpyxl")
+    if "word" in kinds and not options.word_streaming and not DOCX_AVAILABLE:
+        missing.append("--no-word-streaming 需要安装 python-docx")
+    return missing
+
+
+def run_watermark(args, log):
+    from .watermark import WatermarkOptions
+    from .parallel import run_watermark_batch, resume_watermark_batch
+    from .metrics import RunMetrics
+    from .journal import JobJournal, JournalError, open_last_run
+
+    if args.resume:
+        try:
+            journal, run = open_last_run("watermark", args.journal_dir)
+        except JournalError as e:
+            _emit({"command": "watermark", "error": str(e)})
+            return EXIT_SETUP
+        args.folder = run.folder
+        kinds = set(run.params["kinds"])
+        options = WatermarkOptions(**run.params["options"])
+    else:
+        if not os.path.isdir(args.folder):
+            _emit({"command": "watermark", "error": f"文件夹不存在: {args.folder}"})
+            return EXIT_SETUP
+        journal = None
+        kinds = set(args.types)
+        options = WatermarkOptions(
+            opacity=args.opacity,
+            position=args.position,
+            pdf_save_mode=args.pdf_save_mode,
+            pdf_incremental_min_mb=args.pdf_incremental_min_mb,
+            excel_streaming=args.excel_streaming,
+            word_streaming=args.word_streaming,
+            large_image_megapixels=args.large_image_megapixels,
+            large_image_memory_mb=args.large_image_memory_mb,
+        )
+    missing = missing_watermark_dependencies(kinds, options)
+    if missing:
+        if journal is not None:
+            journal.close()
+        _emit({"command": "watermark", "error": "; ".join(missing)})
+        return EXIT_SETUP
+    if args.resume:
+        log(f"继续上次的水印任务: {run.folder}")
+    else:
+        journal = JobJournal.open("watermark", args.journal_dir)
+    failures = []
+    run_metrics = RunMetrics("watermark", args.folder)
+
+    def on_result(result):
+        for message in result.messages:
+            log(message)
+        if not result.ok:
+            failures.append(result.path)
+
+    try:
+        if args.resume:
+            counts = resume_watermark_batch(
+                journal, run, workers=args.workers, on_result=on_result, run_metrics=run_metrics
+            )
+        else:
+            counts = run_watermark_batch(
+                args.folder,
+                kinds,
+                options,
+                workers=args.workers,
+                on_result=on_result,
+                incremental=args.incremental,
+                run_metrics=run_metrics,
+                journal=journal,
+            )
+    finally:
+        if journal is not None:
+            journal.close()
+    run_metrics.finish()
+    _export_metrics(run_metrics, args.metrics_dir, log)
+    _emit({
+        "command": "watermark",
+        "folder": args.folder,
+        "counts": counts,
+        "failed": failures,
+        "stages": run_metrics.stage_summary(),
+    })
+    return EXIT_FAILURES if failures else EXIT_OK
+
+
+def run_print(args, log):
+    from .printing import PrintEngine, PrintOptions, PrintSetupError, PRINT_EXTENSIONS, default_printer
+    from .journal import JobJournal
+
+    if args.resume:
+        return _resume_print(args, log)
+    options = PrintOptions(
+        printer=args.printer or default_printer(),
+        extensions=tuple(args.types or PRINT_EXTENSIONS),
+        page_range=args.pages,
+        allow_estimate=args.estimate_pages,
+        margin=args.margin,
+        prepare_workers=args.prepare_workers,
+        office_workers=args.office_workers,
+        backend=args.backend,
+        layout=args.layout,
+        pack=args.pack,
+        recursive=args.recursive,
+        large_image_megapixels=args.large_image_megapixels,
+        large_image_memory_mb=args.large_image_memory_mb,
+    )
+    engine = PrintEngine(args.soffice)
+    journal = JobJournal.open("print", args.journal_dir)
+    try:
+        summary = engine.run(args.folder, options, log, journal=journal)
+    except PrintSetupError as e:
+        _emit({"command": "print", "error": str(e)})
+        return EXIT_SETUP
+    finally:
+        engine.close()
+        if journal is not None:
+            journal.close()
+    _export_metrics(summary.metrics, args.metrics_dir, log)
+    _emit({"command": "print", "folder": args.folder, "printer": options.printer, **summary.to_dict()})
+    return EXIT_FAILURES if summary.failed else EXIT_OK
+
+
+def _resume_print(args, log):
+    from .printing import PrintEngine, PrintSetupError, print_options_from_params
+    from .journal import JournalError, open_last_run
+
+    try:
+        journal, run = open_last_run("print", args.journal_dir)
+    except JournalError as e:
+        _emit({"command": "print", "error": str(e)})
+        return EXIT_SETUP
+    log(f"继续上次的打印任务: {run.folder}")
+    printer = print_options_from_params(run.params).printer
+    engine = PrintEngine(args.soffice)
+    try:
+        summary = engine.resume(journal, run, log)
+    except PrintSetupError as e:
+        _emit({"command": "print", "error": str(e)})
+        return EXIT_SETUP
+    finally:
+        engine.close()
+        journal.close()
+    _export_metrics(summary.metrics, args.metrics_dir, log)
+    _emit({"command": "print", "folder": run.folder, "printer": printer, "resumed": True, **summary.to_dict()})
+    return EXIT_FAILURES if summary.failed else EXIT_OK
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.folder is None and not args.resume:
+        parser.error("需要指定文件夹 (或使用 --resume 继续上次中断的任务)")
+    # 重定向到文件时 Windows 使用本地编码, 无法编码的符号 (如 ✔) 不应让程序出错
+    sys.stderr.reconfigure(errors="backslashreplace")
+    _setup_logging(args.verbose)
+    # 文件按系统区域设置的顺序处理, 与资源管理器一致
+    from .discovery import use_system_collation
+    use_system_collation()
+
+    def log(message):
+        if not args.quiet:
+            print(message, file=sys.stderr, flush=True)
+
+    if args.command == "watermark":
+        return run_watermark(args, log)
+    return run_print(args, log)
@@ -0,0 +1,40 @@
+# printall/config.py
+"""全局配置, 由界面和各处理引擎共享"""
+import os
+import sys
+
+# [打印功能配置] 请根据您的系统修改此路径, 它将作为默认值
+LIBREOFFICE_PATH = r"C:\Program Files\LibreOffice\program\soffice.exe"
+
+# [水印功能配置] 使用 Windows 系统字体路径
+CHINESE_FONT_PATH = "C:/Windows/Fonts/msyh.ttc"
+
+# [打印功能配置]
+PRINT_DPI = 300
+A4_WIDTH_MM = 210
+A4_HEIGHT_MM = 297
+
+# [大图片] 像素数超过此值 (百万) 的图片分带处理 (见 bigimage.py), 处理一张大图片的内存预算 (MB)
+LARGE_IMAGE_MEGAPIXELS = 64
+LARGE_IMAGE_MEMORY_MB = 1024
+
+# 日志记录器名称, 界面和工作进程都写入同一个记录器
+LOGGER_NAME = "PrintALLAppLogger"
+
+
+def state_dir(name):
+    """
+    保存运行状态 (任务日志、清单等) 的目录:
+    Windows 为 %LOCALAPPDATA%\\PrintALL\\<name>, 其他系统为 $XDG_STATE_HOME/printall/<name>
+    (默认 ~/.local/state/printall/<name>)
+    """
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+        return os.path.join(base, "PrintALL", name)
+    base = os.environ.get("XDG_STATE_HOME") or os.path.join(os.path.expanduser("~"), ".local", "state")
+    return os.path.join(base, "printall", name)
+
+
+# --- 检查水印字体 ---
+# 直接检查绝对路径，因为仅在windows下运行
+CHINESE_FONT_AVAILABLE = os.path.exists(CHINESE_FONT_PATH)
@@ -0,0 +1,334 @@
+# printall/convcache.py
+"""
+DOC/DOCX -> PDF 转换结果 (以及图片合并结果) 的磁盘缓存。
+
+缓存键 = 文件内容的 SHA-256 + LibreOffice 版本, 与文件名和修改时间无关:
+页数检查时转换出的 PDF 就是随后发送给打印机的那一份, 同一个文件夹再次运行时
+不需要任何转换。合并图片的 PDF 以各图片内容的哈希 (按顺序) 加页边距等参数为键。
+缓存总大小超过上限时按最近使用时间(LRU)淘汰最旧的文件; 被固定 (pin) 的文件
+(已经取得、还没有提交打印的 PDF) 不会被淘汰。
+"""
+import os
+import sys
+import shutil
+import sqlite3
+import hashlib
+import logging
+import tempfile
+import threading
+import subprocess
+import collections
+
+from .config import LOGGER_NAME
+
+logger = logging.getLogger(LOGGER_NAME)
+
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2 GB
+
+_HASH_CHUNK = 1024 * 1024
+
+INDEX_NAME = "index.sqlite"
+
+
+def default_cache_dir():
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+        return os.path.join(base, "PrintALL", "cache", "pdf")
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "printall", "pdf")
+
+
+def file_digest(path):
+    """计算文件内容的 SHA-256 (分块读取, 不会一次性读入内存)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DigestIndex:
+    """
+    缓存目录中的 SQLite 数据库, 线程安全:
+
+    - 记住文件的内容哈希 (按绝对路径、大小、修改时间), 大小和修改时间都没变的文件
+      不再读取内容, 再次打印同一个文件夹时计算缓存键只需要 stat;
+    - 记录从缓存复制出去的文件 (如 _merged_images.pdf) 来自哪个缓存键,
+      该文件没有被改动过时不必再次复制。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS digests ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " sha256 TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outputs ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " cache_key TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    @classmethod
+    def open(cls, cache_dir):
+        """打开缓存目录中的索引; 无法打开时返回 None (此时每次都重新计算哈希)"""
+        try:
+            return cls(os.path.join(cache_dir, INDEX_NAME))
+        except sqlite3.Error:
+            logger.warning(f"无法打开缓存索引, 每次都将重新计算文件哈希: {cache_dir}", exc_info=True)
+            return None
+
+    def digest(self, path):
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256 FROM digests WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (path, st.st_size, st.st_mtime_ns),
+            ).fetchone()
+        if row:
+            return row[0]
+        digest = file_digest(path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO digests (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                (path, st.st_size, st.st_mtime_ns, digest),
+            )
+            self._conn.commit()
+        return digest
+
+    def output_is_current(self, path, key):
+        """path 是从缓存键 key 复制出来的, 并且之后没有被改动"""
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM outputs WHERE path = ? AND size = ? AND mtime_ns = ? AND cache_key = ?",
+                (path, st.st_size, st.st_mtime_ns, key),
+            ).fetchone()
+        return row is not None
+
+    def record_output(self, path, key):
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO outputs (path, size, mtime_ns, cache_key) VALUES (?, ?, ?, ?)",
+                (path, st.st_size, st.st_mtime_ns, key),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_version_cache = {}
+
+
+def libreoffice_version(soffice_path):
+    """
+    返回标识 LibreOffice 版本的字符串。
+    优先读取安装目录中的 version.ini / versionrc (不需要启动 soffice),
+    读不到时执行一次 `soffice --version`。结果按路径缓存。
+    """
+    if soffice_path in _version_cache:
+        return _version_cache[soffice_path]
+    version = None
+    program_dir = os.path.dirname(os.path.realpath(soffice_path))
+    for name in ("version.ini", "versionrc"):
+        candidate = os.path.join(program_dir, name)
+        if os.path.isfile(candidate):
+            with open(candidate, "rb") as f:
+                version = hashlib.sha1(f.read()).hexdigest()
+            break
+    if version is None:
+        try:
+            result = subprocess.run(
+                [soffice_path, "--version"],
+                capture_output=True,
+                timeout=60,
+                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+            )
+            version = result.stdout.decode("utf-8", "ignore").strip() or "unknown"
+        except (OSError, subprocess.SubprocessError):
+            logger.warning(f"无法获取 LibreOffice 版本: {soffice_path}", exc_info=True)
+            version = "unknown"
+    _version_cache[soffice_path] = version
+    return version
+
+
+class ConversionCache:
+    """线程安全的 PDF 转换缓存"""
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # 缓存键 -> [锁, 使用中的线程数]; 没有线程使用时才删除, 同一个键始终只有一把锁
+        self._key_locks = {}
+        # 缓存文件路径 -> 固定次数, 淘汰时跳过
+        self._pins = collections.Counter()
+        self._total = None
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._index = DigestIndex.open(self.cache_dir)
+
+    def digest(self, path):
+        """文件内容的 SHA-256, 文件没变时直接使用索引中记住的值"""
+        if self._index is None:
+            return file_digest(path)
+        return self._index.digest(path)
+
+    def key_for(self, src, soffice_path):
+        version = libreoffice_version(soffice_path)
+        return hashlib.sha256(f"{self.digest(src)}|{version}".encode("utf-8")).hexdigest()
+
+    def content_key(self, paths, *params):
+        """按顺序排列的多个文件的内容哈希, 加上生成参数, 组成缓存键"""
+        return self.key_from_digests([self.digest(path) for path in paths], *params)
+
+    @staticmethod
+    def key_from_digests(digests, *params):
+        """与 content_key 相同, 但使用已经计算好的内容哈希"""
+        digest = hashlib.sha256()
+        for value in digests:
+            digest.update(value.encode("ascii") + b"|")
+        for param in params:
+            digest.update(f"{param}|".encode("utf-8"))
+        return digest.hexdigest()
+
+    def copy_out(self, key, cached_path, output_path):
+        """
+        把缓存的文件复制到 output_path; output_path 已经是这份缓存且没有被改动时不复制。
+        返回是否进行了复制。
+        """
+        if self._index is not None and self._index.output_is_current(output_path, key):
+            os.utime(cached_path)
+            return False
+        shutil.copyfile(cached_path, output_path)
+        if self._index is not None:
+            self._index.record_output(output_path, key)
+        return True
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".pdf")
+
+    def lookup(self, key):
+        """命中时返回缓存的 PDF 路径并刷新其最近使用时间, 否则返回 None"""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def get_or_convert(self, src, office_pool, timeout=60, pin=False):
+        """
+        返回 src 对应的 PDF 路径, 缓存未命中时通过 office_pool 转换并存入缓存。
+        返回 (pdf_path, 是否命中缓存)。pin 见 get_or_build。
+        """
+        key = self.key_for(src, office_pool.soffice_path)
+        return self.get_or_build(
+            key, lambda temp_dir: office_pool.convert_to_pdf(src, temp_dir, timeout=timeout), pin=pin
+        )
+
+    def get_or_build(self, key, build, pin=False):
+        """
+        返回 key 对应的缓存 PDF, 未命中时调用 build(临时目录) 生成并存入缓存。
+        build 返回生成的 PDF 路径; 返回 None 时不缓存, 本方法也返回 (None, False)。
+        返回 (pdf_path, 是否命中缓存)。
+        pin 为 True 时返回的文件在调用 unpin 之前不会被淘汰。
+        """
+        with self._lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        # 同一个键被并发请求时只生成一次
+        try:
+            with entry[0]:
+                with self._lock:
+                    # 查找和固定之间不能被其他线程淘汰
+                    cached = self.lookup(key)
+                    if cached and pin:
+                        self._pins[cached] += 1
+                if cached:
+                    return cached, True
+                target = self.path_for(key)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                temp_dir = tempfile.mkdtemp(prefix="convert_", dir=self.cache_dir)
+                try:
+                    pdf_path = build(temp_dir)
+                    if pdf_path is None:
+                        return None, False
+                    size = os.path.getsize(pdf_path)
+                    with self._lock:
+                        os.replace(pdf_path, target)
+                        if pin:
+                            self._pins[target] += 1
+                finally:
+                    shutil.rmtree(temp_dir, ignore_errors=True)
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._key_locks[key]
+        self._added(size)
+        return target, False
+
+    def unpin(self, path):
+        """释放 get_or_build(pin=True) 固定的文件"""
+        with self._lock:
+            self._pins[path] -= 1
+            if self._pins[path] <= 0:
+                del self._pins[path]
+
+    def _scan(self):
+        entries = []
+        for root_dir, dirs, files in os.walk(self.cache_dir):
+            # 跳过正在转换中的临时目录
+            dirs[:] = [d for d in dirs if not d.startswith("convert_")]
+            for name in files:
+                if name.endswith(".pdf"):
+                    path = os.path.join(root_dir, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _added(self, size):
+        with self._lock:
+            if self._total is None:
+                self._total = sum(entry[1] for entry in self._scan())
+            else:
+                self._total += size
+            if self._total <= self.max_bytes:
+                return
+            # 按最近使用时间从旧到新淘汰, 直到回到上限的 90%
+            entries = sorted(self._scan())
+            self._total = sum(entry[1] for entry in entries)
+            limit = self.max_bytes * 0.9
+            for _, entry_size, path in entries:
+                if self._total <= limit:
+                    break
+                if path in self._pins:
+                    continue
+                try:
+                    os.remove(path)
+                    self._total -= entry_size
+                except OSError:
+                    logger.warning(f"无法删除缓存文件: {path}", exc_info=True)
+            logger.info(f"PDF 转换缓存已淘汰到 {self._total / 1024 / 1024:.0f} MB")
@@ -0,0 +1,26 @@
+# printall/deps.py
+"""
+可选依赖的检测。
+
+启动时只用 importlib.util.find_spec 查找模块是否已安装 (不执行模块代码),
+真正的 import 推迟到对应的处理函数第一次运行时, 这样只打印图片时不会加载
+python-docx、openpyxl 等, 窗口可以更快出现。
+"""
+import importlib.util
+
+
+def has_module(name):
+    """模块已安装时返回 True, 不会导入它"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+PYMUPDF_AVAILABLE = has_module("fitz")
+OPENPYXL_AVAILABLE = has_module("openpyxl")
+DOCX_AVAILABLE = has_module("docx")
+PYWIN32_AVAILABLE = has_module("win32print")
+
+# 启动时不应被导入的重量级模块, 由启动基准检查
+HEAVY_MODULES = ("fitz", "pymupdf", "docx", "openpyxl", "PIL.Image", "pypdf", "win32print")
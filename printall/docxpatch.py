@@ -0,0 +1,375 @@
+# printall/docxpatch.py
+"""
+快速 Word 页眉: 直接修改 .docx 压缩包中第一节的默认页眉, 不用 python-docx 读写整个文档。
+
+与 add_word_watermark 原来的 python-docx 处理结果一致:
+  - 页眉第一个段落没有文字时, 清空该段落 (保留段落格式), 写入一个红色、宋体、
+    按版心宽度计算字号的文字块, 并居中;
+  - 页眉没有段落时在末尾添加一个; 第一节没有默认页眉时新建页眉部件;
+  - 第一个段落已有文字时不做修改。
+只有页眉部件 (新建页眉时还有 document.xml、关系和内容类型) 会被重写,
+图片等其他条目原样复制压缩数据。
+"""
+import os
+import zipfile
+import tempfile
+import posixpath
+import xml.etree.ElementTree as ET
+from xml.parsers.expat import ExpatError
+
+from .ziputil import rewrite_zip, read_relationships, ZipRewriteError
+from .xmlstream import XmlPatcher, StopParsing, local_name, qname_prefix, escape_text, escape_attr
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+HEADER_REL_TYPE = R_NS + "/header"
+HEADER_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.header+xml"
+
+_PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# CT_PPr 中位于 jc 之后的元素, 没有 jc 时插在它们之前
+_AFTER_JC = {
+    "textDirection", "textAlignment", "textboxTightWrap", "outlineLvl", "divId",
+    "cnfStyle", "rPr", "sectPr", "pPrChange",
+}
+# python-docx 中 Run.text 会转成文字的元素 (w:tab、w:br 等只产生空白, 不影响判断)
+_RUN_TEXT = {"t": None, "noBreakHyphen": "-"}
+
+
+class DocxPatchError(Exception):
+    """文档结构不适合直接修改, 应退回到 python-docx"""
+
+
+def header_font_size(page_width, left_margin, right_margin):
+    """
+    页眉字号 (磅): 与 python-docx 处理中的计算相同, 参数单位为 twip (1/20 磅)。
+    除数 60 是经验值, 值越大字体越小; 不低于 9 磅以保证可读性。
+    """
+    usable_width_pt = (page_width - left_margin - right_margin) / 20
+    return max(9, int(usable_width_pt / 60))
+
+
+def _run_markup(w, text, font_size):
+    space = ' xml:space="preserve"' if text != text.strip() else ""
+    return (
+        f'<{w}r><{w}rPr><{w}rFonts {w}ascii="宋体" {w}hAnsi="宋体"/><{w}color {w}val="FF0000"/>'
+        f'<{w}sz {w}val="{font_size * 2}"/></{w}rPr><{w}t{space}>{escape_text(text)}</{w}t></{w}r>'
+    )
+
+
+# --------------------------------------------------------------------------
+# document.xml: 第一节的页面设置和默认页眉
+# --------------------------------------------------------------------------
+
+class _DocumentPatcher(XmlPatcher):
+    """
+    找到第一个 sectPr (与 python-docx 的 sections[0] 相同: body 下段落中的 sectPr 或 body 的 sectPr)。
+    header_reference 为 None 时只读取信息, 读完第一个 sectPr 后停止;
+    否则把 header_reference 插入为它的第一个子元素。
+    """
+
+    def __init__(self, write, header_reference=None):
+        super().__init__(write)
+        self.header_reference = header_reference
+        self.header_id = None
+        self.page = {}
+        self.r_prefix = None  # 根元素上声明的关系命名空间前缀
+        self.w = ""
+        self._depth = 0
+        self._path = []       # 当前位置前几层的元素名 (不含前缀)
+        self._sect_depth = None
+        self._done = False
+        # 正文中的元素很多, 不维护 stack, 只记录前几层
+        self.set_handlers(self._on_start, self._on_end)
+
+    def _on_start(self, name, attrs):
+        depth = self._depth
+        self._depth = depth + 1
+        if self._done or depth > 5:
+            return
+        local = local_name(name)
+        del self._path[depth:]
+        self._path.append(local)
+        if depth == 0:
+            self.w = qname_prefix(name)
+            for key, value in attrs.items():
+                if key.startswith("xmlns:") and value == R_NS:
+                    self.r_prefix = key[6:] + ":"
+        elif self._sect_depth is not None:
+            if depth != self._sect_depth + 1:
+                return
+            if local == "headerReference" and attrs.get(f"{self.w}type") == "default":
+                self.header_id = next((v for k, v in attrs.items() if k.endswith(":id")), None)
+            elif local == "pgSz":
+                self.page["width"] = attrs.get(f"{self.w}w")
+            elif local == "pgMar":
+                self.page["left"] = attrs.get(f"{self.w}left")
+                self.page["right"] = attrs.get(f"{self.w}right")
+        elif local == "sectPr" and self._path[:-1] in (["document", "body"], ["document", "body", "p", "pPr"]):
+            self._sect_depth = depth
+            if self.header_reference is not None:
+                self.insert_child(self.position(), name, self.header_reference)
+
+    def _on_end(self, name):
+        self._depth -= 1
+        if self._depth == self._sect_depth and not self._done:
+            self._done = True
+            if self.header_reference is None:
+                raise StopParsing()
+        self.compact()
+
+
+# --------------------------------------------------------------------------
+# 页眉部件
+# --------------------------------------------------------------------------
+
+class _HeaderPatcher(XmlPatcher):
+    """修改页眉的第一个段落 (python-docx 中的 header.paragraphs[0]), 没有段落时在末尾添加"""
+
+    def __init__(self, write, text, font_size):
+        super().__init__(write)
+        self.text = text
+        self.font_size = font_size
+        self.modified = False
+        self._p = None         # 第一个段落: 开始位置
+        self._p_done = False
+        self._ppr = None       # pPr: [开始位置, jc 位置, jc 之后第一个元素的位置]
+        self._ppr_close = None
+        self._ppr_end = None
+        self._texts = []
+        self._in_text = False
+
+    def _paragraph(self, w, ppr_markup):
+        return f"{ppr_markup}{_run_markup(w, self.text, self.font_size)}"
+
+    def _new_ppr(self, w):
+        jc = f'<{w}jc {w}val="center"/>'
+        if self._ppr is None:
+            return f"<{w}pPr>{jc}</{w}pPr>"
+        start, jc_range, after_jc = self._ppr
+        if jc_range is not None:
+            return self.source(start, jc_range[0]) + jc + self.source(jc_range[1], self._ppr_end)
+        tag_end = self.tag_end(start)
+        if self.is_empty_tag(start):
+            return self.source(start, tag_end - 2).rstrip() + f">{jc}</{w}pPr>"
+        insert_at = after_jc if after_jc is not None else self._ppr_close
+        return self.source(start, insert_at) + jc + self.source(insert_at, self._ppr_end)
+
+    def start(self, name, attrs):
+        depth = len(self.stack)
+        local = local_name(name)
+        if depth == 0 and self.is_empty_tag(self.position()):
+            raise DocxPatchError("页眉部件为空")
+        if depth == 1 and local == "p" and not self._p_done and self._p is None:
+            pos = self.position()
+            if self.is_empty_tag(pos):
+                # <w:p/>: 没有文字
+                self._p_done = True
+                self.modified = True
+                w = qname_prefix(name)
+                tag = self.source(pos, self.tag_end(pos) - 2).rstrip()
+                self.replace(pos, self.tag_end(pos), f"{tag}>{self._paragraph(w, self._new_ppr(w))}</{name}>")
+            else:
+                self._p = pos
+                self.hold(pos)
+            return
+        if self._p is None:
+            return
+        parent = local_name(self.stack[-1])
+        if depth == 2 and local == "pPr":
+            self._ppr = [self.position(), None, None]
+        elif depth == 3 and parent == "pPr" and self._ppr is not None:
+            if local == "jc" and self._ppr[1] is None:
+                pos = self.position()
+                self._ppr[1] = (pos, self._element_end(pos, name))
+            elif local in _AFTER_JC and self._ppr[2] is None:
+                self._ppr[2] = self.position()
+        elif local in _RUN_TEXT and parent == "r" and (
+            depth == 3 or (depth == 4 and local_name(self.stack[-2]) == "hyperlink")
+        ):
+            if _RUN_TEXT[local] is None:
+                self._in_text = True
+                self.begin_text()
+            else:
+                self._texts.append(_RUN_TEXT[local])
+
+    def _element_end(self, pos, name):
+        """jc 只有属性, 通常是空元素; 否则要求结束标签紧跟在开始标签之后, 不是时返回 None"""
+        end = self.tag_end(pos)
+        if self.is_empty_tag(pos):
+            return end
+        close = f"</{name}>"
+        size = len(close.encode("utf-8"))
+        return end + size if self.source(end, end + size) == close else None
+
+    def end(self, name):
+        depth = len(self.stack)
+        local = local_name(name)
+        if self._p is None:
+            if depth == 0 and not self._p_done:
+                # 页眉中没有段落
+                self.modified = True
+                w = qname_prefix(name)
+                self.insert(self.position(), f"<{w}p>{self._paragraph(w, self._new_ppr(w))}</{w}p>")
+            return
+        if self._in_text:
+            self._in_text = False
+            self._texts.append(self.end_text())
+        elif depth == 2 and local == "pPr" and self._ppr is not None:
+            pos = self.position()
+            if self.is_empty_tag(self._ppr[0]):
+                self._ppr_end = self.tag_end(self._ppr[0])
+            else:
+                self._ppr_close = pos
+                self._ppr_end = self.tag_end(pos)
+        elif depth == 1 and local == "p":
+            p_start, self._p = self._p, None
+            self._p_done = True
+            p_end = self.tag_end(self.position())
+            if not "".join(self._texts).strip():
+                if self._ppr is not None and self._ppr[1] is not None and self._ppr[1][1] is None:
+                    raise DocxPatchError("无法解析段落的对齐方式")
+                w = qname_prefix(name)
+                p_tag = self.source(p_start, self.tag_end(p_start))
+                self.replace(p_start, p_end, f"{p_tag}{self._paragraph(w, self._new_ppr(w))}</{name}>")
+                self.modified = True
+            self.release()
+
+
+def _new_header_part(text, font_size):
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        f'<w:hdr xmlns:w="{W_NS}" xmlns:r="{R_NS}"><w:p><w:pPr><w:pStyle w:val="Header"/>'
+        f'<w:jc w:val="center"/></w:pPr>{_run_markup("w:", text, font_size)}</w:p></w:hdr>'
+    ).encode("utf-8")
+
+
+class _AppendPatcher(XmlPatcher):
+    """在根元素末尾追加 markup (用于关系和内容类型)"""
+
+    def __init__(self, write, make_markup):
+        super().__init__(write)
+        self.make_markup = make_markup
+
+    def end(self, name):
+        if not self.stack:
+            self.insert(self.position(), self.make_markup(qname_prefix(name)))
+
+
+# --------------------------------------------------------------------------
+# 入口
+# --------------------------------------------------------------------------
+
+def _locate_document(zf):
+    document = next(
+        (path for rel_type, path in read_relationships(zf, "").values()
+         if rel_type.endswith("/officeDocument")),
+        None,
+    )
+    if document is None:
+        raise DocxPatchError("找不到 document 部件")
+    return document
+
+
+def _relationship_ids(zf, part):
+    """part 的所有关系 Id (包括外部链接)"""
+    directory, filename = posixpath.split(part)
+    rels_name = posixpath.join(directory, "_rels", filename + ".rels")
+    try:
+        root = ET.fromstring(zf.read(rels_name))
+    except KeyError:
+        return rels_name, set()
+    return rels_name, {rel.get("Id") for rel in root.iter(_PACKAGE_REL_NS + "Relationship")}
+
+
+def patch_docx_header(path, text):
+    """
+    在 .docx 第一节的页眉中写入 text, 原地替换。
+    返回 True 表示已修改, False 表示页眉已有文字 (文件不变)。
+    文档结构不支持时抛出 DocxPatchError (文件不变)。
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".docxpatch_", suffix=".docx", dir=directory)
+    os.close(fd)
+    try:
+        modified = _patch_to(path, temp_path, text)
+        if modified:
+            os.replace(temp_path, path)
+        return modified
+    except (ZipRewriteError, ExpatError, ET.ParseError, KeyError, ValueError) as e:
+        raise DocxPatchError(str(e)) from e
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _patch_to(path, temp_path, text):
+    with zipfile.ZipFile(path) as zf:
+        document = _locate_document(zf)
+        scanner = _DocumentPatcher(lambda data: None)
+        with zf.open(document) as f:
+            scanner.feed(f)
+        if not scanner.w:
+            raise DocxPatchError("document.xml 没有使用命名空间前缀")
+        page = scanner.page
+        if not all(page.get(key) for key in ("width", "left", "right")):
+            raise DocxPatchError("第一节缺少页面大小或页边距")
+        font_size = header_font_size(int(page["width"]), int(page["left"]), int(page["right"]))
+
+        if scanner.header_id is not None:
+            rel_type, header_part = read_relationships(zf, document).get(scanner.header_id, ("", None))
+            if not rel_type.endswith("/header") or header_part not in zf.NameToInfo:
+                raise DocxPatchError("找不到第一节的页眉部件")
+            output = []
+            patcher = _HeaderPatcher(output.append, text, font_size)
+            with zf.open(header_part) as f:
+                patcher.feed(f)
+            if not patcher.modified:
+                return False
+            replacements = {header_part: b"".join(output)}
+            new_header = None
+        else:
+            # 第一节没有默认页眉: 与 python-docx 相同, 新建 /word/headerN.xml
+            rels_part, used_ids = _relationship_ids(zf, document)
+            if rels_part not in zf.NameToInfo or "[Content_Types].xml" not in zf.NameToInfo:
+                raise DocxPatchError("缺少文档关系或内容类型")
+            rel_id = next(f"rId{n}" for n in range(1, len(used_ids) + 2) if f"rId{n}" not in used_ids)
+            word_dir = posixpath.dirname(document)
+            number = next(n for n in range(1, len(zf.NameToInfo) + 2)
+                          if posixpath.join(word_dir, f"header{n}.xml") not in zf.NameToInfo)
+            header_name = f"header{number}.xml"
+            new_header = (posixpath.join(word_dir, header_name), _new_header_part(text, font_size))
+            w = scanner.w
+            if scanner.r_prefix:
+                reference = f'<{w}headerReference {w}type="default" {scanner.r_prefix}id="{rel_id}"/>'
+            else:
+                reference = f'<{w}headerReference xmlns:r="{R_NS}" {w}type="default" r:id="{rel_id}"/>'
+            replacements = {
+                document: lambda write: _DocumentPatcher(write, reference),
+                rels_part: lambda write: _AppendPatcher(write, lambda p: (
+                    f'<{p}Relationship Id="{rel_id}" Type="{HEADER_REL_TYPE}" Target="{escape_attr(header_name)}"/>'
+                )),
+                "[Content_Types].xml": lambda write: _AppendPatcher(write, lambda p: (
+                    f'<{p}Override PartName="/{escape_attr(new_header[0])}" ContentType="{HEADER_CONTENT_TYPE}"/>'
+                )),
+            }
+
+    def rewrite(info, rewriter):
+        replacement = replacements.get(info.filename)
+        if replacement is None:
+            return False
+        with rewriter.open(info) as out:
+            if isinstance(replacement, bytes):
+                out.write(replacement)
+            else:
+                with rewriter.zip.open(info) as f:
+                    replacement(out.write).feed(f)
+        return True
+
+    def finish(rewriter):
+        if new_header is not None:
+            with rewriter.open(new_header[0]) as out:
+                out.write(new_header[1])
+
+    rewrite_zip(path, temp_path, rewrite, finish)
+    return True
@@ -0,0 +1,265 @@
+# printall/imagepdf.py
+"""
+图片 -> A4 单页 PDF, 以及把多张图片直接合并为一个 PDF。
+
+优先使用 PyMuPDF 把原始图片直接嵌入页面: JPEG 的 DCT 数据原样写入 (不重新编码),
+PNG/BMP 无损压缩写入; 通过页面上的放置矩形完成缩放、居中和页边距, 不再在内存中
+创建 300 DPI 的 A4 画布并重新采样。PyMuPDF 不可用时退回到原来的栅格化方式。
+"""
+import io
+import os
+import math
+import logging
+import contextlib
+
+from . import metrics
+from .config import LOGGER_NAME, PRINT_DPI, A4_WIDTH_MM, A4_HEIGHT_MM
+from .deps import PYMUPDF_AVAILABLE
+from . import bigimage
+
+logger = logging.getLogger(LOGGER_NAME)
+
+A4_WIDTH_PT = A4_WIDTH_MM / 25.4 * 72
+A4_HEIGHT_PT = A4_HEIGHT_MM / 25.4 * 72
+
+
+def fit_rect(img_size, page_size, margin):
+    """
+    计算图片在页面上的放置位置: 等比缩放到页边距以内并居中。
+    所有尺寸使用同一单位; 返回 (x0, y0, x1, y1), 图片尺寸为 0 时返回 None。
+    """
+    img_w, img_h = img_size
+    page_w, page_h = page_size
+    if img_w == 0 or img_h == 0:
+        return None
+    draw_w, draw_h = page_w - 2 * margin, page_h - 2 * margin
+    ratio = min(draw_w / img_w, draw_h / img_h)
+    new_w, new_h = img_w * ratio, img_h * ratio
+    x0 = (page_w - new_w) / 2
+    y0 = (page_h - new_h) / 2
+    return x0, y0, x0 + new_w, y0 + new_h
+
+
+def _print_size(rect, dpi):
+    """放置矩形 (x0, y0, x1, y1) 在 dpi 下的像素尺寸"""
+    return math.ceil((rect[2] - rect[0]) * dpi), math.ceil((rect[3] - rect[1]) * dpi)
+
+
+def _reduced_stream(img_path, image_format, size, limits):
+    """大图片按打印尺寸缩小后编码: 原图是 JPEG 时仍为 JPEG, 否则为 PNG"""
+    image = bigimage.reduced_image(img_path, size, limits.memory_bytes)
+    buffer = io.BytesIO()
+    if image_format == "JPEG":
+        image.save(buffer, format="JPEG", quality=95)
+    else:
+        image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _insert_image(page, rect, img_path, image_format, img_size, limits):
+    from PIL import Image
+
+    if limits.is_large(img_size):
+        # 打印只需要 PRINT_DPI 的分辨率: 分带缩小后嵌入, 不整张解码原图
+        stream = _reduced_stream(img_path, image_format, _print_size(rect, PRINT_DPI / 72), limits)
+        page.insert_image(rect, stream=stream, keep_proportion=False)
+        return
+    try:
+        # JPEG 原样嵌入 (DCTDecode), PNG/BMP 由 MuPDF 无损压缩 (FlateDecode)
+        page.insert_image(rect, filename=img_path, keep_proportion=False)
+    except Exception:
+        # MuPDF 不支持的少见格式 (如某些 16 位 BMP): 用 PIL 转为 PNG 后嵌入
+        logger.info(f"MuPDF 无法直接嵌入 {image_format} 图片, 转为 PNG: {img_path}")
+        buffer = io.BytesIO()
+        with Image.open(img_path) as image:
+            if image.mode not in ("RGB", "RGBA", "L", "LA"):
+                image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+            image.save(buffer, format="PNG")
+        page.insert_image(rect, stream=buffer.getvalue(), keep_proportion=False)
+
+
+def _embed_page(doc, img_path, margin, limits):
+    """在 doc 末尾添加一页并嵌入图片, 图片尺寸为 0 时不添加并返回 False; 嵌入失败时不添加页面"""
+    import fitz  # PyMuPDF
+
+    with bigimage.open_image(img_path) as image:
+        # 只读取文件头获取尺寸, 不解码像素
+        img_size = image.size
+        image_format = image.format
+    metrics.lap("open")
+    # 页边距配置的单位是 PRINT_DPI 下的像素, 换算为磅
+    rect = fit_rect(img_size, (A4_WIDTH_PT, A4_HEIGHT_PT), margin * 72 / PRINT_DPI)
+    if rect is None:
+        return False
+    page = doc.new_page(width=A4_WIDTH_PT, height=A4_HEIGHT_PT)
+    try:
+        _insert_image(page, fitz.Rect(rect), img_path, image_format, img_size, limits)
+    except Exception:
+        # 图片无法嵌入时不留下空白页 (合并时会跳过这张图片继续)
+        doc.delete_page(-1)
+        raise
+    metrics.lap("render")
+    return True
+
+
+def _embed_image(img_path, pdf_path, margin, limits):
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    try:
+        if not _embed_page(doc, img_path, margin, limits):
+            return False
+        doc.save(pdf_path, deflate=True)
+        metrics.lap("save")
+    finally:
+        doc.close()
+    return True
+
+
+def _rasterize_page(img_path, margin, limits):
+    """原来的方式: 在 300 DPI 的 A4 画布上重新采样, 返回画布, 图片尺寸为 0 时返回 None"""
+    from PIL import Image
+
+    a4_px_w = int((A4_WIDTH_MM / 25.4) * PRINT_DPI)
+    a4_px_h = int((A4_HEIGHT_MM / 25.4) * PRINT_DPI)
+    with bigimage.open_image(img_path) as image:
+        rect = fit_rect(image.size, (a4_px_w, a4_px_h), margin)
+        if rect is None:
+            return None
+        new_size = (int(rect[2] - rect[0]), int(rect[3] - rect[1]))
+        if limits.is_large(image.size):
+            # 先分带缩小到接近画布上的尺寸, 不整张解码原图
+            image = bigimage.reduced_image(img_path, new_size, limits.memory_bytes)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        metrics.lap("open")
+        resized = image.resize(new_size, Image.Resampling.LANCZOS)
+    a4_page = Image.new("RGB", (a4_px_w, a4_px_h), "white")
+    paste_x = (a4_px_w - new_size[0]) // 2
+    paste_y = (a4_px_h - new_size[1]) // 2
+    a4_page.paste(resized, (paste_x, paste_y))
+    metrics.lap("render")
+    return a4_page
+
+
+def _rasterize_image(img_path, pdf_path, margin, limits):
+    a4_page = _rasterize_page(img_path, margin, limits)
+    if a4_page is None:
+        return False
+    a4_page.save(pdf_path, "PDF", resolution=PRINT_DPI)
+    metrics.lap("save")
+    return True
+
+
+def image_to_pdf(img_path, pdf_path, margin, limits=None):
+    """
+    把图片放到一页 A4 PDF 上 (等比缩放、居中)。
+    margin: 页边距, 单位为 PRINT_DPI 下的像素 (与界面上的设置一致)。
+    limits: bigimage.LargeImageLimits, 超过像素数阈值的图片先分带缩小到打印分辨率
+    图片尺寸为 0 时不生成文件并返回 False。
+    """
+    limits = limits or bigimage.LargeImageLimits()
+    if PYMUPDF_AVAILABLE:
+        return _embed_image(img_path, pdf_path, margin, limits)
+    return _rasterize_image(img_path, pdf_path, margin, limits)
+
+
+# 合并时累计嵌入这么多图片数据后增量保存一次, 释放已写入的页面
+MERGE_FLUSH_BYTES = 64 * 1024 * 1024
+
+
+def _skip_zero_size(img_path):
+    logger.warning(f"跳过尺寸为0的图片: {img_path}")
+
+
+def _merge_embedded(img_paths, pdf_path, margin, limits, track, on_error):
+    import fitz  # PyMuPDF
+
+    count = pending_bytes = 0
+    saved = False
+    doc = fitz.open()
+    try:
+        for img_path in img_paths:
+            with track(img_path):
+                try:
+                    if not _embed_page(doc, img_path, margin, limits):
+                        _skip_zero_size(img_path)
+                        continue
+                except Exception as e:
+                    on_error(img_path, e)
+                    continue
+                count += 1
+                size = os.path.getsize(img_path)
+                metrics.add_bytes(read=size)
+                pending_bytes += size
+                if pending_bytes >= MERGE_FLUSH_BYTES:
+                    # 第一次完整保存, 之后只在文件末尾追加新页面 (增量保存);
+                    # 重新打开后已写入的图片数据不再占用内存
+                    if saved:
+                        doc.saveIncr()
+                    else:
+                        doc.save(pdf_path, deflate=True)
+                        saved = True
+                    doc.close()
+                    doc = fitz.open(pdf_path)
+                    pending_bytes = 0
+                    metrics.lap("save")
+        if count and (not saved or doc.is_dirty):
+            if saved:
+                doc.saveIncr()
+            else:
+                doc.save(pdf_path, deflate=True)
+    finally:
+        doc.close()
+    return count
+
+
+def _merge_rasterized(img_paths, pdf_path, margin, limits, track, on_error):
+    """
+    没有 PyMuPDF 时: 逐张栅格化为内存中的单页 PDF, 追加到同一个 PdfWriter 后一次写出。
+    (PIL 的 save_all 会先把所有画布留在内存中, 这里每次只保留一张未压缩的画布)
+    """
+    from pypdf import PdfWriter
+
+    count = 0
+    writer = PdfWriter()
+    for img_path in img_paths:
+        with track(img_path):
+            try:
+                page = _rasterize_page(img_path, margin, limits)
+                if page is None:
+                    _skip_zero_size(img_path)
+                    continue
+                buffer = io.BytesIO()
+                page.save(buffer, "PDF", resolution=PRINT_DPI)
+                page.close()
+                writer.append(buffer)
+            except Exception as e:
+                on_error(img_path, e)
+                continue
+            count += 1
+            metrics.add_bytes(read=os.path.getsize(img_path))
+            metrics.lap("save")
+    if count:
+        writer.write(pdf_path)
+    writer.close()
+    return count
+
+
+def merge_images_to_pdf(img_paths, pdf_path, margin, track=None, on_error=None, limits=None):
+    """
+    把多张图片依次放到 A4 页面上, 直接写入同一个 PDF, 不生成每张图片的临时 PDF。
+    margin: 页边距, 单位为 PRINT_DPI 下的像素。
+    limits: bigimage.LargeImageLimits, 超过像素数阈值的图片先分带缩小到打印分辨率
+    track(img_path): 返回上下文管理器, 用于记录每张图片的耗时 (可选)。
+    on_error(img_path, exc): 单张图片处理失败时调用, 该图片被跳过 (不提供时直接抛出)。
+    返回写入的页数, 为 0 时不生成文件。
+    """
+    track = track or (lambda img_path: contextlib.nullcontext())
+    if on_error is None:
+        def on_error(img_path, exc):
+            raise exc
+    limits = limits or bigimage.LargeImageLimits()
+    if PYMUPDF_AVAILABLE:
+        return _merge_embedded(img_paths, pdf_path, margin, limits, track, on_error)
+    return _merge_rasterized(img_paths, pdf_path, margin, limits, track, on_error)
@@ -0,0 +1,244 @@
+# printall/impose.py
+"""
+拼版: 把多个逻辑页排到一张纸上再打印 (基于 PyMuPDF 的 show_pdf_page)。
+
+版式:
+    1up      不拼版, 每页一张纸 (默认)
+    2up      A4 横向, 左右两页
+    4up      A4 纵向, 2 x 2 四页
+    booklet  小册子: A4 横向左右两页, 页序按骑马钉排好, 需要双面打印 (短边翻转)
+
+pack=True 时 (只用于 2up/4up), 多个短文档连续排在同一批纸上, 每个文档从一个新的格子开始,
+格子上方印有文件名作为分隔标签; 否则每个文档单独排版、单独作为一个打印任务。
+
+源 PDF 一次只打开一个, 用完就关闭; show_pdf_page 把源页面作为 Form XObject 引用,
+不会栅格化。一个输出文件累计到 max_sheets 张纸后, 在下一个文档开始前保存并开始新文件,
+因此内存占用只与一个输出文件的大小有关, 也避免单个打印任务过大。
+"""
+import os
+import logging
+from dataclasses import dataclass, field
+
+from .config import LOGGER_NAME
+from .imagepdf import A4_WIDTH_PT, A4_HEIGHT_PT
+
+logger = logging.getLogger(LOGGER_NAME)
+
+LAYOUT_NAMES = ("1up", "2up", "4up", "booklet")
+
+# 版式 -> (列数, 行数, 是否横向)
+_GRIDS = {
+    "2up": (2, 1, True),
+    "4up": (2, 2, False),
+    "booklet": (2, 1, True),
+}
+
+# 每个格子四周留白, 打印机通常无法印到纸张边缘 (磅)
+SLOT_MARGIN = 12
+# 分隔标签的高度和字号 (磅)
+LABEL_HEIGHT = 12
+LABEL_FONT_SIZE = 7
+# 内置的简体中文字体, 文件名中有中文时也能显示
+LABEL_FONT = "china-s"
+
+MAX_SHEETS_PER_JOB = 100
+
+
+@dataclass
+class ImposedJob:
+    """拼版后的一个输出文件, 作为一个打印任务提交"""
+    path: str
+    sources: list = field(default_factory=list)  # 其中包含的原始文件, 按顺序
+    pages: int = 0                               # 源文档的页数合计
+    sheets: int = 0                              # 输出的页数 (纸张的面数)
+
+
+def sheet_size(layout):
+    _, _, landscape = _GRIDS[layout]
+    return (A4_HEIGHT_PT, A4_WIDTH_PT) if landscape else (A4_WIDTH_PT, A4_HEIGHT_PT)
+
+
+def slot_rects(layout):
+    """一张纸上各格子的位置 (x0, y0, x1, y1), 按阅读顺序"""
+    cols, rows, _ = _GRIDS[layout]
+    width, height = sheet_size(layout)
+    slot_w, slot_h = width / cols, height / rows
+    return [
+        (col * slot_w, row * slot_h, (col + 1) * slot_w, (row + 1) * slot_h)
+        for row in range(rows)
+        for col in range(cols)
+    ]
+
+
+def booklet_order(page_count):
+    """
+    小册子的页序: 返回 [(左, 右), ...], 依次为第 1 张纸的正面、背面、第 2 张纸的正面……
+    页数补齐到 4 的倍数, 补出来的空白页为 None。
+    """
+    total = (page_count + 3) // 4 * 4
+    order = []
+    for i in range(total // 4):
+        order.append((total - 1 - 2 * i, 2 * i))
+        order.append((2 * i + 1, total - 2 - 2 * i))
+    return [tuple(p if p < page_count else None for p in side) for side in order]
+
+
+class Imposer:
+    """
+    按版式把源 PDF 依次排到输出文件中。
+    add() / finish() 返回已经写完的 ImposedJob 列表, 调用方按顺序提交打印。
+    """
+
+    def __init__(self, layout, output_dir, pack=False, max_sheets=MAX_SHEETS_PER_JOB):
+        if layout not in _GRIDS:
+            raise ValueError(f"未知的拼版方式: {layout}")
+        if pack and layout == "booklet":
+            raise ValueError("小册子不能与多个文档合并排版同时使用")
+        self.layout = layout
+        self.output_dir = output_dir
+        self.pack = pack
+        self.max_sheets = max(1, max_sheets)
+        self._slots = slot_rects(layout)
+        self._doc = None
+        self._job = None
+        self._page = None
+        self._slot = 0
+        self._count = 0
+
+    def add(self, pdf_path, source):
+        """把 pdf_path 的所有页排入输出; source 为原始文件 (用于标签和任务名称)"""
+        import fitz  # PyMuPDF
+
+        finished = []
+        # 先打开源文件, 打不开时不影响当前输出
+        src = fitz.open(pdf_path)
+        checkpoint = None
+        try:
+            if self._doc is not None and (not self.pack or self._job.sheets >= self.max_sheets):
+                finished.append(self._save())
+            if self._doc is None:
+                self._start()
+            checkpoint = self._checkpoint()
+            if self.layout == "booklet":
+                self._add_booklet(src)
+            else:
+                self._add_pages(src, os.path.basename(source))
+            self._job.sources.append(source)
+            self._job.pages += src.page_count
+        except Exception:
+            # 排了一半的输出中还没有其他文件时直接丢弃, 否则撤销这个文件已经排入的内容
+            if self._job is not None and not self._job.sources:
+                self.close()
+            elif checkpoint is not None:
+                self._rollback(checkpoint)
+            raise
+        finally:
+            src.close()
+        if not self.pack:
+            finished.append(self._save())
+        return finished
+
+    def finish(self):
+        return [self._save()] if self._doc is not None else []
+
+    def close(self):
+        """放弃尚未保存的输出 (出错时)"""
+        if self._doc is not None:
+            self._doc.close()
+            self._doc = self._job = self._page = None
+
+    def _start(self):
+        import fitz
+
+        self._count += 1
+        self._doc = fitz.open()
+        self._job = ImposedJob(os.path.join(self.output_dir, f"imposed_{self._count:04d}.pdf"))
+        self._page = None
+        self._slot = 0
+
+    def _checkpoint(self):
+        """
+        记录排入下一个文件之前的状态, 供 _rollback 恢复:
+        (页数, 当前格子, 纸张数, 当前纸张及其资源的 PDF 对象定义)
+        """
+        objects = []
+        if self._page is not None:
+            objects.append((self._page.xref, self._doc.xref_object(self._page.xref)))
+            kind, value = self._doc.xref_get_key(self._page.xref, "Resources")
+            if kind == "xref":
+                xref = int(value.split()[0])
+                objects.append((xref, self._doc.xref_object(xref)))
+        return self._doc.page_count, self._slot, self._job.sheets, objects
+
+    def _rollback(self, checkpoint):
+        """撤销 _checkpoint 之后排入的页面 (合并排版时一个文件中途出错)"""
+        page_count, slot, sheets, objects = checkpoint
+        if self._doc.page_count > page_count:
+            self._doc.delete_pages(page_count, self._doc.page_count - 1)
+        # 当前纸张上新加的内容流和资源引用被去掉, 保存时 garbage 清理不再引用的对象
+        for xref, source in objects:
+            self._doc.update_object(xref, source)
+        self._page = self._doc[page_count - 1] if objects else None
+        self._slot = slot
+        self._job.sheets = sheets
+
+    def _new_sheet(self):
+        width, height = sheet_size(self.layout)
+        self._page = self._doc.new_page(width=width, height=height)
+        self._slot = 0
+        self._job.sheets += 1
+
+    def _add_pages(self, src, label):
+        for pno in range(src.page_count):
+            if self._page is None or self._slot == len(self._slots):
+                self._new_sheet()
+            rect = self._slots[self._slot]
+            if self.pack and pno == 0:
+                self._draw_label(rect, label)
+            self._show(rect, src, pno, label_band=self.pack)
+            self._slot += 1
+
+    def _add_booklet(self, src):
+        for side in booklet_order(src.page_count):
+            self._new_sheet()
+            for rect, pno in zip(self._slots, side):
+                if pno is not None:
+                    self._show(rect, src, pno)
+
+    def _show(self, rect, src, pno, label_band=False):
+        import fitz
+
+        x0, y0, x1, y1 = rect
+        top = y0 + SLOT_MARGIN + (LABEL_HEIGHT if label_band else 0)
+        try:
+            self._page.show_pdf_page(
+                fitz.Rect(x0 + SLOT_MARGIN, top, x1 - SLOT_MARGIN, y1 - SLOT_MARGIN), src, pno
+            )
+        except ValueError:
+            # 没有内容的空白页, 格子留空
+            logger.info(f"拼版时跳过空白页: 第 {pno + 1} 页")
+
+    def _draw_label(self, rect, label):
+        import fitz
+
+        x0, y0, x1, _ = rect
+        width = x1 - x0 - 2 * SLOT_MARGIN
+        # 中文字体中的西文字符是等宽的, 纯英文文件名用 Helvetica 更紧凑
+        fontname = "helv" if label.isascii() else LABEL_FONT
+        ellipsis = "..." if fontname == "helv" else "…"
+        text, keep = label, len(label)
+        while keep > 1 and fitz.get_text_length(text, fontname=fontname, fontsize=LABEL_FONT_SIZE) > width:
+            keep -= 1
+            text = label[:keep] + ellipsis
+        baseline = y0 + SLOT_MARGIN + LABEL_FONT_SIZE
+        self._page.insert_text((x0 + SLOT_MARGIN, baseline), text, fontname=fontname, fontsize=LABEL_FONT_SIZE)
+        line_y = y0 + SLOT_MARGIN + LABEL_HEIGHT - 2
+        self._page.draw_line((x0 + SLOT_MARGIN, line_y), (x1 - SLOT_MARGIN, line_y), width=0.5)
+
+    def _save(self):
+        job = self._job
+        self._doc.save(job.path, garbage=1, deflate=True)
+        self._doc.close()
+        self._doc = self._job = self._page = None
+        logger.info(f"拼版完成: {job.path} ({len(job.sources)} 个文件, {job.pages} 页 -> {job.sheets} 面)")
+        return job
@@ -0,0 +1,212 @@
+# printall/journal.py
+"""
+水印和打印任务的预写日志 (每种命令一个 SQLite 数据库, 只保存最近一次任务)。
+
+任务开始时记下文件夹和参数, 每个文件经过 queued -> in-progress -> done / failed 四种状态。
+数据库使用 WAL 和 synchronous=FULL, 每次提交 (检查点) 都会 fsync, 程序崩溃或断电后
+已提交的状态不会丢失。
+
+- 水印: 扫描到的文件逐批记为 queued 并提交后才开始处理, 开始处理的文件一定已经记录;
+  每个文件处理完立即提交 (图片不能识别已有的水印, 重复处理会印上两次),
+  in-progress 只按记录数和时间定期提交;
+- 打印: 提交每个打印任务前后都立即提交, 继续时不会重复发送已经成功的任务。
+
+"继续上次的任务" 只重新处理状态不是 done 的文件 (包括上次失败的文件)。
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+from typing import NamedTuple
+
+from .config import LOGGER_NAME, state_dir
+
+logger = logging.getLogger(LOGGER_NAME)
+
+QUEUED = "queued"
+IN_PROGRESS = "in-progress"
+DONE = "done"
+FAILED = "failed"
+
+# 不要求立即提交的状态变化, 每记录这么多次或距上次提交超过这么多秒, 提交一次
+_CHECKPOINT_EVERY = 200
+_CHECKPOINT_SECONDS = 1.0
+# 边扫描边处理时, 每扫描到这么多个文件提交一次 queued 状态
+_QUEUE_BATCH = 64
+
+
+class JournalError(Exception):
+    """没有可以继续的任务"""
+
+
+class JournalItem(NamedTuple):
+    path: str
+    kind: str
+    state: str
+    error: str = None
+
+
+class JournalRun(NamedTuple):
+    folder: str
+    params: dict    # 重建任务参数所需的内容, 由调用方决定
+    started: float
+    finished: float  # 正常结束的时间, 中途退出时为 None
+
+
+def default_journal_dir():
+    return state_dir("journal")
+
+
+def replace_durably(temp_path, path):
+    """
+    用写好的临时文件替换 path: 先把临时文件 fsync 到磁盘, 再 os.replace (原子操作),
+    最后 fsync 所在目录 (POSIX)。任何时刻崩溃, path 要么是原文件, 要么是完整的新文件。
+    """
+    with open(temp_path, "rb+") as f:
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    if os.name == "posix":
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class JobJournal:
+    """只能在创建它的线程中使用"""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # 每次提交都 fsync
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS run ("
+            " id INTEGER PRIMARY KEY CHECK (id = 1),"
+            " folder TEXT NOT NULL,"
+            " params TEXT NOT NULL,"
+            " started REAL NOT NULL,"
+            " finished REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            " seq INTEGER PRIMARY KEY,"
+            " path TEXT UNIQUE NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " state TEXT NOT NULL,"
+            " error TEXT,"
+            " updated REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._pending = 0
+        self._last_checkpoint = time.monotonic()
+
+    @classmethod
+    def open(cls, command, directory=None):
+        """打开 command ("watermark" / "print") 的任务日志; 无法打开时返回 None (本次不记录)"""
+        directory = directory or default_journal_dir()
+        try:
+            os.makedirs(directory, exist_ok=True)
+            return cls(os.path.join(directory, f"{command}.sqlite"))
+        except (OSError, sqlite3.Error):
+            logger.warning(f"无法打开任务日志, 本次任务中断后不能继续: {directory}", exc_info=True)
+            return None
+
+    def start(self, folder, params):
+        """开始新的任务, 清除上一次任务的记录"""
+        self._conn.execute("DELETE FROM items")
+        self._conn.execute(
+            "INSERT OR REPLACE INTO run (id, folder, params, started, finished) VALUES (1, ?, ?, ?, NULL)",
+            (os.path.abspath(folder), json.dumps(params, ensure_ascii=False), time.time()),
+        )
+        self.checkpoint()
+
+    def last_run(self):
+        """最近一次任务的 JournalRun, 没有记录时返回 None"""
+        row = self._conn.execute("SELECT folder, params, started, finished FROM run WHERE id = 1").fetchone()
+        if row is None:
+            return None
+        folder, params, started, finished = row
+        return JournalRun(folder, json.loads(params), started, finished)
+
+    def queue(self, path, kind, sync=False):
+        self._conn.execute(
+            "INSERT OR IGNORE INTO items (path, kind, state, updated) VALUES (?, ?, ?, ?)",
+            (os.path.abspath(path), kind, QUEUED, time.time()),
+        )
+        self._changed(sync)
+
+    def queued(self, items, batch=_QUEUE_BATCH):
+        """
+        把 items 中的 (路径, 类型) 逐批记为 queued, 提交后再产出:
+        调用方开始处理一个文件时, 它一定已经写入磁盘, 继续任务时不会漏掉。
+        """
+        pending = []
+        for item in items:
+            self.queue(*item)
+            pending.append(item)
+            if len(pending) >= batch:
+                self.checkpoint()
+                yield from pending
+                pending = []
+        self.checkpoint()
+        yield from pending
+
+    def mark(self, path, state, error=None, sync=False):
+        """记录文件的新状态; sync 为 True 时立即提交 (fsync), 否则按检查点间隔提交"""
+        self._conn.execute(
+            "UPDATE items SET state = ?, error = ?, updated = ? WHERE path = ?",
+            (state, error, time.time(), os.path.abspath(path)),
+        )
+        self._changed(sync)
+
+    def unfinished(self):
+        """状态不是 done 的文件 (JournalItem), 按加入的顺序"""
+        rows = self._conn.execute(
+            "SELECT path, kind, state, error FROM items WHERE state != ? ORDER BY seq", (DONE,)
+        ).fetchall()
+        return [JournalItem(*row) for row in rows]
+
+    def state_counts(self):
+        return dict(self._conn.execute("SELECT state, COUNT(*) FROM items GROUP BY state").fetchall())
+
+    def finish(self):
+        """任务正常结束 (失败的文件仍可在继续时重试)"""
+        self._conn.execute("UPDATE run SET finished = ? WHERE id = 1", (time.time(),))
+        self.checkpoint()
+
+    def checkpoint(self):
+        self._conn.commit()
+        self._pending = 0
+        self._last_checkpoint = time.monotonic()
+
+    def _changed(self, sync):
+        self._pending += 1
+        if (
+            sync
+            or self._pending >= _CHECKPOINT_EVERY
+            or time.monotonic() - self._last_checkpoint >= _CHECKPOINT_SECONDS
+        ):
+            self.checkpoint()
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
+
+
+def open_last_run(command, directory=None):
+    """
+    打开 command 的任务日志, 返回 (JobJournal, JournalRun), 用于继续上次的任务。
+    没有记录时抛出 JournalError。
+    """
+    journal = JobJournal.open(command, directory)
+    if journal is None:
+        raise JournalError("无法打开任务日志。")
+    run = journal.last_run()
+    if run is None:
+        journal.close()
+        raise JournalError("没有可以继续的任务。")
+    return journal, run
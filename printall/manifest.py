@@ -0,0 +1,147 @@
+# printall/manifest.py
+"""
+水印处理清单 (每个文件夹一个 SQLite 数据库)。
+
+每个文件成功添加水印 (或确认已有水印) 后, 记录其相对路径、大小、修改时间和内容哈希。
+再次运行时只需对文件做一次 stat: 大小和修改时间都没变的文件直接跳过, 不必打开;
+只有修改时间变了而大小相同时才计算一次哈希确认内容是否真的变化。
+
+清单保存在程序的状态目录中 (与任务日志相同的位置), 以文件夹的绝对路径区分,
+不在用户的文件夹中留下任何文件。旧版本写在文件夹中的 .printall_manifest.sqlite
+会在第一次打开时导入并删除。
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+
+from .config import LOGGER_NAME, state_dir
+from .convcache import file_digest
+
+logger = logging.getLogger(LOGGER_NAME)
+
+# 旧版本保存在文件夹中的清单
+LEGACY_MANIFEST_NAME = ".printall_manifest.sqlite"
+
+# 每记录多少个文件提交一次事务
+_COMMIT_EVERY = 200
+
+
+def default_manifest_dir():
+    return state_dir("manifests")
+
+
+def manifest_path(folder, directory=None):
+    """文件夹对应的清单文件 (以规范化的绝对路径的哈希命名)"""
+    folder_key = os.path.normcase(os.path.realpath(folder))
+    name = hashlib.sha256(folder_key.encode("utf-8", "surrogatepass")).hexdigest()[:32]
+    return os.path.join(directory or default_manifest_dir(), f"{name}.sqlite")
+
+
+class WatermarkManifest:
+    """只能在创建它的线程中使用"""
+
+    def __init__(self, folder, directory=None):
+        self.folder = os.path.abspath(folder)
+        self.path = manifest_path(self.folder, directory)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " sha256 TEXT NOT NULL,"
+            " updated REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._pending = 0
+        self._import_legacy()
+
+    @classmethod
+    def open(cls, folder, directory=None):
+        """打开文件夹的清单; 状态目录不可写等原因无法打开时返回 None"""
+        try:
+            return cls(folder, directory)
+        except (OSError, sqlite3.Error):
+            logger.warning(f"无法打开水印清单, 本次不跳过未变更文件: {folder}", exc_info=True)
+            return None
+
+    def _import_legacy(self):
+        """导入旧版本写在文件夹中的清单, 然后把它 (连同 -wal/-shm) 从文件夹中删除"""
+        legacy = os.path.join(self.folder, LEGACY_MANIFEST_NAME)
+        if not os.path.isfile(legacy):
+            return
+        try:
+            self._conn.execute("ATTACH DATABASE ? AS legacy", (legacy,))
+            try:
+                self._conn.execute("INSERT OR IGNORE INTO files SELECT * FROM legacy.files")
+                self._conn.commit()
+            finally:
+                self._conn.execute("DETACH DATABASE legacy")
+        except sqlite3.Error:
+            logger.warning(f"无法导入旧的水印清单: {legacy}", exc_info=True)
+            return
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(legacy + suffix)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                logger.warning(f"无法删除旧的水印清单: {legacy}{suffix}", exc_info=True)
+        logger.info(f"已导入并删除文件夹中的旧水印清单: {legacy}")
+
+    def _key(self, path):
+        # 统一使用 "/" 分隔的相对路径 (与旧版本文件夹中的清单相同, 可以直接导入)
+        return os.path.relpath(os.path.abspath(path), self.folder).replace(os.sep, "/")
+
+    def is_unchanged(self, path, st=None):
+        """文件自上次成功处理后没有变化时返回 True"""
+        row = self._conn.execute(
+            "SELECT size, mtime_ns, sha256 FROM files WHERE path = ?", (self._key(path),)
+        ).fetchone()
+        if row is None:
+            return False
+        size, mtime_ns, digest = row
+        st = st or os.stat(path)
+        if st.st_size != size:
+            return False
+        if st.st_mtime_ns == mtime_ns:
+            return True
+        # 修改时间变了但大小相同 (例如被复制回来): 比较内容哈希
+        if file_digest(path) != digest:
+            return False
+        self._conn.execute(
+            "UPDATE files SET mtime_ns = ?, updated = ? WHERE path = ?",
+            (st.st_mtime_ns, time.time(), self._key(path)),
+        )
+        self._commit_later()
+        return True
+
+    def record(self, path, kind, size, mtime_ns, digest):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO files (path, kind, size, mtime_ns, sha256, updated)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (self._key(path), kind, size, mtime_ns, digest, time.time()),
+        )
+        self._commit_later()
+
+    def _commit_later(self):
+        self._pending += 1
+        if self._pending >= _COMMIT_EVERY:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
+
+
+def fingerprint(path):
+    """返回 (大小, 修改时间ns, SHA-256), 供处理成功后写入清单"""
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns, file_digest(path)
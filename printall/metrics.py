@@ -0,0 +1,327 @@
+# printall/metrics.py
+"""
+按文件、按阶段记录处理耗时和读写字节数。
+
+阶段:
+    scan     扫描文件夹、判断类型、检查清单
+    open     打开/解码 (读取文件、解析文档结构、解码像素)
+    analyze  分析 (亮度分析、检查已有水印、页数检查)
+    render   生成水印或页面内容 (docx/xlsx 流式修改边读边写, 整体计入此阶段)
+    save     保存或转换 (写回文件、图片转 PDF、LibreOffice 转换)
+    submit   提交打印
+
+处理函数不需要增加参数: 调用方用 track() 指定当前线程正在处理的文件,
+处理函数在每一步结束时调用 lap(阶段), 把上一步结束以来的时间计入该阶段;
+嵌套在其他步骤中的一段 (例如页数检查中的转换) 用 with stage(阶段) 单独计时,
+不会重复计入外层。没有正在记录的文件时这些调用什么都不做。
+
+一次运行的结果由 RunMetrics 汇总, 可以导出为 JSON、CSV 和 Prometheus 文本格式
+(可供 node_exporter 的 textfile collector 读取)。
+"""
+import os
+import csv
+import json
+import time
+import threading
+import contextlib
+from dataclasses import dataclass, field
+
+STAGES = ("scan", "open", "analyze", "render", "save", "submit")
+
+STAGE_LABELS = {
+    "scan": "扫描",
+    "open": "打开/解码",
+    "analyze": "分析",
+    "render": "渲染",
+    "save": "保存/转换",
+    "submit": "提交打印",
+}
+
+_local = threading.local()
+
+
+@dataclass
+class FileMetrics:
+    """一个文件的记录, 需要能被 pickle 从工作进程传回"""
+    path: str
+    kind: str
+    ok: bool = True
+    stages: dict = field(default_factory=dict)  # 阶段 -> 秒
+    bytes_read: int = 0
+    bytes_written: int = 0
+    _mark: float = field(default_factory=time.perf_counter, repr=False)
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.add(stage, now - self._mark)
+        self._mark = now
+
+    @property
+    def total(self):
+        return sum(self.stages.values())
+
+    def to_dict(self):
+        return {
+            "path": self.path,
+            "folder": os.path.dirname(self.path),
+            "kind": self.kind,
+            "ok": self.ok,
+            "total_s": round(self.total, 6),
+            "stages": {s: round(v, 6) for s, v in self.stages.items()},
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+        }
+
+
+def current():
+    """当前线程正在记录的文件, 没有时返回 None"""
+    return getattr(_local, "file", None)
+
+
+@contextlib.contextmanager
+def track(path, kind, file=None):
+    """在 with 块中把当前线程的阶段计时记到 file (默认新建) 上"""
+    file = file or FileMetrics(path, kind)
+    previous = current()
+    file._mark = time.perf_counter()
+    _local.file = file
+    try:
+        yield file
+    finally:
+        _local.file = previous
+
+
+def lap(stage):
+    """把上一次 lap (或 track 开始) 以来的时间计入 stage"""
+    file = current()
+    if file is not None:
+        file.lap(stage)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """单独计时 with 块, 这段时间不再计入外层的下一次 lap"""
+    file = current()
+    if file is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        file.add(name, elapsed)
+        file._mark += elapsed
+
+
+def add_bytes(read=0, written=0):
+    file = current()
+    if file is not None:
+        file.bytes_read += read
+        file.bytes_written += written
+
+
+def percentile(values, q):
+    """线性插值的分位数, q 为 0~1"""
+    values = sorted(values)
+    if not values:
+        return None
+    pos = (len(values) - 1) * q
+    low = int(pos)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (pos - low)
+
+
+def _stage_stats(files):
+    stats = {}
+    for name in STAGES:
+        values = [f.stages[name] for f in files if name in f.stages]
+        if values:
+            stats[name] = {
+                "count": len(values),
+                "p50": round(percentile(values, 0.5), 6),
+                "p95": round(percentile(values, 0.95), 6),
+                "max": round(max(values), 6),
+                "sum": round(sum(values), 6),
+            }
+    return stats
+
+
+class RunMetrics:
+    """一次水印或打印任务中所有文件的记录 (可以在多个线程中添加)"""
+
+    def __init__(self, command, folder):
+        self.command = command
+        self.folder = folder
+        self.started = time.time()
+        self.finished = None
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def file(self, path, kind):
+        """返回 path 的记录, 没有时新建"""
+        with self._lock:
+            record = self._files.get(path)
+            if record is None:
+                record = self._files[path] = FileMetrics(path, kind)
+            return record
+
+    def add(self, record):
+        """加入在其他进程中产生的记录 (与已有记录合并)"""
+        with self._lock:
+            existing = self._files.get(record.path)
+            if existing is None:
+                self._files[record.path] = record
+                return
+        for name, seconds in record.stages.items():
+            existing.add(name, seconds)
+        existing.bytes_read += record.bytes_read
+        existing.bytes_written += record.bytes_written
+        existing.ok = existing.ok and record.ok
+
+    def track(self, path, kind):
+        return track(path, kind, self.file(path, kind))
+
+    def finish(self):
+        self.finished = time.time()
+
+    @property
+    def files(self):
+        with self._lock:
+            return list(self._files.values())
+
+    def stage_summary(self):
+        """{阶段: {count, p50, p95, max, sum}}"""
+        return _stage_stats(self.files)
+
+    def kind_summary(self):
+        """{文件类型: {阶段: {...}}}"""
+        by_kind = {}
+        for record in self.files:
+            by_kind.setdefault(record.kind, []).append(record)
+        return {kind: _stage_stats(files) for kind, files in sorted(by_kind.items())}
+
+    def to_dict(self):
+        finished = self.finished or time.time()
+        return {
+            "command": self.command,
+            "folder": self.folder,
+            "started": self.started,
+            "finished": finished,
+            "duration_s": round(finished - self.started, 3),
+            "stages": self.stage_summary(),
+            "by_kind": self.kind_summary(),
+            "files": [record.to_dict() for record in self.files],
+        }
+
+    def format_summary(self):
+        """界面汇总对话框中显示的各阶段 p50 / p95"""
+        stats = self.stage_summary()
+        if not stats:
+            return ""
+        lines = ["各阶段耗时 (中位数 / p95):"]
+        for name, s in stats.items():
+            lines.append(
+                f"  - {STAGE_LABELS[name]}: {_format_seconds(s['p50'])} / {_format_seconds(s['p95'])}"
+                f" ({s['count']} 个文件)"
+            )
+        return "\n".join(lines)
+
+    # --- 导出 ---
+
+    def write_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    def write_csv(self, path):
+        # utf-8-sig: 用 Excel 直接打开时中文路径不乱码
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(
+                ["path", "folder", "kind", "ok", "bytes_read", "bytes_written", "total_s"]
+                + [f"{name}_s" for name in STAGES]
+            )
+            for record in self.files:
+                writer.writerow(
+                    [record.path, os.path.dirname(record.path), record.kind, int(record.ok),
+                     record.bytes_read, record.bytes_written, f"{record.total:.6f}"]
+                    + [f"{record.stages[name]:.6f}" if name in record.stages else "" for name in STAGES]
+                )
+
+    def prometheus_text(self):
+        command = _label_value(self.command)
+        lines = [
+            "# HELP printall_stage_seconds 每个文件在各处理阶段的耗时",
+            "# TYPE printall_stage_seconds summary",
+        ]
+        for kind, stats in self.kind_summary().items():
+            for name, s in stats.items():
+                labels = f'command="{command}",kind="{_label_value(kind)}",stage="{name}"'
+                lines.append(f'printall_stage_seconds{{{labels},quantile="0.5"}} {s["p50"]:.6f}')
+                lines.append(f'printall_stage_seconds{{{labels},quantile="0.95"}} {s["p95"]:.6f}')
+                lines.append(f"printall_stage_seconds_sum{{{labels}}} {s['sum']:.6f}")
+                lines.append(f"printall_stage_seconds_count{{{labels}}} {s['count']}")
+
+        files, read, written = {}, {}, {}
+        for record in self.files:
+            key = (record.kind, "ok" if record.ok else "failed")
+            files[key] = files.get(key, 0) + 1
+            read[record.kind] = read.get(record.kind, 0) + record.bytes_read
+            written[record.kind] = written.get(record.kind, 0) + record.bytes_written
+        lines += ["# HELP printall_files 处理的文件数", "# TYPE printall_files gauge"]
+        for (kind, status), count in sorted(files.items()):
+            lines.append(
+                f'printall_files{{command="{command}",kind="{_label_value(kind)}",status="{status}"}} {count}'
+            )
+        for metric, values, help_text in (
+            ("printall_bytes_read", read, "读取的字节数"),
+            ("printall_bytes_written", written, "写入的字节数"),
+        ):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+            for kind, value in sorted(values.items()):
+                lines.append(f'{metric}{{command="{command}",kind="{_label_value(kind)}"}} {value}')
+
+        finished = self.finished or time.time()
+        lines += [
+            "# HELP printall_run_duration_seconds 整个任务的耗时",
+            "# TYPE printall_run_duration_seconds gauge",
+            f'printall_run_duration_seconds{{command="{command}"}} {finished - self.started:.3f}',
+            "# HELP printall_run_finished_timestamp_seconds 任务结束的时间",
+            "# TYPE printall_run_finished_timestamp_seconds gauge",
+            f'printall_run_finished_timestamp_seconds{{command="{command}"}} {finished:.0f}',
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        # 先写临时文件再替换, textfile collector 不会读到写了一半的文件
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8", newline="\n") as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+    def export(self, directory):
+        """
+        写入 <命令>-<时间>.json / .csv, 以及每次覆盖的 printall_<命令>.prom,
+        返回写入的文件路径列表。
+        """
+        os.makedirs(directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started))
+        base = os.path.join(directory, f"{self.command}-{stamp}")
+        paths = [base + ".json", base + ".csv", os.path.join(directory, f"printall_{self.command}.prom")]
+        self.write_json(paths[0])
+        self.write_csv(paths[1])
+        self.write_prometheus(paths[2])
+        return paths
+
+
+def _format_seconds(seconds):
+    if seconds >= 1:
+        return f"{seconds:.2f} s"
+    return f"{seconds * 1000:.1f} ms"
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,293 @@
+# printall/office.py
+"""
+LibreOffice 常驻工作进程池。
+
+原来每次转换/打印都执行一次 `soffice --headless ...`, 每次冷启动要好几秒。
+这里维护一组常驻的 headless LibreOffice 工作进程 (见 office_worker.py):
+
+- 第一次请求时才启动 (懒加载), 每个工作进程使用独立的配置目录, 互不争抢配置锁;
+- 空闲的工作进程在复用前做健康检查 (ping), 无响应或出错的进程会被回收重建;
+- 每个工作进程处理一定数量的任务后主动回收, 避免 LibreOffice 长时间运行后内存膨胀;
+- 回收无响应的工作进程时结束整个进程树 (包括它启动的 soffice / soffice.bin)。
+
+打包 (Nuitka) 时应把 printall/office_worker.py 作为数据文件一起打包
+(--include-data-files=printall/office_worker.py=printall/office_worker.py),
+这样可以用 LibreOffice 自带的 Python 运行它; 没有这个文件时, 工作进程由程序自身的
+--office-worker 入口启动, 只能使用命令行模式。
+"""
+import os
+import sys
+import json
+import queue
+import atexit
+import shutil
+import logging
+import tempfile
+import threading
+import subprocess
+
+from . import office_worker
+from .config import LOGGER_NAME
+
+logger = logging.getLogger(LOGGER_NAME)
+
+OFFICE_WORKER_SCRIPT = os.path.abspath(office_worker.__file__)
+
+# 启动工作进程(包括 soffice 初始化配置目录)的最长等待时间
+STARTUP_TIMEOUT = 120
+# 健康检查的最长等待时间
+PING_TIMEOUT = 10
+# 工作进程自己会在请求超时时结束 soffice 并回复错误, 主程序多等这么多秒才判定它失去响应
+TIMEOUT_GRACE = 30
+
+
+class OfficeError(Exception):
+    """LibreOffice 转换或打印失败"""
+
+
+class OfficeWorkerLost(OfficeError):
+    """工作进程超时或意外退出, 状态未知, 需要回收"""
+
+
+def _is_frozen():
+    return getattr(sys, "frozen", False) or "__compiled__" in globals()
+
+
+def worker_command(soffice_path):
+    """
+    启动工作进程的命令 (不含 soffice 路径和配置目录两个参数)。
+    优先用 LibreOffice 自带的 Python (带 uno 模块) 运行 office_worker.py; 否则用当前解释器
+    运行 (此时工作进程退化为命令行模式)。打包后的程序用自身的 --office-worker 入口。
+    都不可用时返回 None。
+    """
+    if os.path.isfile(OFFICE_WORKER_SCRIPT):
+        program_dir = os.path.dirname(os.path.realpath(soffice_path))
+        for name in ("python.exe", "python", "python3"):
+            candidate = os.path.join(program_dir, name)
+            if os.path.isfile(candidate):
+                return [candidate, OFFICE_WORKER_SCRIPT]
+        if not _is_frozen():
+            return [sys.executable, OFFICE_WORKER_SCRIPT]
+    if _is_frozen():
+        # 编译打包后没有 .py 源文件可供外部解释器运行 (见 app.py 中的入口)
+        return [sys.executable, office_worker.WORKER_FLAG]
+    return None
+
+
+class _Worker:
+    """一个常驻工作进程及其配置目录"""
+
+    def __init__(self, soffice_path, profile_dir, command):
+        self.soffice_path = soffice_path
+        self.profile_dir = profile_dir
+        self.jobs = 0
+        self.mode = None
+        self._process = None
+        self._local = None
+        self._lines = queue.Queue()
+        if command:
+            self._process = subprocess.Popen(
+                command + [soffice_path, profile_dir],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                encoding="utf-8",
+                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+            )
+            threading.Thread(target=self._read_lines, daemon=True).start()
+            try:
+                self.mode = self._receive(STARTUP_TIMEOUT)
+            except Exception:
+                office_worker.kill_process_tree(self._process)
+                raise
+        else:
+            # 没有可用的解释器: 在当前进程内以命令行模式执行
+            self._local = office_worker.CliOffice(soffice_path, profile_dir)
+            self.mode = self._local.mode
+
+    def _read_lines(self):
+        for line in self._process.stdout:
+            self._lines.put(line)
+        self._lines.put(None)
+
+    def _receive(self, timeout):
+        try:
+            line = self._lines.get(timeout=timeout)
+        except queue.Empty:
+            raise OfficeWorkerLost(f"LibreOffice 工作进程超过 {timeout} 秒未响应")
+        if line is None:
+            raise OfficeWorkerLost("LibreOffice 工作进程意外退出")
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise OfficeError(response.get("error", "未知错误"))
+        return response.get("result")
+
+    def request(self, payload, timeout):
+        if self._local is not None:
+            op = payload["op"]
+            if op == "convert":
+                return self._local.convert(payload["src"], payload["outdir"], timeout)
+            if op == "print":
+                return self._local.print_file(payload["src"], payload["printer"], timeout)
+            return self._local.mode
+        payload = dict(payload, timeout=timeout)
+        try:
+            self._process.stdin.write(json.dumps(payload, ensure_ascii=False) + "\n")
+            self._process.stdin.flush()
+        except OSError as e:
+            raise OfficeWorkerLost(f"LibreOffice 工作进程不可用: {e}")
+        if payload["op"] in ("convert", "print"):
+            # 这两种请求由工作进程自己计时, 超时后它会回复错误
+            return self._receive(timeout + TIMEOUT_GRACE)
+        return self._receive(timeout)
+
+    def ping(self):
+        try:
+            self.request({"op": "ping"}, PING_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    def close(self, force=False):
+        if self._process is not None:
+            if not force:
+                try:
+                    self._process.stdin.write(json.dumps({"op": "quit"}) + "\n")
+                    self._process.stdin.close()
+                    self._process.wait(timeout=15)
+                except Exception:
+                    force = True
+            if force:
+                # 工作进程可能正卡在 soffice 调用中: 连同 soffice 一起结束, 再删除配置目录
+                office_worker.kill_process_tree(self._process)
+            self._process = None
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+
+class OfficePool:
+    """
+    LibreOffice 工作进程池, 线程安全。
+
+    size: 最多同时运行的工作进程数
+    max_jobs: 每个工作进程处理多少个任务后回收重建
+    """
+
+    def __init__(self, soffice_path, size=1, max_jobs=200):
+        self.soffice_path = soffice_path
+        self.size = max(1, size)
+        self.max_jobs = max_jobs
+        self._command = worker_command(soffice_path)
+        if self._command is None:
+            logger.warning("找不到可以运行 LibreOffice 工作进程的解释器, 每个请求都会单独启动一次 soffice。")
+        self._cli_warned = False
+        self._idle = []
+        self._cond = threading.Condition()
+        self._started = 0
+        self._closed = False
+        self._profile_root = None
+        atexit.register(self.close)
+
+    def _new_worker(self):
+        with self._cond:
+            if self._profile_root is None:
+                self._profile_root = tempfile.mkdtemp(prefix="printall_office_")
+        profile_dir = tempfile.mkdtemp(prefix="profile_", dir=self._profile_root)
+        try:
+            worker = _Worker(self.soffice_path, profile_dir, self._command)
+        except Exception:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+            raise
+        logger.info(f"已启动 LibreOffice 工作进程 ({worker.mode} 模式), 配置目录: {profile_dir}")
+        if worker.mode == "cli" and not self._cli_warned:
+            self._cli_warned = True
+            logger.warning("没有可用的 LibreOffice UNO 接口, 工作进程以命令行模式运行, 每个请求都会单独启动一次 soffice。")
+        return worker
+
+    def _acquire(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise OfficeError("LibreOffice 工作进程池已关闭")
+                    if self._idle:
+                        worker = self._idle.pop()
+                        break
+                    if self._started < self.size:
+                        # 懒加载: 需要时才启动新的工作进程
+                        self._started += 1
+                        worker = None
+                        break
+                    # 所有工作进程都在忙, 等待其中一个空闲
+                    self._cond.wait()
+            if worker is None:
+                try:
+                    return self._new_worker()
+                except Exception:
+                    self._forget()
+                    raise
+            if worker.ping():
+                return worker
+            logger.warning("LibreOffice 工作进程健康检查失败, 回收重建。")
+            self._discard(worker)
+
+    def _forget(self):
+        with self._cond:
+            self._started -= 1
+            self._cond.notify()
+
+    def _release(self, worker):
+        worker.jobs += 1
+        if worker.jobs >= self.max_jobs:
+            logger.info(f"LibreOffice 工作进程已处理 {worker.jobs} 个任务, 回收重建。")
+            self._discard(worker, force=False)
+            return
+        with self._cond:
+            if not self._closed:
+                self._idle.append(worker)
+                self._cond.notify()
+                return
+        worker.close()
+
+    def _discard(self, worker, force=True):
+        self._forget()
+        worker.close(force=force)
+
+    def _call(self, payload, timeout):
+        worker = self._acquire()
+        try:
+            result = worker.request(payload, timeout)
+        except OfficeWorkerLost:
+            # 超时或进程退出: 工作进程状态未知, 直接回收
+            self._discard(worker)
+            raise
+        except subprocess.TimeoutExpired:
+            self._release(worker)
+            raise OfficeError(f"LibreOffice 处理超时 ({timeout} 秒)")
+        except OfficeError:
+            self._release(worker)
+            raise
+        except Exception as e:
+            self._release(worker)
+            raise OfficeError(str(e)) from e
+        self._release(worker)
+        return result
+
+    def convert_to_pdf(self, src, outdir, timeout=60):
+        """把文档转换为 PDF, 返回生成的 PDF 路径"""
+        return self._call({"op": "convert", "src": os.path.abspath(src), "outdir": os.path.abspath(outdir)}, timeout)
+
+    def print_file(self, src, printer, timeout=300):
+        """把文档发送到指定打印机"""
+        self._call({"op": "print", "src": os.path.abspath(src), "printer": printer}, timeout)
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for worker in idle:
+            worker.close()
+        if self._profile_root:
+            shutil.rmtree(self._profile_root, ignore_errors=True)
@@ -0,0 +1,351 @@
+# printall/office_worker.py
+"""
+LibreOffice 常驻工作进程 (由 printall.office.OfficePool 启动)。
+
+每个工作进程使用独立的 -env:UserInstallation 配置目录, 启动一个带 --accept
+监听的 headless soffice, 通过 UNO 接收转换/打印请求, 避免每个文件都冷启动一次
+LibreOffice。
+
+与主程序之间用标准输入/输出逐行传递 JSON:
+    {"op": "convert", "src": ..., "outdir": ...}  -> {"ok": true, "result": pdf路径}
+    {"op": "print", "src": ..., "printer": ...}    -> {"ok": true}
+    {"op": "ping"}                                 -> {"ok": true, "result": "uno"/"cli"}
+    {"op": "quit"}
+
+此脚本会在 LibreOffice 自带的 Python 下运行 (那里才有 uno 模块), 因此只能依赖
+标准库, 也不要使用 3.8 以后的新语法。没有 uno 模块时(例如测试用的假 soffice),
+退化为对每个请求调用一次 soffice 命令行, 但仍复用同一个已初始化的配置目录。
+
+打包后的程序可以用 `程序 --office-worker <soffice> <配置目录>` 以本模块作为工作进程运行
+(见 main)。
+"""
+import os
+import sys
+import json
+import time
+import signal
+import pathlib
+import threading
+import subprocess
+
+CREATE_NO_WINDOW = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+# 打包后的程序以工作进程方式启动时使用的命令行参数
+WORKER_FLAG = "--office-worker"
+
+# 按文档类型选择 PDF 导出过滤器
+_PDF_EXPORT_FILTERS = [
+    ("com.sun.star.text.GenericTextDocument", "writer_pdf_Export"),
+    ("com.sun.star.sheet.SpreadsheetDocument", "calc_pdf_Export"),
+    ("com.sun.star.presentation.PresentationDocument", "impress_pdf_Export"),
+    ("com.sun.star.drawing.DrawingDocument", "draw_pdf_Export"),
+]
+
+
+def profile_url(profile_dir):
+    return pathlib.Path(os.path.abspath(profile_dir)).as_uri()
+
+
+def converted_pdf_path(src, outdir):
+    return os.path.join(outdir, os.path.splitext(os.path.basename(src))[0] + ".pdf")
+
+
+def _descendant_pids(pid):
+    """pid 的所有后代进程 (POSIX, 从 ps 的进程表中查找)"""
+    try:
+        output = subprocess.run(
+            ["ps", "-A", "-o", "pid=,ppid="], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=10
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return []
+    children = {}
+    for line in output.decode("ascii", "ignore").splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[0].isdigit() and parts[1].isdigit():
+            children.setdefault(int(parts[1]), []).append(int(parts[0]))
+    result = []
+    stack = [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            result.append(child)
+            stack.append(child)
+    return result
+
+
+def kill_process_tree(process):
+    """
+    结束 process 及其所有子进程并等待它退出。soffice 启动器会再启动 soffice.bin,
+    只结束启动器时真正工作的进程会继续运行, 并占用即将被删除的配置目录。
+    """
+    if process.poll() is None:
+        if os.name == "nt":
+            subprocess.run(
+                ["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                creationflags=CREATE_NO_WINDOW,
+            )
+        else:
+            for pid in [process.pid] + _descendant_pids(process.pid):
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except OSError:
+                    pass
+    if process.poll() is None:
+        try:
+            process.kill()
+        except OSError:
+            pass
+    process.wait()
+
+
+class CliOffice(object):
+    """每个请求调用一次 soffice 命令行 (复用本工作进程自己的配置目录)"""
+
+    mode = "cli"
+
+    def __init__(self, soffice, profile_dir):
+        self.soffice = soffice
+        self.profile_arg = "-env:UserInstallation=" + profile_url(profile_dir)
+
+    def _run(self, args, timeout):
+        command = [self.soffice, self.profile_arg, "--headless", "--norestore"] + args
+        process = subprocess.Popen(
+            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, creationflags=CREATE_NO_WINDOW
+        )
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+        except BaseException:
+            # 超时或被中断: 连同 soffice.bin 一起结束
+            kill_process_tree(process)
+            raise
+        if process.returncode != 0:
+            output = (stderr or stdout or b"").decode("utf-8", "ignore").strip()
+            raise RuntimeError("soffice 返回码 %d: %s" % (process.returncode, output))
+
+    def convert(self, src, outdir, timeout):
+        self._run(["--convert-to", "pdf", "--outdir", outdir, src], timeout)
+        pdf_path = converted_pdf_path(src, outdir)
+        if not os.path.exists(pdf_path):
+            raise RuntimeError("LibreOffice转换后未找到PDF文件: " + os.path.basename(pdf_path))
+        return pdf_path
+
+    def print_file(self, src, printer, timeout):
+        self._run(["--pt", printer, src], timeout)
+
+    def alive(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class UnoOffice(object):
+    """常驻 soffice 进程, 通过 --accept 管道监听接收 UNO 请求"""
+
+    mode = "uno"
+
+    def __init__(self, soffice, profile_dir, startup_timeout=60):
+        import uno  # noqa: F401  只在 LibreOffice 自带的 Python 中可用
+
+        self.soffice = soffice
+        self.profile_dir = profile_dir
+        self.pipe_name = "printall_%d" % os.getpid()
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self.desktop = None
+        self._start()
+
+    def _start(self):
+        import uno
+
+        command = [
+            self.soffice,
+            "-env:UserInstallation=" + profile_url(self.profile_dir),
+            "--headless",
+            "--invisible",
+            "--nologo",
+            "--nodefault",
+            "--norestore",
+            "--nolockcheck",
+            "--accept=pipe,name=%s;urp;StarOffice.ComponentContext" % self.pipe_name,
+        ]
+        self.process = subprocess.Popen(
+            command,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            creationflags=CREATE_NO_WINDOW,
+        )
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver", local_context
+        )
+        deadline = time.monotonic() + self.startup_timeout
+        while True:
+            try:
+                context = resolver.resolve(
+                    "uno:pipe,name=%s;urp;StarOffice.ComponentContext" % self.pipe_name
+                )
+                break
+            except Exception:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.close()
+                    raise RuntimeError("无法连接到 LibreOffice 监听管道")
+                time.sleep(0.2)
+        self.desktop = context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.frame.Desktop", context
+        )
+
+    @staticmethod
+    def _props(**kwargs):
+        from com.sun.star.beans import PropertyValue
+
+        props = []
+        for name, value in kwargs.items():
+            prop = PropertyValue()
+            prop.Name = name
+            prop.Value = value
+            props.append(prop)
+        return tuple(props)
+
+    def _load(self, src):
+        url = pathlib.Path(os.path.abspath(src)).as_uri()
+        doc = self.desktop.loadComponentFromURL(url, "_blank", 0, self._props(Hidden=True, ReadOnly=True))
+        if doc is None:
+            raise RuntimeError("LibreOffice 无法打开文件: " + os.path.basename(src))
+        return doc
+
+    def _within(self, timeout, func, *args):
+        """
+        调用 func, 超过 timeout 秒时结束 soffice 进程树, 让阻塞的 UNO 调用出错返回;
+        下一次健康检查时会重新启动 soffice。
+        """
+        if not timeout:
+            return func(*args)
+        expired = threading.Event()
+        process = self.process
+
+        def expire():
+            expired.set()
+            kill_process_tree(process)
+
+        timer = threading.Timer(timeout, expire)
+        timer.daemon = True
+        timer.start()
+        try:
+            return func(*args)
+        except Exception:
+            if expired.is_set():
+                raise RuntimeError("LibreOffice 处理超时 (%s 秒)" % timeout)
+            raise
+        finally:
+            timer.cancel()
+
+    def convert(self, src, outdir, timeout):
+        return self._within(timeout, self._convert, src, outdir)
+
+    def print_file(self, src, printer, timeout):
+        self._within(timeout, self._print_file, src, printer)
+
+    def _convert(self, src, outdir):
+        pdf_path = converted_pdf_path(src, outdir)
+        doc = self._load(src)
+        try:
+            filter_name = "writer_pdf_Export"
+            for service, name in _PDF_EXPORT_FILTERS:
+                if doc.supportsService(service):
+                    filter_name = name
+                    break
+            doc.storeToURL(pathlib.Path(os.path.abspath(pdf_path)).as_uri(), self._props(FilterName=filter_name))
+        finally:
+            doc.close(True)
+        return pdf_path
+
+    def _print_file(self, src, printer):
+        doc = self._load(src)
+        try:
+            doc.setPrinter(self._props(Name=printer))
+            doc.print(self._props(Wait=True))
+        finally:
+            doc.close(True)
+
+    def alive(self):
+        if self.process is None or self.process.poll() is not None:
+            return False
+        try:
+            self.desktop.getCurrentComponent()
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        if self.desktop is not None:
+            try:
+                self.desktop.terminate()
+            except Exception:
+                pass
+            self.desktop = None
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                kill_process_tree(self.process)
+            self.process = None
+
+
+def open_office(soffice, profile_dir):
+    try:
+        return UnoOffice(soffice, profile_dir)
+    except ImportError:
+        return CliOffice(soffice, profile_dir)
+
+
+def serve(soffice, profile_dir, stdin=None, stdout=None):
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    office = open_office(soffice, profile_dir)
+
+    def reply(payload):
+        stdout.write(json.dumps(payload, ensure_ascii=False) + "\n")
+        stdout.flush()
+
+    reply({"ok": True, "result": office.mode})
+    try:
+        for line in stdin:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            op = request.get("op")
+            if op == "quit":
+                break
+            timeout = request.get("timeout")
+            try:
+                if op == "ping":
+                    if not office.alive():
+                        # soffice 意外退出时在本进程内重启一次
+                        office.close()
+                        office = open_office(soffice, profile_dir)
+                    reply({"ok": True, "result": office.mode})
+                elif op == "convert":
+                    reply({"ok": True, "result": office.convert(request["src"], request["outdir"], timeout)})
+                elif op == "print":
+                    office.print_file(request["src"], request["printer"], timeout)
+                    reply({"ok": True})
+                else:
+                    reply({"ok": False, "error": "未知请求: %s" % op})
+            except Exception as e:
+                reply({"ok": False, "error": "%s: %s" % (type(e).__name__, e)})
+    finally:
+        office.close()
+
+
+def main(argv):
+    """argv: [soffice 路径, 配置目录]"""
+    # 标准输入/输出使用 UTF-8, 避免 Windows 下中文路径乱码
+    sys.stdin.reconfigure(encoding="utf-8")
+    sys.stdout.reconfigure(encoding="utf-8")
+    serve(argv[0], argv[1])
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
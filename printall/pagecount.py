@@ -0,0 +1,134 @@
+# printall/pagecount.py
+"""
+分级获取文档页数, 尽量不启动 LibreOffice。
+
+.docx 按以下顺序尝试, 并返回页数来源 (tier) 以便核对准确性:
+  1. metadata: 直接从压缩包读取 docProps/app.xml 中的 <Pages>
+     (Word 保存时写入的上次排版页数)。若 app.xml 比 word/document.xml 更旧,
+     或其中记录的字数 <Characters> 与正文实际字数相差很大, 说明文档被其他程序
+     修改过 (例如 python-docx 生成的文档沿用模板中的页数), 视为过期;
+  2. estimate: (可选) 根据 Word 上次排版留下的 w:lastRenderedPageBreak 标记、
+     显式分页符和正文字数粗略估算;
+  3. convert: 以上都不可用时转换为 PDF 后计数 (由调用方提供转换函数)。
+"""
+import re
+import math
+import zipfile
+import xml.etree.ElementTree as ET
+
+TIER_PDF = "pdf"
+TIER_METADATA = "metadata"
+TIER_ESTIMATE = "estimate"
+TIER_CONVERT = "convert"
+
+TIER_LABELS = {
+    TIER_PDF: "PDF",
+    TIER_METADATA: "文档属性",
+    TIER_ESTIMATE: "估算",
+    TIER_CONVERT: "转换",
+}
+
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+# 没有排版标记时按字数估算: A4 五号字正文每页大约的字符数
+CHARS_PER_PAGE = 1500
+
+
+def pdf_page_count(path):
+    from pypdf import PdfReader
+
+    with open(path, "rb") as f:
+        return len(PdfReader(f).pages)
+
+
+class _DocumentStats:
+    def __init__(self):
+        self.rendered_breaks = 0
+        self.explicit_breaks = 0
+        self.chars = 0  # 不含空白的字符数, 与 app.xml 中 <Characters> 的口径一致
+
+
+def _scan_document(zf):
+    """流式扫描 word/document.xml, 内存占用与文档大小无关"""
+    stats = _DocumentStats()
+    with zf.open("word/document.xml") as f:
+        for _, elem in ET.iterparse(f, events=("end",)):
+            tag = elem.tag
+            if tag == _W_NS + "lastRenderedPageBreak":
+                stats.rendered_breaks += 1
+            elif tag == _W_NS + "br" and elem.get(_W_NS + "type") == "page":
+                stats.explicit_breaks += 1
+            elif tag == _W_NS + "t" and elem.text:
+                stats.chars += len(elem.text) - sum(elem.text.count(c) for c in " \t\u3000")
+            elif tag == _W_NS + "p":
+                # 段落处理完后释放子元素, 保持内存平稳
+                elem.clear()
+    return stats
+
+
+def _app_value(app_xml, name):
+    match = re.search(rb"<(?:\w+:)?%s>\s*(\d+)\s*</" % name.encode("ascii"), app_xml)
+    return int(match.group(1)) if match else None
+
+
+def _metadata_page_count(zf, stats):
+    try:
+        app_info = zf.getinfo("docProps/app.xml")
+        document_info = zf.getinfo("word/document.xml")
+    except KeyError:
+        return None
+    if app_info.date_time < document_info.date_time:
+        # 正文在上次写入页数之后又被修改过
+        return None
+    app_xml = zf.read(app_info)
+    pages = _app_value(app_xml, "Pages")
+    if not pages:
+        return None
+    recorded_chars = _app_value(app_xml, "Characters")
+    if recorded_chars is not None:
+        # 文本框等内容在 document.xml 中可能出现两次, 所以容差放得比较宽
+        if abs(stats.chars - recorded_chars) > max(200, recorded_chars * 0.5):
+            return None
+    return pages
+
+
+def _estimated_page_count(stats):
+    if stats.rendered_breaks:
+        return stats.rendered_breaks + 1
+    return max(1, stats.explicit_breaks + 1, math.ceil(stats.chars / CHARS_PER_PAGE))
+
+
+def docx_page_count(path, allow_estimate=False):
+    """
+    不启动 LibreOffice 获取 .docx 页数, 返回 (页数, 来源)。
+    元数据不可信且不允许估算时返回 (None, None)。
+    """
+    with zipfile.ZipFile(path) as zf:
+        stats = _scan_document(zf)
+        pages = _metadata_page_count(zf, stats)
+    if pages:
+        return pages, TIER_METADATA
+    if allow_estimate:
+        return _estimated_page_count(stats), TIER_ESTIMATE
+    return None, None
+
+
+def resolve_page_count(path, convert_to_pdf=None, allow_estimate=False):
+    """
+    返回 (页数, 来源)。无法获取时页数为 None。
+    convert_to_pdf: 把文档转换为 PDF 并返回 PDF 路径的函数, 作为最后的手段。
+    """
+    lower = path.lower()
+    if lower.endswith(".pdf"):
+        return pdf_page_count(path), TIER_PDF
+    if lower.endswith(".docx"):
+        try:
+            pages, tier = docx_page_count(path, allow_estimate)
+            if pages:
+                return pages, tier
+        except (zipfile.BadZipFile, ET.ParseError, KeyError):
+            # 不是标准的 docx 压缩包 (例如改了扩展名的 .doc), 交给 LibreOffice
+            pass
+    if convert_to_pdf is None:
+        return None, None
+    return pdf_page_count(convert_to_pdf(path)), TIER_CONVERT
@@ -0,0 +1,386 @@
+# printall/parallel.py
+"""
+并行水印引擎: 把文件分发到进程池中处理。
+
+- 进程数默认等于 CPU 核心数;
+- 按文件预估内存占用, 同时在处理中的文件预估内存总和不超过可用内存的一定比例,
+  避免多个大图片/大PDF同时解码把内存撑爆;
+- 工作进程中的界面日志和文件日志都随结果一起返回, 由调用方按文件顺序输出,
+  同一个文件的日志不会和其他文件交错;
+- 增量模式下, 清单中记录的未变更文件只做一次 stat 就跳过 (见 manifest.py);
+- 每个文件的状态写入任务日志 (见 journal.py), 中断后可以只继续处理未完成的文件。
+"""
+import os
+import sys
+import time
+import logging
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field, asdict
+from logging.handlers import QueueHandler
+
+from . import metrics, bigimage
+from .config import LOGGER_NAME
+from .discovery import DEFAULT_SCAN_WORKERS, extension_map, iter_files
+from .watermark import WATERMARK_HANDLERS, WatermarkOptions
+from .manifest import WatermarkManifest, fingerprint
+from . import journal as jobjournal
+
+logger = logging.getLogger(LOGGER_NAME)
+
+PIC_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+KIND_LABELS = {"word": "[Word]", "excel": "[Excel]", "pic": "[图片]", "pdf": "[PDF]"}
+
+# 同时处理中的文件预估内存总和最多占可用内存的比例
+MEMORY_BUDGET_RATIO = 0.7
+
+
+@dataclass
+class WatermarkResult:
+    path: str
+    kind: str
+    ok: bool
+    messages: list = field(default_factory=list)  # 界面日志行
+    records: list = field(default_factory=list)   # 工作进程中产生的 logging.LogRecord
+    fingerprint: tuple = None                     # 成功后文件的 (大小, 修改时间ns, SHA-256)
+    unchanged: bool = False                       # 清单中记录为未变更而跳过
+    metrics: object = None                        # metrics.FileMetrics, 各阶段耗时和读写字节数
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def classify_watermark_file(filename, kinds):
+    """根据扩展名判断文件的水印类型, 不需要处理时返回 None"""
+    if filename.startswith("~"):
+        return None
+    filename_lower = filename.lower()
+    if "word" in kinds and filename_lower.endswith(".docx"):
+        return "word"
+    if "excel" in kinds and filename_lower.endswith(".xlsx"):
+        return "excel"
+    if "pic" in kinds and filename_lower.endswith(PIC_EXTENSIONS):
+        return "pic"
+    if "pdf" in kinds and filename_lower.endswith(".pdf"):
+        return "pdf"
+    return None
+
+
+def available_memory():
+    """返回当前可用物理内存(字节), 无法获取时返回 None"""
+    try:
+        if sys.platform == "win32":
+            import ctypes
+
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [
+                    ("dwLength", ctypes.c_ulong),
+                    ("dwMemoryLoad", ctypes.c_ulong),
+                    ("ullTotalPhys", ctypes.c_ulonglong),
+                    ("ullAvailPhys", ctypes.c_ulonglong),
+                    ("ullTotalPageFile", ctypes.c_ulonglong),
+                    ("ullAvailPageFile", ctypes.c_ulonglong),
+                    ("ullTotalVirtual", ctypes.c_ulonglong),
+                    ("ullAvailVirtual", ctypes.c_ulonglong),
+                    ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+                ]
+
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                return status.ullAvailPhys
+            return None
+        with open("/proc/meminfo", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except Exception:
+        logger.debug("无法获取可用内存。", exc_info=True)
+    return None
+
+
+def estimate_task_memory(path, kind, options=None):
+    """粗略估计处理一个文件时的峰值内存(字节)"""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return 0
+    if kind == "pic":
+        try:
+            # 只读取文件头, 不会解码像素
+            with bigimage.open_image(path) as img:
+                width, height = img.size
+            limits = options.large_image_limits if options else bigimage.LargeImageLimits()
+            if limits.is_large((width, height)):
+                # 大图片分带处理或整张处理, 都不超过大图片的内存预算 (超出时直接失败)
+                return limits.memory_bytes
+            # 解码后的原图, 加上调色板/CMYK 等模式整体转换时的一份副本
+            return width * height * 4 * 2
+        except Exception:
+            return size * 10
+    if kind == "pdf":
+        return size * 4
+    # docx/xlsx 是压缩的 XML, 解析后通常膨胀十倍以上
+    return size * 10
+
+
+class _ListQueue(list):
+    """给 QueueHandler 用的简单队列, 只在单个工作进程内部使用"""
+    put_nowait = list.append
+
+
+_captured_records = _ListQueue()
+
+
+def _init_worker():
+    """工作进程初始化: 把 PrintALLAppLogger 的记录收集起来, 随结果返回给主进程"""
+    worker_logger = logging.getLogger(LOGGER_NAME)
+    worker_logger.handlers.clear()
+    worker_logger.addHandler(QueueHandler(_captured_records))
+    worker_logger.setLevel(logging.INFO)
+    worker_logger.propagate = False
+
+
+def _process_file(path, kind, options, with_fingerprint):
+    messages = []
+    with metrics.track(path, kind) as file_metrics:
+        before = _stat_or_none(path)
+        ok = WATERMARK_HANDLERS[kind](path, options, messages.append)
+        after = _stat_or_none(path)
+    file_metrics.ok = ok
+    if before:
+        file_metrics.bytes_read = before.st_size
+        # 跳过 (已有水印) 的文件没有写入
+        if after and (after.st_mtime_ns, after.st_size) != (before.st_mtime_ns, before.st_size):
+            file_metrics.bytes_written = after.st_size
+    result = WatermarkResult(path, kind, ok, messages, metrics=file_metrics)
+    if ok and with_fingerprint:
+        try:
+            # 在工作进程中计算哈希, 主进程只负责写清单
+            result.fingerprint = fingerprint(path)
+        except OSError:
+            logger.warning(f"无法读取文件指纹: {path}", exc_info=True)
+    return result
+
+
+def _failed_result(path, kind, error):
+    message = f"{KIND_LABELS[kind]} ❌ 失败: {os.path.basename(path)} - {error}"
+    return WatermarkResult(path, kind, False, [message])
+
+
+def _stat_or_none(path):
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+def _watermark_task(path, kind, options, with_fingerprint):
+    result = _process_file(path, kind, options, with_fingerprint)
+    result.records = list(_captured_records)
+    _captured_records.clear()
+    return result
+
+
+def watermark_extension_map(kinds):
+    """水印类型集合 -> discovery 使用的 {扩展名: 类型}"""
+    extensions = {"word": "docx", "excel": "xlsx", "pic": PIC_EXTENSIONS, "pdf": "pdf"}
+    return extension_map({extensions[kind]: kind for kind in kinds if kind in extensions})
+
+
+def iter_watermark_tasks(folder, kinds, scan_workers=DEFAULT_SCAN_WORKERS):
+    # 子文件夹并行扫描, 边扫描边产出, 第一个文件不必等整个目录树列完
+    for found in iter_files(folder, watermark_extension_map(kinds), recursive=True, workers=scan_workers):
+        yield found.path, found.kind
+
+
+def run_watermark_batch(
+    folder, kinds, options, workers=None, on_result=None, memory_budget=None, incremental=False, run_metrics=None,
+    journal=None, resume=False,
+):
+    """
+    对文件夹(含子文件夹)中指定类型的文件批量添加水印。
+
+    kinds: "word"/"excel"/"pic"/"pdf" 的集合
+    workers: 进程数, 默认等于 CPU 核心数; 为 1 时直接在当前线程中处理
+    on_result: 每个文件处理完成后在调用线程中回调, 参数为 WatermarkResult
+    memory_budget: 同时处理中的文件预估内存上限(字节), 默认按可用内存计算
+    incremental: 使用文件夹中的清单跳过上次处理后未变更的文件
+    run_metrics: metrics.RunMetrics, 记录每个文件各阶段的耗时
+    journal: journal.JobJournal, 记录每个文件的状态; 为 None 时不记录
+    resume: 不扫描文件夹, 只处理 journal 中上次没有完成的文件 (见 resume_watermark_batch)
+    返回与原来汇总格式一致的计数字典; 未变更而跳过的文件按成功计数,
+    另外在 "unchanged" 中单独统计, 处理失败的文件数在 "failed" 中。
+    """
+    counts = {"word": 0, "excel": 0, "pic": 0, "pdf": 0, "total": 0, "unchanged": 0, "failed": 0}
+    workers = max(1, workers or default_workers())
+    if journal is not None and not resume:
+        journal.start(folder, watermark_run_params(kinds, options, incremental))
+    manifest = WatermarkManifest.open(folder) if incremental else None
+    try:
+        _run_batch(folder, kinds, options, workers, on_result, memory_budget, manifest, counts, run_metrics,
+                   journal, resume)
+    finally:
+        if manifest:
+            manifest.close()
+    if journal is not None:
+        journal.finish()
+    return counts
+
+
+def watermark_run_params(kinds, options, incremental):
+    """写入任务日志的参数, 继续任务时用 resume_watermark_batch 还原"""
+    return {"kinds": sorted(kinds), "options": asdict(options), "incremental": incremental}
+
+
+def resume_watermark_batch(journal, run, workers=None, on_result=None, memory_budget=None, run_metrics=None):
+    """
+    继续 journal 中记录的上一次水印任务 (run 为 journal.last_run()),
+    文件夹、类型和水印参数与上次相同, 只处理上次没有完成 (包括失败) 的文件。
+    """
+    params = run.params
+    return run_watermark_batch(
+        run.folder,
+        set(params["kinds"]),
+        WatermarkOptions(**params["options"]),
+        workers=workers,
+        on_result=on_result,
+        memory_budget=memory_budget,
+        incremental=params["incremental"],
+        run_metrics=run_metrics,
+        journal=journal,
+        resume=True,
+    )
+
+
+def _run_batch(folder, kinds, options, workers, on_result, memory_budget, manifest, counts, run_metrics,
+               journal, resume):
+    scan_seconds = {}  # 路径 -> 扫描耗时 (在主进程中测得)
+
+    def handle(result):
+        if result.ok:
+            counts[result.kind] += 1
+        else:
+            counts["failed"] += 1
+        if result.unchanged:
+            counts["unchanged"] += 1
+        counts["total"] += 1
+        for record in result.records:
+            logger.handle(record)
+        if manifest and result.fingerprint:
+            manifest.record(result.path, result.kind, *result.fingerprint)
+        if journal is not None:
+            error = None if result.ok else (result.messages[-1] if result.messages else "处理失败")
+            journal.mark(result.path, jobjournal.DONE if result.ok else jobjournal.FAILED, error, sync=True)
+        if run_metrics is not None:
+            file_metrics = result.metrics or metrics.FileMetrics(result.path, result.kind, result.ok)
+            file_metrics.add("scan", scan_seconds.pop(result.path, 0.0))
+            run_metrics.add(file_metrics)
+        if on_result:
+            on_result(result)
+
+    def pending_tasks():
+        if resume:
+            items = [(item.path, item.kind) for item in journal.unfinished()]
+            logger.info(f"继续上次的水印任务: {len(items)} 个文件未完成")
+        else:
+            items = iter_watermark_tasks(folder, kinds)
+            if journal is not None:
+                items = journal.queued(items)
+        # 两次产出之间的时间 (遍历目录、判断类型、检查清单) 计为下一个文件的扫描耗时
+        mark = time.perf_counter()
+        for path, kind in items:
+            if manifest:
+                try:
+                    unchanged = manifest.is_unchanged(path)
+                except OSError:
+                    # 文件在扫描后被删除等情况, 交给处理函数报告错误
+                    unchanged = False
+                if unchanged:
+                    scan_seconds[path] = time.perf_counter() - mark
+                    handle(WatermarkResult(path, kind, True, unchanged=True))
+                    mark = time.perf_counter()
+                    continue
+            scan_seconds[path] = time.perf_counter() - mark
+            yield path, kind
+            mark = time.perf_counter()
+
+    tasks = pending_tasks()
+    with_fingerprint = manifest is not None
+
+    def started(path):
+        if journal is not None:
+            journal.mark(path, jobjournal.IN_PROGRESS)
+
+    if workers == 1:
+        for path, kind in tasks:
+            started(path)
+            try:
+                result = _process_file(path, kind, options, with_fingerprint)
+            except Exception as e:
+                # 处理函数之外的意外错误也只让这个文件失败, 与进程池中的处理方式一致
+                logger.error(f"处理文件'{path}'时发生未知错误.", exc_info=True)
+                result = _failed_result(path, kind, e)
+            handle(result)
+        return
+
+    if memory_budget is None:
+        available = available_memory()
+        memory_budget = available * MEMORY_BUDGET_RATIO if available else float("inf")
+    logger.info(f"并行水印: {workers} 个进程, 内存预算: {memory_budget / 1024 / 1024:.0f} MB")
+
+    in_flight = {}  # future -> 预估内存
+    broken = False  # 有工作进程异常退出, 进程池已不能再提交任务
+
+    def new_pool():
+        return concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+
+    def drain(return_when):
+        nonlocal broken
+        done, _ = concurrent.futures.wait(in_flight, return_when=return_when)
+        for future in done:
+            in_flight.pop(future)
+            try:
+                handle(future.result())
+            except Exception as e:
+                # 工作进程异常退出 (例如内存不足被系统杀死)
+                path, kind = future.task
+                logger.error(f"处理文件'{path}'时工作进程异常退出.", exc_info=True)
+                handle(_failed_result(path, kind, e))
+                broken = broken or isinstance(e, BrokenProcessPool)
+
+    def submit(path, kind):
+        nonlocal pool, broken
+        if not broken:
+            try:
+                return pool.submit(_watermark_task, path, kind, options, with_fingerprint)
+            except BrokenProcessPool:
+                pass
+        # 进程池损坏后其中处理中的文件都会失败: 先把它们记为失败, 再换一个新的进程池继续处理后面的文件
+        while in_flight:
+            drain(concurrent.futures.ALL_COMPLETED)
+        pool.shutdown(wait=False, cancel_futures=True)
+        logger.warning("工作进程异常退出, 重新创建进程池")
+        pool = new_pool()
+        broken = False
+        return pool.submit(_watermark_task, path, kind, options, with_fingerprint)
+
+    pool = new_pool()
+    try:
+        for path, kind in tasks:
+            estimate = estimate_task_memory(path, kind, options)
+            # 队列里最多积压 2 倍进程数的任务, 且预估内存不超预算 (至少保证有一个任务在跑)
+            while in_flight and (
+                len(in_flight) >= workers * 2
+                or sum(in_flight.values()) + estimate > memory_budget
+            ):
+                drain(concurrent.futures.FIRST_COMPLETED)
+            started(path)
+            future = submit(path, kind)
+            future.task = (path, kind)
+            in_flight[future] = estimate
+        while in_flight:
+            drain(concurrent.futures.FIRST_COMPLETED)
+    finally:
+        pool.shutdown()
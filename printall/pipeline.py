@@ -0,0 +1,40 @@
+# printall/pipeline.py
+"""
+按顺序产出结果的并行流水线。
+
+ordered_map 在线程池中并行处理输入, 但严格按输入顺序把结果交给调用方:
+队首的任务一完成就立即交出, 不必等后面的任务。提交到线程池但尚未被调用方取走的
+任务最多 lookahead 个, 相当于各阶段之间的有界队列: 下游 (例如打印提交) 慢时,
+上游不会无限制地提前转换、占用磁盘和内存。
+"""
+import collections
+import concurrent.futures
+
+
+def ordered_map(func, items, workers, lookahead=None):
+    """
+    对 items 中的每一项在 workers 个线程中调用 func(item),
+    按 items 的顺序产出 (item, future); 产出时 future 已经完成, 用 future.result() 取结果
+    (func 抛出的异常也由它重新抛出)。
+    items 可以是生成器, 只在有空位时才读取下一项。
+    调用方提前结束迭代 (break 或异常) 时, 尚未开始的任务被取消, 正在运行的任务会等待结束。
+    """
+    workers = max(1, workers)
+    lookahead = max(workers, lookahead or workers * 2)
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="printall-pipeline")
+    pending = collections.deque()
+    try:
+        for item in items:
+            pending.append((item, pool.submit(func, item)))
+            if len(pending) >= lookahead:
+                item, future = pending.popleft()
+                concurrent.futures.wait([future])
+                yield item, future
+        while pending:
+            item, future = pending.popleft()
+            concurrent.futures.wait([future])
+            yield item, future
+    finally:
+        for _, future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
@@ -0,0 +1,719 @@
+# printall/printing.py
+"""
+批量打印引擎, 不依赖 Tk 界面。
+
+界面和命令行共用同一个 PrintEngine: 扫描文件夹、合并图片、按页数筛选,
+然后把准备好的 PDF 逐个交给打印后端 (见 spool.py)。界面日志通过 log(message) 回调输出,
+详细错误写入 PrintALLAppLogger, 结果以 PrintSummary 返回。
+每个文件的状态写入任务日志 (见 journal.py), 中断后继续时不会重复发送已经成功的打印任务。
+"""
+import os
+import time
+import shutil
+import logging
+import tempfile
+import threading
+import subprocess
+import contextlib
+from dataclasses import dataclass, field, asdict
+
+from . import metrics
+from . import journal as jobjournal
+from .config import LIBREOFFICE_PATH, LOGGER_NAME, PRINT_DPI, LARGE_IMAGE_MEGAPIXELS, LARGE_IMAGE_MEMORY_MB
+from .office import OfficePool, OfficeError
+from .spool import create_backend, resolve_backends, PrintBackendError
+from .convcache import ConversionCache
+from .pagecount import resolve_page_count, pdf_page_count, TIER_PDF, TIER_LABELS
+from .imagepdf import merge_images_to_pdf
+from .bigimage import LargeImageLimits
+from .pipeline import ordered_map
+from .discovery import FoundFile, discover, extension_map, path_key
+from .impose import LAYOUT_NAMES
+from .deps import PYWIN32_AVAILABLE, PYMUPDF_AVAILABLE
+
+logger = logging.getLogger(LOGGER_NAME)
+
+DOCUMENT_EXTENSIONS = ("doc", "docx", "pdf")
+IMAGE_EXTENSIONS = ("jpg", "png", "bmp")
+PRINT_EXTENSIONS = DOCUMENT_EXTENSIONS + IMAGE_EXTENSIONS
+
+MERGED_IMAGES_NAME = "_merged_images.pdf"
+# 合并图片的生成方式改变时加一, 使旧的缓存结果失效
+MERGED_IMAGES_FORMAT = 1
+
+
+class PrintSetupError(Exception):
+    """打印任务无法开始 (文件夹、打印机或 LibreOffice 路径无效)"""
+
+
+@dataclass
+class PrintOptions:
+    printer: str
+    extensions: tuple = PRINT_EXTENSIONS  # 要打印的扩展名 (不带点)
+    page_range: tuple = None              # (最少页数, 最多页数), None 表示不筛选
+    allow_estimate: bool = False          # 页数筛选时允许估算 .docx 页数
+    margin: int = 100                     # 图片页边距, PRINT_DPI 下的像素
+    prepare_workers: int = None           # 合并图片、页数检查、转换的并行线程数, None 表示 CPU 核心数
+    office_workers: int = None            # Word 页数检查/转换使用的 LibreOffice 实例数, None 表示自动
+    backend: str = "auto"                 # 打印后端, 见 spool.BACKEND_NAMES
+    layout: str = "1up"                   # 拼版方式, 见 impose.LAYOUT_NAMES
+    pack: bool = False                    # 2up/4up 时把多个短文档连续排在同一批纸上
+    recursive: bool = False               # 包含子文件夹
+    large_image_megapixels: float = LARGE_IMAGE_MEGAPIXELS  # 超过此像素数 (百万) 的图片分带缩小后合并
+    large_image_memory_mb: int = LARGE_IMAGE_MEMORY_MB      # 处理一张大图片的内存预算 (MB)
+
+
+@dataclass
+class PrintSummary:
+    found: int = 0                                    # 扫描到的文件数 (合并前的图片逐个计数)
+    merged_images: str = None                         # 图片合并后的 PDF
+    queued: list = field(default_factory=list)        # 通过筛选、按顺序发送的文件
+    filtered_out: list = field(default_factory=list)  # 页数不符合条件的文件
+    printed: list = field(default_factory=list)
+    failed: list = field(default_factory=list)        # [(文件, 错误信息)]
+    jobs: int = 0                                     # 成功提交的打印任务数 (拼版后可能少于文件数)
+    page_counts: dict = field(default_factory=dict)   # 文件 -> [页数, 来源]
+    tier_counts: dict = field(default_factory=dict)   # 页数来源 -> 文件数
+    metrics: object = None                            # metrics.RunMetrics, 每个文件各阶段的耗时
+
+    @property
+    def success(self):
+        return len(self.printed)
+
+    @property
+    def fail(self):
+        return len(self.failed)
+
+    def to_dict(self):
+        return {
+            "found": self.found,
+            "merged_images": self.merged_images,
+            "queued": self.queued,
+            "filtered_out": self.filtered_out,
+            "printed": self.printed,
+            "failed": [{"path": path, "error": error} for path, error in self.failed],
+            "jobs": self.jobs,
+            "page_counts": self.page_counts,
+            "tier_counts": self.tier_counts,
+            "success": self.success,
+            "fail": self.fail,
+            "stages": self.metrics.stage_summary() if self.metrics else {},
+        }
+
+
+@dataclass
+class _Prepared:
+    """流水线准备阶段的结果"""
+    page_count: int = None
+    tier: str = None
+    error: Exception = None  # 提前转换失败, 打印时报告
+    pdf_path: str = None     # 提前转换得到的缓存 PDF, 提交打印之前固定在缓存中 (见 _release)
+
+
+def default_prepare_workers():
+    return os.cpu_count() or 1
+
+
+def default_office_workers():
+    """每个 LibreOffice 实例要占用几百 MB 内存, 默认只用一半的核心, 最多 8 个"""
+    return max(1, min(8, (os.cpu_count() or 1) // 2))
+
+
+def _in_page_range(page_count, page_range):
+    # 页数未知的文件默认打印
+    return page_count is None or page_range[0] <= page_count <= page_range[1]
+
+
+def _track(run_metrics, path, kind):
+    """run_metrics 为 None 时不记录"""
+    if run_metrics is None:
+        return contextlib.nullcontext()
+    return run_metrics.track(path, kind)
+
+
+def _file_kind(path):
+    return os.path.splitext(path)[1].lower().lstrip(".")
+
+
+def default_printer():
+    """返回系统默认打印机名称, 无法获取时返回 None"""
+    if PYWIN32_AVAILABLE:
+        import win32print
+
+        try:
+            return win32print.GetDefaultPrinter()
+        except Exception:
+            logger.warning("获取默认打印机失败。", exc_info=True)
+        return None
+    printer = os.environ.get("PRINTER")
+    if printer:
+        return printer
+    lpstat = shutil.which("lpstat")
+    if lpstat:
+        # "system default destination: <打印机>"
+        try:
+            output = subprocess.run([lpstat, "-d"], capture_output=True, text=True, timeout=10).stdout
+        except (OSError, subprocess.TimeoutExpired):
+            logger.warning("获取默认打印机失败。", exc_info=True)
+            return None
+        if ":" in output:
+            return output.split(":", 1)[1].strip() or None
+    return None
+
+
+def print_run_params(options):
+    """写入任务日志的参数, 继续任务时用 print_options_from_params 还原"""
+    return {"options": asdict(options)}
+
+
+def print_options_from_params(params):
+    values = dict(params["options"])
+    values["extensions"] = tuple(values["extensions"])
+    if values["page_range"] is not None:
+        values["page_range"] = tuple(values["page_range"])
+    return PrintOptions(**values)
+
+
+def collect_print_files(folder, extensions, recursive=False):
+    """
+    返回 (图片列表, 文档列表), 元素为 discovery.FoundFile, 均已按自然顺序排好。
+    扩展名不区分大小写; recursive 为 True 时包含子文件夹。
+    """
+    mapping = extension_map({
+        ext: "image" if ext in IMAGE_EXTENSIONS else "document" for ext in extensions
+    })
+    found = discover(folder, mapping, recursive=recursive)
+    return [f for f in found if f.kind == "image"], [f for f in found if f.kind == "document"]
+
+
+class PrintEngine:
+    """
+    持有 LibreOffice 常驻工作进程池和 PDF 转换缓存, 多次打印任务之间复用。
+    soffice_path 和 office_workers 可以随时修改, 下次使用时重建进程池。
+    office_workers: 同时运行的 LibreOffice 实例数 (每个实例使用独立的配置目录)
+    """
+
+    def __init__(self, soffice_path=LIBREOFFICE_PATH, conversion_cache=None, office_workers=1):
+        self.soffice_path = soffice_path
+        self.office_workers = office_workers
+        self._office_pool = None
+        self._office_pool_lock = threading.Lock()
+        self._conversion_cache = conversion_cache
+        self.print_backend = None     # spool.PrintBackend, 提交 PDF; 由 check_setup 按 PrintOptions.backend 创建
+        self.document_backend = None  # spool.OfficeBackend, 不为 None 时 Word 文件由 LibreOffice 打印原始文档
+        self._journal = None       # journal.JobJournal, 只在 run 期间设置
+
+    def office_pool(self):
+        """获取 LibreOffice 常驻工作进程池, 路径或实例数变更后重建"""
+        size = max(1, self.office_workers)
+        with self._office_pool_lock:
+            pool = self._office_pool
+            if pool is None or pool.soffice_path != self.soffice_path or pool.size != size:
+                if pool is not None:
+                    pool.close()
+                pool = self._office_pool = OfficePool(self.soffice_path, size=size)
+            return pool
+
+    def conversion_cache(self):
+        if self._conversion_cache is None:
+            self._conversion_cache = ConversionCache()
+        return self._conversion_cache
+
+    def close(self):
+        with self._office_pool_lock:
+            if self._office_pool is not None:
+                self._office_pool.close()
+                self._office_pool = None
+
+    def convert_to_pdf(self, file_path, pin=False):
+        """
+        通过转换缓存获取 Word 文档对应的 PDF。
+        页数检查和打印使用同一份 PDF, 已转换过的文件不会再次转换。
+        pin 为 True 时返回的 PDF 在 conversion_cache().unpin 之前不会被缓存淘汰。
+        """
+        with metrics.stage("save"):
+            pdf_path, hit = self.conversion_cache().get_or_convert(
+                file_path, self.office_pool(), timeout=60, pin=pin
+            )
+        logger.info(f"{'命中' if hit else '写入'}PDF转换缓存: {file_path} -> {pdf_path}")
+        if not hit:
+            metrics.add_bytes(os.path.getsize(file_path), os.path.getsize(pdf_path))
+        return pdf_path
+
+    def page_count(self, file_path, log, allow_estimate=False):
+        """返回 (页数, 页数来源), 无法获取时页数为 None"""
+        _, ext = os.path.splitext(file_path)
+        ext = ext.lower()
+        if ext == ".pdf":
+            try:
+                return pdf_page_count(file_path), TIER_PDF
+            except Exception as e:
+                log(f"  [页数检查] 无法读取PDF页数: {os.path.basename(file_path)}. 错误: {e}")
+                logger.warning(f"无法读取PDF '{file_path}' 的页数。", exc_info=True)
+                return None, None
+        elif ext in [".doc", ".docx"]:
+            try:
+                # 先读 docx 自带的页数属性, 必要时才转换
+                return resolve_page_count(
+                    file_path,
+                    convert_to_pdf=self.convert_to_pdf,
+                    allow_estimate=allow_estimate,
+                )
+            except OfficeError as e:
+                log(f"  [页数检查] LibreOffice转换失败: {os.path.basename(file_path)}. 错误: {e}")
+                logger.error(f"LibreOffice转换失败: {file_path}", exc_info=True)
+                return None, None
+            except Exception as e:
+                log(f"  [页数检查] 获取页数失败: {os.path.basename(file_path)}. 错误: {e}")
+                logger.error(f"获取'{file_path}'页数时发生未知错误。", exc_info=True)
+                return None, None
+        return None, None
+
+    def document_pdf(self, file_path):
+        """Word 文件返回与页数检查相同的那份已转换PDF, 其他文件本身就是 PDF"""
+        if file_path.lower().endswith((".doc", ".docx")):
+            return self.convert_to_pdf(file_path)
+        return file_path
+
+    def submit_pdf(self, pdf_path, printer, title):
+        if self.print_backend is None:
+            self.print_backend = create_backend("auto", self.office_pool, printer)
+        self.print_backend.submit(pdf_path, printer, title)
+
+    def prints_original(self, file_path):
+        """Word 文件是否由 LibreOffice 直接打印原始文档 (而不是提交转换后的 PDF)"""
+        return self.document_backend is not None and file_path.lower().endswith((".doc", ".docx"))
+
+    def print_file(self, file_path, printer):
+        title = os.path.basename(file_path)
+        if self.prints_original(file_path):
+            self.document_backend.submit(file_path, printer, title)
+        else:
+            self.submit_pdf(self.document_pdf(file_path), printer, title)
+
+    def merge_images(self, images, output_path, margin, log, run_metrics=None, limits=None):
+        """
+        把图片逐张放到 A4 页面上, 直接写入一个 PDF (不生成每张图片的临时 PDF),
+        没有可用图片时返回 None。
+        合并结果存入转换缓存, 键为按顺序排列的各图片内容哈希加页边距、DPI 和生成方式:
+        同一组图片再次打印时直接复制缓存的 PDF。有图片处理失败时结果不缓存, 下次重新尝试。
+        run_metrics: metrics.RunMetrics, 记录每张图片和合并后 PDF 的各阶段耗时
+        limits: bigimage.LargeImageLimits, 超过像素数阈值的图片分带缩小到打印分辨率后合并
+        """
+        limits = limits or LargeImageLimits()
+        failed = []
+        # build 把不完整的合并结果直接写到了输出位置
+        partial = False
+
+        def on_error(img_path, e):
+            failed.append(img_path)
+            if metrics.current() is not None:
+                metrics.current().ok = False
+            log(f"  转换图片失败: {os.path.basename(img_path)}. 错误: {e}")
+            logger.error(f"转换图片'{img_path}'失败。", exc_info=True)
+
+        with _track(run_metrics, output_path, "merged"):
+            # 读不了的图片 (被删除、没有权限等) 单独跳过, 不影响其余图片
+            readable, digests = [], []
+            for img_path in images:
+                try:
+                    digests.append(self.conversion_cache().digest(img_path))
+                except OSError as e:
+                    on_error(img_path, e)
+                    continue
+                readable.append(img_path)
+            key = self.conversion_cache().key_from_digests(
+                digests, "merged-images", MERGED_IMAGES_FORMAT, margin, PRINT_DPI,
+                "embed" if PYMUPDF_AVAILABLE else "raster", limits.megapixels,
+            )
+            metrics.lap("analyze")
+        if not readable:
+            return None
+
+        def build(temp_dir):
+            nonlocal partial
+            pdf_path = os.path.join(temp_dir, MERGED_IMAGES_NAME)
+            count = merge_images_to_pdf(
+                readable, pdf_path, margin,
+                track=lambda img_path: _track(run_metrics, img_path, _file_kind(img_path)),
+                on_error=on_error,
+                limits=limits,
+            )
+            if not count:
+                # 没有一张图片合并成功: 不写输出文件, 也不缓存
+                return None
+            if failed:
+                # 不完整的结果不缓存, 直接移到输出位置
+                shutil.move(pdf_path, output_path)
+                partial = True
+                return None
+            return pdf_path
+
+        cached, hit = self.conversion_cache().get_or_build(key, build, pin=True)
+        if cached is None:
+            return output_path if partial else None
+        try:
+            with _track(run_metrics, output_path, "merged"):
+                if self.conversion_cache().copy_out(key, cached, output_path):
+                    metrics.add_bytes(written=os.path.getsize(output_path))
+                metrics.lap("save")
+        finally:
+            self.conversion_cache().unpin(cached)
+        if hit:
+            log(f"  图片未变化, 复用缓存的合并结果 ({len(images)} 张)。")
+        logger.info(f"{'命中' if hit else '写入'}图片合并缓存: {output_path} -> {cached}")
+        return output_path
+
+    def check_setup(self, folder, options):
+        """在开始前检查参数, 有问题时抛出 PrintSetupError"""
+        if not folder or not os.path.isdir(folder):
+            raise PrintSetupError(f"文件夹不存在: {folder}")
+        if not options.printer:
+            raise PrintSetupError("请输入打印机名称。")
+        try:
+            self.document_backend, self.print_backend = resolve_backends(
+                options.backend, self.office_pool, options.printer, self.soffice_path
+            )
+        except PrintBackendError as e:
+            raise PrintSetupError(str(e))
+        if options.layout not in LAYOUT_NAMES:
+            raise PrintSetupError(f"未知的拼版方式: {options.layout} (可选: {', '.join(LAYOUT_NAMES)})")
+        if options.layout != "1up" and not PYMUPDF_AVAILABLE:
+            raise PrintSetupError("拼版需要安装 PyMuPDF。")
+        if options.pack and options.layout not in ("2up", "4up"):
+            raise PrintSetupError("合并短文档排版只能用于 2up 或 4up。")
+        if self.print_backend is None and (
+            options.layout != "1up" or any(ext not in ("doc", "docx") for ext in options.extensions)
+        ):
+            # PDF、合并的图片和拼版输出都不交给 LibreOffice 打印
+            raise PrintSetupError("没有可用的 PDF 打印后端: Windows 上需要 pywin32, 其他系统上需要 CUPS 的 lp 命令。")
+        # 只有 Word 文件需要 LibreOffice (转换为 PDF, 或由 office 后端打印原始文档)
+        needs_office = any(ext in ("doc", "docx") for ext in options.extensions)
+        if needs_office and not (self.soffice_path and os.path.exists(self.soffice_path)):
+            raise PrintSetupError(f"LibreOffice 未在指定路径找到: {self.soffice_path}")
+
+    def resume(self, journal, run, log):
+        """
+        继续 journal 中记录的上一次打印任务 (run 为 journal.last_run()):
+        文件夹和打印参数与上次相同, 只打印上次没有成功发送 (包括失败) 的文件。
+        """
+        return self.run(run.folder, print_options_from_params(run.params), log, journal=journal, resume=True)
+
+    def run(self, folder, options, log, journal=None, resume=False):
+        """
+        执行一次批量打印任务, 返回 PrintSummary。
+
+        扫描后按文件名排好最终顺序, 然后以流水线方式处理: 合并图片、页数检查和
+        Word 转换在 options.prepare_workers 个线程中提前进行, 最多领先打印
+        prepare_workers * 2 个文件; Word 文件分给 options.office_workers 个
+        LibreOffice 实例并行转换。每个文件的页数一得到就输出, 筛选结果和打印
+        仍按排好的顺序逐个进行, 第一个文件准备好就开始打印, 不必等所有文件都准备完。
+
+        journal: journal.JobJournal, 记录每个文件的状态, 每个打印任务提交前后立即写入磁盘;
+        resume: 只处理 journal 中上次没有完成的文件 (见 resume)
+        """
+        self.check_setup(folder, options)
+        self._journal = journal
+        try:
+            return self._run(folder, options, log, resume)
+        finally:
+            self._journal = None
+
+    def _run(self, folder, options, log, resume):
+        journal = self._journal
+        self.office_workers = options.office_workers or default_office_workers()
+        # 线程数不少于 LibreOffice 实例数, 否则多出的实例永远用不上
+        prepare_workers = max(options.prepare_workers or default_prepare_workers(), self.office_workers)
+        summary = PrintSummary(metrics=metrics.RunMetrics("print", folder))
+
+        log("-" * 20)
+        log("开始打印任务...")
+        logger.info(f"文件夹: {folder}, 打印机: {options.printer}")
+        logger.info(f"准备线程数: {prepare_workers}, LibreOffice 实例数: {self.office_workers}")
+        if self.print_backend is None:
+            log(f"打印方式: {self.document_backend.name}")
+        elif self.document_backend is None:
+            log(f"打印方式: {self.print_backend.name}")
+        else:
+            log(f"打印方式: {self.print_backend.name} (Word 文件: {self.document_backend.name})")
+        if options.layout != "1up":
+            log(f"拼版: {options.layout}{', 短文档合并排版' if options.pack else ''}")
+        if options.page_range:
+            log_msg = f"页码筛选已启用: >= {options.page_range[0]} 且 <= {options.page_range[1]}"
+            log(log_msg)
+            logger.info(log_msg)
+
+        scan_start = time.perf_counter()
+        image_files, other_files = collect_print_files(folder, options.extensions, options.recursive)
+        summary.found = len(image_files) + len(other_files)
+        if summary.found:
+            # 一次扫描得到所有文件, 扫描耗时平均分到每个文件上
+            scan_each = (time.perf_counter() - scan_start) / summary.found
+            for found in image_files + other_files:
+                summary.metrics.file(found.path, _file_kind(found.path)).add("scan", scan_each)
+        logger.info(f"发现 {len(image_files)} 个图片文件和 {len(other_files)} 个文档/PDF文件。")
+
+        merged_path = os.path.join(folder, MERGED_IMAGES_NAME)
+        candidates = other_files
+        if image_files:
+            # 上次运行留下的合并文件会被这次重新生成, 不单独打印
+            candidates = [f for f in candidates if f.path != merged_path]
+            candidates.append(FoundFile(merged_path, "document", path_key(merged_path, folder)))
+            # 排序键已在扫描时算好, 这里只是字符串比较
+            candidates.sort(key=lambda f: f.sort_key)
+        candidates = [f.path for f in candidates]
+        if resume:
+            candidates = self._unfinished_candidates(candidates, log)
+            if not candidates:
+                log("上次的打印任务没有未完成的文件。")
+                journal.finish()
+                summary.metrics.finish()
+                return summary
+        elif journal is not None and candidates:
+            journal.start(folder, print_run_params(options))
+            for path in candidates:
+                journal.queue(path, "merged" if path == merged_path else _file_kind(path))
+            journal.checkpoint()
+        if not candidates:
+            log("未找到任何要打印的文件。")
+            logger.info("未找到任何要打印的文件，任务结束。")
+            summary.metrics.finish()
+            return summary
+
+        log("-" * 20)
+        log("待处理文件列表:")
+        logger.info(f"待处理文件列表 ({len(candidates)} 个):")
+        for i, f in enumerate(candidates):
+            log_line = f"  {i+1}. {os.path.relpath(f, folder)}"
+            if f == merged_path:
+                log_line += f" (由 {len(image_files)} 张图片合并)"
+            log(log_line)
+            logger.info(log_line)
+        log("-" * 20)
+        logger.info("-" * 20)
+
+        imposing = options.layout != "1up"
+        temp_dir = tempfile.mkdtemp(prefix="batch_print_") if imposing else None
+        images = [f.path for f in image_files]
+        imposer = None
+        if imposing:
+            from .impose import Imposer
+
+            imposer = Imposer(options.layout, temp_dir, pack=options.pack)
+
+        def prepare(path):
+            if path == merged_path:
+                return self._prepare_merged(path, images, options, summary.metrics, log)
+            return self._prepare_document(path, options, summary.metrics, log)
+
+        try:
+            for path, future in ordered_map(prepare, candidates, prepare_workers):
+                try:
+                    prepared = future.result()
+                except Exception as e:
+                    log(f"  ❌ 准备文件失败: {os.path.basename(path)} - {e}")
+                    logger.error(f"准备打印文件'{path}'时发生未知错误。", exc_info=True)
+                    summary.failed.append((path, str(e)))
+                    self._record([path], jobjournal.FAILED, str(e))
+                    continue
+                if prepared is None:
+                    # 没有可用的图片
+                    self._record([path], jobjournal.DONE)
+                    continue
+                if path == merged_path:
+                    msg = f"  图片已合并到: {os.path.basename(path)}"
+                    log(msg)
+                    logger.info(msg)
+                    summary.merged_images = path
+                try:
+                    if options.page_range and not self._apply_page_filter(path, prepared, options, summary, log):
+                        self._record([path], jobjournal.DONE)
+                        continue
+                    summary.queued.append(path)
+                    if imposer is not None:
+                        self._impose(path, prepared, imposer, options, summary, log)
+                    else:
+                        self._submit(path, prepared, options, summary, log)
+                finally:
+                    self._release(prepared)
+            if imposer is not None:
+                for job in imposer.finish():
+                    self._submit_imposed(job, options, summary, log)
+
+            if summary.tier_counts:
+                tier_summary = ", ".join(f"{TIER_LABELS[t]} {n} 个" for t, n in summary.tier_counts.items())
+                log(f"页数来源统计: {tier_summary}")
+            if journal is not None:
+                journal.finish()
+            if not summary.queued:
+                log("没有文件需要打印。")
+                logger.info("没有文件需要打印，任务结束。")
+                return summary
+
+            log(f"打印完成！\n成功: {summary.success}\n失败: {summary.fail}")
+            logger.info(f"打印任务完成。成功: {summary.success}, 失败: {summary.fail}")
+            return summary
+        finally:
+            summary.metrics.finish()
+            if imposer is not None:
+                imposer.close()
+            if temp_dir and os.path.exists(temp_dir):
+                shutil.rmtree(temp_dir)
+                log("已清理临时目录。")
+                logger.info("已清理打印任务的临时目录。")
+
+    def _unfinished_candidates(self, candidates, log):
+        """继续任务时只保留任务日志中没有完成的文件, 顺序不变"""
+        unfinished = {item.path: item for item in self._journal.unfinished()}
+        remaining = [path for path in candidates if os.path.abspath(path) in unfinished]
+        missing = len(unfinished) - len(remaining)
+        log(f"继续上次的打印任务: {len(remaining)} 个文件未完成。")
+        if missing:
+            log(f"  上次未完成的文件中有 {missing} 个已不存在或不再符合条件, 已跳过。")
+        for path in remaining:
+            if unfinished[os.path.abspath(path)].state == jobjournal.IN_PROGRESS:
+                log(f"  注意: '{os.path.basename(path)}' 上次在发送到打印机时中断, 可能已经部分打印。")
+        logger.info(f"继续打印任务: {len(remaining)} 个文件未完成, {missing} 个已不存在")
+        return remaining
+
+    def _record(self, paths, state, error=None, sync=False):
+        """把文件的状态写入任务日志 (如果有)"""
+        if self._journal is None:
+            return
+        for path in paths:
+            self._journal.mark(path, state, error)
+        if sync:
+            self._journal.checkpoint()
+
+    # --- 流水线的准备阶段 (在工作线程中运行) ---
+
+    def _prepare_merged(self, path, images, options, run_metrics, log):
+        """合并图片, 没有可用图片时返回 None"""
+        logger.info(f"开始合并 {len(images)} 张图片...")
+        limits = LargeImageLimits(options.large_image_megapixels, options.large_image_memory_mb)
+        if not self.merge_images(images, path, options.margin, log, run_metrics, limits):
+            return None
+        return self._prepare_document(path, options, run_metrics, log)
+
+    def _prepare_document(self, path, options, run_metrics, log):
+        prepared = _Prepared()
+        lower = path.lower()
+        if options.page_range and lower.endswith((".doc", ".docx", ".pdf")):
+            with run_metrics.track(path, _file_kind(path)):
+                prepared.page_count, prepared.tier = self.page_count(path, log, options.allow_estimate)
+                metrics.lap("analyze")
+                metrics.add_bytes(read=os.path.getsize(path))
+            if prepared.page_count is not None:
+                # 得到就输出 (完成顺序); 是否打印仍在 _apply_page_filter 中按文件顺序输出
+                log(f"  [页数检查] {os.path.basename(path)}: {prepared.page_count}页 ({TIER_LABELS[prepared.tier]})")
+            if not _in_page_range(prepared.page_count, options.page_range):
+                return prepared
+        if lower.endswith((".doc", ".docx")) and (options.layout != "1up" or not self.prints_original(path)):
+            # 提前转换为 PDF, 固定在缓存中直到提交打印, 等待期间不会被其他转换挤出缓存;
+            # 由 LibreOffice 打印原始文档时 (不拼版) 不需要 PDF
+            with run_metrics.track(path, _file_kind(path)):
+                try:
+                    prepared.pdf_path = self.convert_to_pdf(path, pin=True)
+                except Exception as e:
+                    prepared.error = e
+        return prepared
+
+    def _release(self, prepared):
+        """提交 (或跳过) 之后释放准备阶段固定的缓存 PDF"""
+        if prepared.pdf_path is not None:
+            self.conversion_cache().unpin(prepared.pdf_path)
+            prepared.pdf_path = None
+
+    # --- 按顺序进行的筛选和提交 ---
+
+    def _apply_page_filter(self, path, prepared, options, summary, log):
+        """记录页数并输出筛选结果, 返回是否打印"""
+        basename = os.path.basename(path)
+        if not path.lower().endswith((".doc", ".docx", ".pdf")):
+            return True
+        page_count, tier = prepared.page_count, prepared.tier
+        if tier:
+            summary.tier_counts[tier] = summary.tier_counts.get(tier, 0) + 1
+            summary.page_counts[path] = [page_count, tier]
+            logger.info(f"页数: {path} = {page_count} (来源: {tier})")
+        tier_label = TIER_LABELS.get(tier, "")
+        if page_count is None:
+            log(f"  -> '{basename}' (页数未知) 默认加入队列。")
+            return True
+        if _in_page_range(page_count, options.page_range):
+            log(f"  -> '{basename}' ({page_count}页, {tier_label}) 符合条件，加入队列。")
+            return True
+        summary.filtered_out.append(path)
+        log(f"  -> '{basename}' ({page_count}页, {tier_label}) 不符合条件，已跳过。")
+        return False
+
+    def _impose(self, file_path, prepared, imposer, options, summary, log):
+        """把文件排入拼版输出, 有输出文件写完时按顺序提交打印"""
+        with summary.metrics.track(file_path, _file_kind(file_path)) as file_metrics:
+            try:
+                if prepared.error is not None:
+                    raise prepared.error
+                jobs = imposer.add(prepared.pdf_path or self.document_pdf(file_path), file_path)
+            except Exception as e:
+                file_metrics.ok = False
+                log(f"  ❌ 拼版失败: {os.path.basename(file_path)} - {e}")
+                logger.error(f"拼版失败. 文件: {file_path}", exc_info=True)
+                summary.failed.append((file_path, str(e)))
+                self._record([file_path], jobjournal.FAILED, str(e))
+                return
+            metrics.lap("render")
+        for job in jobs:
+            self._submit_imposed(job, options, summary, log)
+
+    def _submit_imposed(self, job, options, summary, log):
+        title = os.path.basename(job.sources[0])
+        if len(job.sources) > 1:
+            title += f" 等 {len(job.sources)} 个文件"
+        self._send(
+            job.sources,
+            f"{title} ({job.pages} 页拼版为 {job.sheets} 面)",
+            lambda: self.submit_pdf(job.path, options.printer, title),
+            job.path,
+            "imposed",
+            summary,
+            log,
+        )
+
+    def _submit(self, file_path, prepared, options, summary, log):
+        def send():
+            if prepared.error is not None:
+                raise prepared.error
+            if prepared.pdf_path is None or self.prints_original(file_path):
+                self.print_file(file_path, options.printer)
+            else:
+                self.submit_pdf(prepared.pdf_path, options.printer, os.path.basename(file_path))
+
+        self._send([file_path], os.path.basename(file_path), send, file_path, _file_kind(file_path), summary, log)
+
+    def _send(self, sources, title, send, track_path, kind, summary, log):
+        """提交一个打印任务, sources 为其中包含的原始文件, 按结果记入 summary"""
+        log(f"正在打印: {title}")
+        logger.info(f"提交打印任务 for: {track_path}")
+        # 提交前后都立即写入任务日志: 中断后继续时, 已经成功的任务不会再次发送
+        self._record(sources, jobjournal.IN_PROGRESS, sync=True)
+        with summary.metrics.track(track_path, kind) as file_metrics:
+            try:
+                send()
+                log("  ✔ 成功发送到打印机。")
+                logger.info(f"成功打印: {track_path}")
+                summary.printed.extend(sources)
+                summary.jobs += 1
+                self._record(sources, jobjournal.DONE, sync=True)
+            except (OfficeError, PrintBackendError) as e:
+                file_metrics.ok = False
+                log(f"  ❌ 打印失败: {e}")
+                logger.error(f"打印失败. 文件: {track_path}. 错误: {e}", exc_info=False)
+                summary.failed.extend((source, str(e)) for source in sources)
+                self._record(sources, jobjournal.FAILED, str(e), sync=True)
+            except Exception as e:
+                file_metrics.ok = False
+                log(f"  ❌ 发生未知错误: {e}")
+                logger.error(f"打印时发生未知错误. 文件: {track_path}", exc_info=True)
+                summary.failed.extend((source, str(e)) for source in sources)
+                self._record(sources, jobjournal.FAILED, str(e), sync=True)
+            metrics.lap("submit")
@@ -0,0 +1,358 @@
+# printall/spool.py
+"""
+打印后端: 把已经准备好的 PDF 直接交给系统打印队列。
+
+原来每个文件 (包括我们自己生成的 _merged_images.pdf) 都通过
+`soffice --headless --pt <打印机> <文件>` 打印, 每次都要让 LibreOffice 重新加载、
+重新排版。现在 LibreOffice 只用于确实需要它的 Word 文件, 准备好的 PDF 由
+这里的后端直接提交:
+
+    cups       Linux/macOS: lp -d <打印机>, 由 CUPS 的过滤器处理 PDF
+    ipp        打印机名称是 ipp:// 或 ipps:// 地址时, 直接发送 IPP Print-Job 请求
+    win32-raw  Windows: 把 PDF 原样写入打印队列 (RAW), 只适用于能直接解释 PDF 的打印机
+    win32-gdi  Windows: 用 PyMuPDF 逐页渲染为图片, 通过打印机驱动 (GDI) 输出, 适用于任何打印机
+    office     由 LibreOffice 打印 Word 原始文档 (矢量输出, 页面方向正确); 不接收 PDF,
+               PDF 仍交给系统打印后端 (见 resolve_backends)
+    file:<目录> 不打印, 把 PDF 复制到目录并在 jobs.jsonl 中记录, 用于测试
+
+"auto" 按平台选择: PDF 在 Windows 上用 win32-gdi (没有 win32ui 时用 win32-raw),
+其他系统上用 cups; Word 文件在 Windows 上找到 LibreOffice 时由 office 打印原始文档,
+否则转换为 PDF 后和其他 PDF 一样提交。
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import struct
+import logging
+import threading
+import subprocess
+import urllib.parse
+
+from .config import LOGGER_NAME
+from .deps import PYWIN32_AVAILABLE, PYMUPDF_AVAILABLE, has_module
+
+logger = logging.getLogger(LOGGER_NAME)
+
+BACKEND_NAMES = ("auto", "cups", "ipp", "win32-gdi", "win32-raw", "office", "file:<目录>")
+
+class PrintBackendError(Exception):
+    """提交打印失败, 或指定的打印后端不可用"""
+
+
+class PrintBackend:
+    """打印后端的基类"""
+
+    name = None
+    # 为 True 时 submit 接收需要转换的原始文档, 否则接收 PDF
+    prints_documents = False
+
+    def submit(self, pdf_path, printer, title):
+        """把 PDF 提交到打印机, title 为打印队列中显示的任务名称"""
+        raise NotImplementedError
+
+
+class OfficeBackend(PrintBackend):
+    """
+    由 LibreOffice 工作进程打印 Word 原始文档 (soffice --pt)。
+    只用于需要转换才能打印的文档, 已经是 PDF 的文件 (包括转换缓存中的 PDF) 不交给 LibreOffice。
+    """
+
+    name = "office"
+    # submit 接收原始文档而不是 PDF
+    prints_documents = True
+
+    def __init__(self, office_pool):
+        # office_pool: 返回 OfficePool 的函数, 进程池可能在两次任务之间被重建
+        self._office_pool = office_pool
+
+    def submit(self, document_path, printer, title):
+        if document_path.lower().endswith(".pdf"):
+            raise PrintBackendError("office 打印后端只打印 Word 文档, PDF 需要使用系统打印后端")
+        self._office_pool().print_file(document_path, printer)
+
+
+class CupsBackend(PrintBackend):
+    """通过 CUPS 的 lp 命令提交"""
+
+    name = "cups"
+
+    def __init__(self, lp_path=None, timeout=60):
+        self.lp_path = lp_path or shutil.which("lp")
+        self.timeout = timeout
+
+    def submit(self, pdf_path, printer, title):
+        if not self.lp_path:
+            raise PrintBackendError("未找到 lp 命令, 请安装 CUPS 客户端")
+        command = [self.lp_path, "-d", printer, "-t", title, "--", pdf_path]
+        try:
+            result = subprocess.run(command, capture_output=True, text=True, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            raise PrintBackendError(f"lp 超过 {self.timeout} 秒未返回")
+        if result.returncode != 0:
+            raise PrintBackendError(f"lp 返回码 {result.returncode}: {(result.stderr or result.stdout).strip()}")
+        # 输出形如 "request id is printer-12 (1 file(s))"
+        logger.info(f"CUPS 已接收打印任务: {result.stdout.strip()}")
+
+
+class IppBackend(PrintBackend):
+    """向 ipp:// / ipps:// 地址直接发送 IPP/1.1 Print-Job 请求 (只用标准库)"""
+
+    name = "ipp"
+
+    _OPERATION_ATTRIBUTES = 0x01
+    _END_OF_ATTRIBUTES = 0x03
+    _TAG_NAME = 0x42
+    _TAG_URI = 0x45
+    _TAG_CHARSET = 0x47
+    _TAG_LANGUAGE = 0x48
+    _TAG_MIME = 0x49
+    _PRINT_JOB = 0x0002
+
+    def __init__(self, timeout=120):
+        self.timeout = timeout
+        self._request_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _attribute(tag, name, value):
+        name, value = name.encode("utf-8"), value.encode("utf-8")
+        return struct.pack(">BH", tag, len(name)) + name + struct.pack(">H", len(value)) + value
+
+    def _header(self, printer_uri, title):
+        with self._lock:
+            self._request_id += 1
+            request_id = self._request_id
+        user = os.environ.get("USER") or os.environ.get("USERNAME") or "printall"
+        return b"".join([
+            struct.pack(">BBHI", 1, 1, self._PRINT_JOB, request_id),
+            bytes([self._OPERATION_ATTRIBUTES]),
+            self._attribute(self._TAG_CHARSET, "attributes-charset", "utf-8"),
+            self._attribute(self._TAG_LANGUAGE, "attributes-natural-language", "zh-cn"),
+            self._attribute(self._TAG_URI, "printer-uri", printer_uri),
+            self._attribute(self._TAG_NAME, "requesting-user-name", user),
+            self._attribute(self._TAG_NAME, "job-name", title),
+            self._attribute(self._TAG_MIME, "document-format", "application/pdf"),
+            bytes([self._END_OF_ATTRIBUTES]),
+        ])
+
+    def submit(self, pdf_path, printer, title):
+        import http.client
+
+        url = urllib.parse.urlsplit(printer)
+        if url.scheme not in ("ipp", "ipps") or not url.hostname:
+            raise PrintBackendError(f"不是有效的 IPP 打印机地址: {printer}")
+        header = self._header(printer, title)
+        connection_class = http.client.HTTPSConnection if url.scheme == "ipps" else http.client.HTTPConnection
+        connection = connection_class(url.hostname, url.port or 631, timeout=self.timeout)
+        try:
+            connection.putrequest("POST", url.path or "/")
+            connection.putheader("Content-Type", "application/ipp")
+            connection.putheader("Content-Length", str(len(header) + os.path.getsize(pdf_path)))
+            connection.endheaders()
+            connection.send(header)
+            with open(pdf_path, "rb") as f:
+                # 分块发送, 不把整个 PDF 读入内存
+                while True:
+                    chunk = f.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    connection.send(chunk)
+            response = connection.getresponse()
+            body = response.read()
+        except OSError as e:
+            raise PrintBackendError(f"无法连接 IPP 打印机 {url.hostname}: {e}")
+        finally:
+            connection.close()
+        if response.status != 200 or len(body) < 4:
+            raise PrintBackendError(f"IPP 打印机返回 HTTP {response.status} {response.reason}")
+        status = struct.unpack(">H", body[2:4])[0]
+        # 0x0000~0x00FF 为成功 (包括部分属性被忽略等)
+        if status > 0x00FF:
+            raise PrintBackendError(f"IPP 打印机拒绝了任务 (状态码 0x{status:04x})")
+
+
+class Win32RawBackend(PrintBackend):
+    """把 PDF 原样写入 Windows 打印队列, 打印机需要能直接解释 PDF"""
+
+    name = "win32-raw"
+
+    def submit(self, pdf_path, printer, title):
+        import win32print
+
+        try:
+            handle = win32print.OpenPrinter(printer)
+        except Exception as e:
+            raise PrintBackendError(f"无法打开打印机 '{printer}': {e}")
+        try:
+            win32print.StartDocPrinter(handle, 1, (title, None, "RAW"))
+            try:
+                win32print.StartPagePrinter(handle)
+                with open(pdf_path, "rb") as f:
+                    while True:
+                        chunk = f.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        win32print.WritePrinter(handle, chunk)
+                win32print.EndPagePrinter(handle)
+            finally:
+                win32print.EndDocPrinter(handle)
+        finally:
+            win32print.ClosePrinter(handle)
+
+
+class Win32GdiBackend(PrintBackend):
+    """用 PyMuPDF 逐页渲染后通过打印机驱动输出, 一次只渲染一页"""
+
+    name = "win32-gdi"
+
+    def __init__(self, max_dpi=300):
+        self.max_dpi = max_dpi
+
+    def submit(self, pdf_path, printer, title):
+        import fitz  # PyMuPDF
+        import win32ui
+        import win32con
+        from PIL import Image, ImageWin
+        from .imagepdf import fit_rect
+
+        try:
+            dc = win32ui.CreateDC()
+            dc.CreatePrinterDC(printer)
+        except Exception as e:
+            raise PrintBackendError(f"无法打开打印机 '{printer}': {e}")
+        doc = fitz.open(pdf_path)
+        try:
+            printable = (dc.GetDeviceCaps(win32con.HORZRES), dc.GetDeviceCaps(win32con.VERTRES))
+            dpi = min(dc.GetDeviceCaps(win32con.LOGPIXELSX), self.max_dpi)
+            dc.StartDoc(title)
+            try:
+                for page in doc:
+                    pix = page.get_pixmap(dpi=dpi, alpha=False)
+                    image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+                    if (image.width > image.height) != (printable[0] > printable[1]):
+                        # 横向页面打印到纵向纸张 (或相反) 时旋转, 而不是缩小到纸张宽度
+                        image = image.transpose(Image.Transpose.ROTATE_90)
+                    rect = fit_rect(image.size, printable, 0)
+                    dc.StartPage()
+                    ImageWin.Dib(image).draw(dc.GetHandleOutput(), tuple(int(v) for v in rect))
+                    dc.EndPage()
+                dc.EndDoc()
+            except Exception:
+                dc.AbortDoc()
+                raise
+        finally:
+            doc.close()
+            dc.DeleteDC()
+
+
+class FileBackend(PrintBackend):
+    """
+    测试用: 不打印, 把 PDF 按提交顺序复制为 <目录>/<序号>-<任务名>.pdf,
+    并在 <目录>/jobs.jsonl 中追加一行记录。
+    """
+
+    name = "file"
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def submit(self, pdf_path, printer, title):
+        os.makedirs(self.directory, exist_ok=True)
+        log_path = os.path.join(self.directory, "jobs.jsonl")
+        with self._lock:
+            try:
+                with open(log_path, encoding="utf-8") as f:
+                    seq = sum(1 for _ in f) + 1
+            except FileNotFoundError:
+                seq = 1
+            name = os.path.splitext(title)[0] + ".pdf"
+            target = os.path.join(self.directory, f"{seq:04d}-{name}")
+            shutil.copyfile(pdf_path, target)
+            with open(log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({
+                    "seq": seq,
+                    "printer": printer,
+                    "title": title,
+                    "source": pdf_path,
+                    "path": target,
+                    "time": time.time(),
+                }, ensure_ascii=False) + "\n")
+
+
+def native_backend_name(printer=None):
+    """
+    按平台选择提交 PDF 的系统打印后端, 没有可用的后端时返回 None。
+    Windows 上优先 win32-gdi (适用于任何打印机), 缺少 win32ui 或 PyMuPDF 时用 win32-raw。
+    """
+    if printer and printer.lower().startswith(("ipp://", "ipps://")):
+        return "ipp"
+    if sys.platform == "win32":
+        if not PYWIN32_AVAILABLE:
+            return None
+        if PYMUPDF_AVAILABLE and has_module("win32ui"):
+            return "win32-gdi"
+        logger.warning("缺少 win32ui 或 PyMuPDF, PDF 改用 win32-raw 打印 (需要打印机能直接解释 PDF)。")
+        return "win32-raw"
+    if shutil.which("lp"):
+        return "cups"
+    return None
+
+
+def create_backend(name, office_pool, printer=None):
+    """
+    按名称创建打印后端, 名称见 BACKEND_NAMES; 不可用时抛出 PrintBackendError。
+    office_pool: 返回 OfficePool 的函数 (office 后端使用)
+    printer: 打印机名称; auto 时据此和平台选择提交 PDF 的系统打印后端 (见 native_backend_name)
+    """
+    name = name or "auto"
+    if name == "auto":
+        name = native_backend_name(printer)
+        if name is None:
+            raise PrintBackendError(
+                "没有可用的 PDF 打印后端: Windows 上需要 pywin32, 其他系统上需要 CUPS 的 lp 命令"
+            )
+    if name.startswith("file:"):
+        directory = name[len("file:"):]
+        if not directory:
+            raise PrintBackendError("file 后端需要指定目录, 如 file:./printed")
+        return FileBackend(os.path.abspath(directory))
+    if name == "office":
+        return OfficeBackend(office_pool)
+    if name == "cups":
+        if not shutil.which("lp"):
+            raise PrintBackendError("未找到 lp 命令, 无法使用 cups 打印后端")
+        return CupsBackend()
+    if name == "ipp":
+        return IppBackend()
+    if name in ("win32-gdi", "win32-raw"):
+        if not PYWIN32_AVAILABLE:
+            raise PrintBackendError(f"{name} 打印后端需要 pywin32")
+        if name == "win32-raw":
+            return Win32RawBackend()
+        if not PYMUPDF_AVAILABLE:
+            raise PrintBackendError("win32-gdi 打印后端需要 PyMuPDF 渲染页面")
+        return Win32GdiBackend()
+    raise PrintBackendError(f"未知的打印后端: {name} (可选: {', '.join(BACKEND_NAMES)})")
+
+
+def resolve_backends(name, office_pool, printer=None, soffice_path=None):
+    """
+    返回 (文档后端, PDF 后端)。
+    文档后端为 None 时 Word 文件先转换为 PDF, 再和其他 PDF 一样交给 PDF 后端;
+    PDF 后端为 None 时没有可用的系统打印后端 (只有 office 或 auto 会出现), 不能打印 PDF。
+    LibreOffice 只打印 Word 原始文档: 选择 office 时 PDF 仍然交给系统打印后端。
+    """
+    name = name or "auto"
+    if name not in ("auto", "office"):
+        return None, create_backend(name, office_pool, printer)
+    native = native_backend_name(printer)
+    pdf_backend = create_backend(native, office_pool, printer) if native else None
+    if name == "office" or pdf_backend is None:
+        return OfficeBackend(office_pool), pdf_backend
+    if sys.platform == "win32" and soffice_path and os.path.exists(soffice_path):
+        # Windows 上的 PDF 后端 (GDI) 会栅格化页面, Word 文件由 LibreOffice 打印原始文档, 保持矢量
+        return OfficeBackend(office_pool), pdf_backend
+    return None, pdf_backend
@@ -0,0 +1,566 @@
+# printall/watermark.py
+"""
+各类文件的水印处理函数。
+
+这些函数不依赖 Tk 界面, 可以在工作进程中直接调用:
+界面日志通过 log(message) 回调输出, 详细错误写入 PrintALLAppLogger。
+"""
+import os
+import logging
+import functools
+from dataclasses import dataclass
+
+from . import metrics
+from .config import (
+    CHINESE_FONT_PATH, CHINESE_FONT_AVAILABLE, LOGGER_NAME, LARGE_IMAGE_MEGAPIXELS, LARGE_IMAGE_MEMORY_MB,
+)
+from . import bigimage
+from .journal import replace_durably
+# PIL、python-docx、PyMuPDF (fitz)、openpyxl 在各处理函数第一次运行时才导入, 见 deps.py
+
+logger = logging.getLogger(LOGGER_NAME)
+
+PIC_POSITIONS = ["左上角", "右上角", "左下角", "右下角", "居中", "顶部居中", "底部居中"]
+
+# PDF 保存方式:
+#   incremental: 只在原文件末尾追加新增的内容流和字体对象, 耗时与页数成正比、与文件大小无关;
+#   full: 重写整个文件并压缩、清理无用对象, 文件更紧凑但大文件很慢;
+#   auto: 文件不小于 pdf_incremental_min_mb 时使用增量保存, 否则完整重写。
+PDF_SAVE_AUTO = "auto"
+PDF_SAVE_INCREMENTAL = "incremental"
+PDF_SAVE_FULL = "full"
+
+PDF_SAVE_MODE_LABELS = {
+    PDF_SAVE_AUTO: "自动 (按文件大小)",
+    PDF_SAVE_INCREMENTAL: "增量追加",
+    PDF_SAVE_FULL: "完整重写",
+}
+
+
+@dataclass
+class WatermarkOptions:
+    """水印参数 (主要用于图片), 需要能被 pickle 传给工作进程"""
+    opacity: int = 150
+    position: str = "顶部居中"
+    pdf_save_mode: str = PDF_SAVE_AUTO
+    pdf_incremental_min_mb: int = 20
+    # Excel 默认直接修改压缩包中的 XML (见 xlsxpatch.py), 结构不支持时退回到 openpyxl
+    excel_streaming: bool = True
+    # Word 默认直接修改压缩包中的页眉部件 (见 docxpatch.py), 结构不支持时退回到 python-docx
+    word_streaming: bool = True
+    # 像素数超过 large_image_megapixels (百万) 的图片分带处理, 内存不超过 large_image_memory_mb
+    large_image_megapixels: float = LARGE_IMAGE_MEGAPIXELS
+    large_image_memory_mb: int = LARGE_IMAGE_MEMORY_MB
+
+    @property
+    def large_image_limits(self):
+        return bigimage.LargeImageLimits(self.large_image_megapixels, self.large_image_memory_mb)
+
+
+def add_word_watermark(filepath, options, log):
+    filename = os.path.basename(filepath)
+    header_text = f"打印对象：{filename}"
+    if options.word_streaming:
+        from .docxpatch import patch_docx_header, DocxPatchError
+        try:
+            modified = patch_docx_header(filepath, header_text)
+            metrics.lap("render")
+            if modified:
+                log(f"[Word] ✔ 成功: {filename}")
+            else:
+                log(f"[Word] ！ 跳过（页眉内容已存在）: {filename}")
+            return True
+        except DocxPatchError as e:
+            logger.info(f"Word文件'{filepath}'无法直接修改页眉 ({e}), 改用 python-docx。")
+        except Exception as e:
+            log(f"[Word] ❌ 失败: {filename} - {e}")
+            logger.error(f"处理Word文件'{filepath}'失败.", exc_info=True)
+            return False
+
+    try:
+        # 依赖缺失时与其他错误一样只让这个文件失败
+        from docx import Document
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+        from docx.shared import RGBColor, Pt
+
+        document = Document(filepath)
+        metrics.lap("open")
+
+        # 获取文档的第一个节（section）来访问页面设置
+        section = document.sections[0]
+        header = section.header
+
+        # 用于存储我们要操作的页眉段落
+        target_paragraph = None
+
+        # (检查页眉是否为空的逻辑保持不变)
+        if not header.paragraphs:
+            target_paragraph = header.add_paragraph()
+        else:
+            first_paragraph = header.paragraphs[0]
+            if not first_paragraph.text.strip():
+                target_paragraph = first_paragraph
+        metrics.lap("analyze")
+
+        if target_paragraph:
+            target_paragraph.clear()
+
+            run = target_paragraph.add_run(header_text)
+
+            # --- 核心修改部分：动态计算字体大小 ---
+
+            # 1. 获取页面的可用宽度（页面宽度 - 左右页边距），单位转换为磅(Pt)
+            #    section.page_width, left_margin, right_margin 的单位是 EMU，使用 .pt 可以直接转换为磅
+            usable_width_pt = section.page_width.pt - section.left_margin.pt - section.right_margin.pt
+
+            # 2. 根据可用宽度动态计算字体大小
+            #    除数 60 是一个经验值，可以根据实际效果调整，值越大字体越小
+            #    max(9, ...) 确保字体最小不低于9磅，保证可读性
+            dynamic_fontsize = max(9, int(usable_width_pt / 60))
+
+            # --- 修改结束 ---
+            # 设置字体样式
+            font = run.font
+            font.name = '宋体'
+            # 3. 应用动态计算出的字体大小
+            font.size = Pt(dynamic_fontsize)
+            font.color.rgb = RGBColor(255, 0, 0)
+
+            # 设置段落对齐方式
+            target_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            metrics.lap("render")
+
+            document.save(filepath)
+            metrics.lap("save")
+            log(f"[Word] ✔ 成功: {filename}")
+        else:
+            # 当 target_paragraph 为 None 时，说明页眉已存在且有内容，我们跳过了修改
+            # 在这里打印“跳过”的日志
+            log(f"[Word] ！ 跳过（页眉内容已存在）: {filename}")
+        return True
+    except Exception as e:
+        log(f"[Word] ❌ 失败: {filename} - {e}")
+        logger.error(f"处理Word文件'{filepath}'失败.", exc_info=True)
+        return False
+
+
+def add_excel_watermark(filepath, options, log):
+    filename = os.path.basename(filepath)
+    if options.excel_streaming:
+        from .xlsxpatch import patch_xlsx, XlsxPatchError
+        try:
+            patch_xlsx(filepath)
+            metrics.lap("render")
+            log(f"[Excel] ✔ 成功: {filename}")
+            return True
+        except XlsxPatchError as e:
+            logger.info(f"Excel文件'{filepath}'无法流式处理 ({e}), 改用 openpyxl。")
+        except Exception as e:
+            log(f"[Excel] ❌ 失败: {filename} - {e}")
+            logger.error(f"处理Excel文件'{filepath}'失败.", exc_info=True)
+            return False
+
+    try:
+        import openpyxl
+        from openpyxl.styles import Alignment, Border, Side
+
+        workbook = openpyxl.load_workbook(filepath)
+        metrics.lap("open")
+        header_format_string = "打印对象：&F|&A 第&[Page]/&N页"
+
+        for ws in workbook.worksheets:
+            # 判断Sheet是否为空
+            is_sheet_none = (ws.max_row == 1 and ws.max_column == 1 and ws['A1'].value is None)
+            # 判断工作表标签是否未设置颜色
+            is_color_unset = (ws.sheet_properties.tabColor is None)
+
+            if not is_sheet_none and len(workbook.worksheets) > 1 and is_color_unset:
+                ws.sheet_properties.tabColor = "d86100"
+            if not ws.oddHeader.center.text:
+                ws.oddHeader.center.text = header_format_string
+            ws.print_title_rows = '1:1'
+            thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+            max_row = ws.max_row
+            max_col = ws.max_column
+            for row in ws.iter_rows(min_row=1, max_row=max_row, min_col=1, max_col=max_col):
+                for cell in row:
+                    if cell.value is not None:
+                        cell.border = thin_border
+                    if cell.row == 1:
+                        cell.alignment = Alignment(horizontal='center', vertical='center')
+        metrics.lap("render")
+
+        workbook.save(filepath)
+        metrics.lap("save")
+        log(f"[Excel] ✔ 成功: {filename}")
+        return True
+    except Exception as e:
+        log(f"[Excel] ❌ 失败: {filename} - {e}")
+        logger.error(f"处理Excel文件'{filepath}'失败.", exc_info=True)
+        return False
+
+
+def get_pic_watermark_position(img_size, text_size, position):
+    img_width, img_height = img_size
+    text_width, text_height = text_size
+    margin, top_bottom_margin = 20, 0
+    positions = {
+        "左上角": (margin, margin),
+        "右上角": (img_width - text_width - margin, margin),
+        "左下角": (margin, img_height - text_height - margin),
+        "右下角": (img_width - text_width - margin, img_height - text_height - margin),
+        "居中": ((img_width - text_width) // 2, (img_height - text_height) // 2),
+        "顶部居中": ((img_width - text_width) // 2, top_bottom_margin),
+        "底部居中": ((img_width - text_width) // 2, img_height - text_height - top_bottom_margin),
+    }
+    return positions.get(position, positions["顶部居中"])
+
+
+@functools.lru_cache(maxsize=32)
+def _load_pic_font(font_size):
+    from PIL import ImageFont
+
+    try:
+        # 直接使用 CHINESE_FONT_PATH
+        return ImageFont.truetype(CHINESE_FONT_PATH, font_size)
+    except IOError:
+        logger.warning(f"无法加载字体'{CHINESE_FONT_PATH}', 回退到默认字体。")
+        return ImageFont.load_default()
+
+
+def _measure_text(text, font_size):
+    bbox = _load_pic_font(font_size).getbbox(text)
+    return bbox[2] - bbox[0], bbox[3] - bbox[1]
+
+
+def _tile_geometry(text, font_size):
+    """水印图块的 (宽, 高, 文字原点偏移 x, y), 与颜色无关"""
+    bbox = _load_pic_font(font_size).getbbox(text)
+    # 描边向四周各多画 1 像素; 字形可能有负的左/上边距
+    offset_x = 1 - min(0, bbox[0])
+    offset_y = 1 - min(0, bbox[1])
+    return bbox[2] + offset_x + 1, bbox[3] + offset_y + 1, offset_x, offset_y
+
+
+@functools.lru_cache(maxsize=128)
+def _render_watermark_tile(text, font_size, fill_color, outline_color):
+    """
+    只在文字外接矩形大小的透明图块上绘制一次带描边的水印文字。
+    返回 (图块, 文字绘制原点在图块中的偏移 x, y)。
+    """
+    from PIL import Image, ImageDraw
+
+    font = _load_pic_font(font_size)
+    width, height, offset_x, offset_y = _tile_geometry(text, font_size)
+    tile = Image.new("RGBA", (width, height), (255, 255, 255, 0))
+    draw = ImageDraw.Draw(tile)
+    for dx in [-1, 0, 1]:
+        for dy in [-1, 0, 1]:
+            if dx != 0 or dy != 0:
+                draw.text((offset_x + dx, offset_y + dy), text, font=font, fill=outline_color)
+    draw.text((offset_x, offset_y), text, font=font, fill=fill_color)
+    return tile, offset_x, offset_y
+
+
+def _composite_tile(img, tile, left, top):
+    """只把图块覆盖到的区域转换为 RGBA 混合后贴回原图 (超出图片的部分裁掉)"""
+    x0, y0 = max(0, left), max(0, top)
+    x1, y1 = min(img.width, left + tile.width), min(img.height, top + tile.height)
+    if x0 >= x1 or y0 >= y1:
+        return
+    source = tile.crop((x0 - left, y0 - top, x1 - left, y1 - top))
+    region = img.crop((x0, y0, x1, y1))
+    if region.mode != "RGBA":
+        region = region.convert("RGBA")
+    region.alpha_composite(source)
+    if img.mode != "RGBA":
+        region = region.convert(img.mode)
+    img.paste(region, (x0, y0))
+
+
+# 可以只在局部混合后原样保存的图片模式, 其他模式(调色板、CMYK等)先整体转换
+_REGION_MODES = ("RGB", "RGBA", "L", "LA")
+
+# 文字区域的平均亮度高于此值时用黑色文字, 否则用白色
+PIC_BRIGHTNESS_THRESHOLD = 100
+# JPEG 亮度分析时按 1/8、1/4、1/2 缩放解码, 缩小后的文字区域宽高至少保留这么多像素
+_ANALYSIS_MIN_PIXELS = 8
+
+
+def _pic_watermark_layout(image_path, img_size, position):
+    """返回 (水印文字, 字号, 文字区域 (x0, y0, x1, y1)), 只需要图片尺寸, 不需要解码"""
+    watermark_text = f"打印对象：{os.path.basename(image_path)}"
+    # 动态计算字体大小
+    font_size = max(25, int(img_size[0] / 50))
+    text_width, text_height = _measure_text(watermark_text, font_size)
+    x, y = get_pic_watermark_position(img_size, (text_width, text_height), position)
+    return watermark_text, font_size, (x, y, x + text_width, y + text_height)
+
+
+def _region_brightness(img, box):
+    """box 区域的平均亮度 (0-255); 先裁剪再转换颜色模式, 不复制整张图片"""
+    from PIL import ImageStat
+
+    stat = ImageStat.Stat(img.crop(box).convert("RGB"))
+    return 0.299 * stat.mean[0] + 0.587 * stat.mean[1] + 0.114 * stat.mean[2]
+
+
+def _reduced_jpeg_brightness(image_path, box):
+    """
+    另开一个句柄, 用 JPEG 的 DCT 缩放 (draft) 按 1/8~1/4~1/2 分辨率解码后计算 box 区域的亮度,
+    解码量只有全分辨率的几十分之一。文字区域太小、无法缩放时返回 None。
+    """
+    x0, y0, x1, y1 = box
+    scale = next(
+        (s for s in (8, 4, 2) if (x1 - x0) // s >= _ANALYSIS_MIN_PIXELS and (y1 - y0) // s >= _ANALYSIS_MIN_PIXELS),
+        1,
+    )
+    if scale == 1:
+        return None
+    with bigimage.open_image(image_path) as img:
+        width, height = img.size
+        img.draft("RGB", (width // scale, height // scale))
+        if img.size == (width, height):
+            return None
+        sx, sy = img.size[0] / width, img.size[1] / height
+        # 缩小后的每个像素是原图一个块的平均值, 取与文字区域最接近的块
+        left, top = round(x0 * sx), round(y0 * sy)
+        scaled = (left, top, max(left + 1, round(x1 * sx)), max(top + 1, round(y1 * sy)))
+        return _region_brightness(img, scaled)
+
+
+def picture_watermark_brightness(image_path, options, reduced=True):
+    """
+    水印文字区域的平均亮度, 决定文字用黑色还是白色, 不需要完整解码图片:
+    JPEG 按缩小的分辨率解码, 其他格式先裁剪再转换。
+    reduced=False 时按全分辨率计算 (基准中用来核对缩放解码的误差)。
+    """
+    with bigimage.open_image(image_path) as img:
+        _, _, box = _pic_watermark_layout(image_path, img.size, options.position)
+        if not (reduced and img.format == "JPEG"):
+            return _region_brightness(img, box)
+    brightness = _reduced_jpeg_brightness(image_path, box)
+    if brightness is None:
+        return picture_watermark_brightness(image_path, options, reduced=False)
+    return brightness
+
+
+def _watermark_colors(brightness, opacity):
+    """(文字颜色, 描边颜色): 背景亮时用黑字白边, 否则用白字黑边"""
+    if brightness > PIC_BRIGHTNESS_THRESHOLD:
+        return (0, 0, 0, opacity), (255, 255, 255, opacity)
+    return (255, 255, 255, opacity), (0, 0, 0, opacity)
+
+
+def _stamp_large_picture(image_path, size, image_format, options):
+    """
+    超过像素数阈值的图片: PNG/BMP 只解码、改写水印所在的几行 (见 bigimage.py), 返回 True。
+    其他格式 (JPEG) 只能整张重新编码: 整张解码不超过内存预算时返回 False, 由调用方按普通方式处理,
+    否则抛出 ImageTooLargeError, 只有这个文件失败, 不会耗尽内存影响整批任务。
+    """
+    limits = options.large_image_limits
+    watermark_text, font_size, box = _pic_watermark_layout(image_path, size, options.position)
+    tile_width, tile_height, offset_x, offset_y = _tile_geometry(watermark_text, font_size)
+    left, top = box[0] - offset_x, box[1] - offset_y
+    band_top = max(0, min(box[1], top))
+    band_bottom = min(size[1], max(box[3], top + tile_height))
+
+    def edit(band):
+        metrics.lap("open")
+        region = (box[0], box[1] - band_top, box[2], box[3] - band_top)
+        fill_color, outline_color = _watermark_colors(_region_brightness(band, region), options.opacity)
+        metrics.lap("analyze")
+        tile, _, _ = _render_watermark_tile(watermark_text, font_size, fill_color, outline_color)
+        _composite_tile(band, tile, left, top - band_top)
+        metrics.lap("render")
+        return band
+
+    if image_format in bigimage.BANDED_FORMATS:
+        try:
+            bigimage.rewrite_band(image_path, band_top, band_bottom, edit, limits.memory_bytes)
+            metrics.lap("save")
+            return True
+        except bigimage.BandedImageError as e:
+            logger.info(f"图片不能分带处理, 改为整张处理: {image_path} ({e})")
+    needed = bigimage.decoded_bytes(size)
+    if needed > limits.memory_bytes:
+        raise bigimage.ImageTooLargeError(
+            f"{size[0]}x{size[1]} 的 {image_format} 图片整张解码约需 {needed / 1024 / 1024:.0f} MB,"
+            f" 超过大图片内存预算 {limits.memory_mb} MB, 文件未改动"
+        )
+    return False
+
+
+def add_picture_watermark(image_path, options, log):
+    try:
+        with bigimage.open_image(image_path) as img:
+            size, image_format = img.size, img.format
+        if options.large_image_limits.is_large(size) and _stamp_large_picture(image_path, size, image_format, options):
+            log(f"[图片] ✔ 成功: {os.path.basename(image_path)}")
+            return True
+
+        with bigimage.open_image(image_path) as img:
+            original_format = img.format
+            watermark_text, dynamic_font_size, box = _pic_watermark_layout(image_path, img.size, options.position)
+            x, y = box[:2]
+            # JPEG 在完整解码之前按缩小的分辨率选好文字颜色 (见 picture_watermark_brightness)
+            brightness = _reduced_jpeg_brightness(image_path, box) if original_format == "JPEG" else None
+            metrics.lap("analyze")
+            img.load()
+            metrics.lap("open")
+            if brightness is None:
+                # 其他格式 (或文字区域太小无法缩放) 在解码后的图片上先裁剪再转换
+                brightness = _region_brightness(img, box)
+            fill_color, outline_color = _watermark_colors(brightness, options.opacity)
+
+            if img.mode not in _REGION_MODES:
+                has_alpha = img.mode in ("PA", "RGBa", "La") or "transparency" in img.info
+                img = img.convert("RGBA" if has_alpha else "RGB")
+            tile, offset_x, offset_y = _render_watermark_tile(
+                watermark_text, dynamic_font_size, fill_color, outline_color
+            )
+            _composite_tile(img, tile, x - offset_x, y - offset_y)
+            metrics.lap("render")
+
+            if original_format in ["PNG", "BMP"]:
+                if original_format == "BMP" and img.mode == "LA":
+                    img = img.convert("RGBA")
+                img.save(image_path, format=original_format)
+            else:
+                (img if img.mode == "RGB" else img.convert("RGB")).save(image_path, format="JPEG", quality=95)
+            metrics.lap("save")
+            log(f"[图片] ✔ 成功: {os.path.basename(image_path)}")
+            return True
+    except Exception as e:
+        log(f"[图片] ❌ 失败: {os.path.basename(image_path)} - {e}")
+        logger.error(f"处理图片文件'{image_path}'失败.", exc_info=True)
+        return False
+
+
+@functools.lru_cache(maxsize=1)
+def _pdf_font_buffer():
+    """中文字体文件只在每个进程中读取一次, 之后所有 PDF 共用这份字节数据"""
+    with open(CHINESE_FONT_PATH, "rb") as f:
+        return f.read()
+
+
+def _use_incremental_save(path, doc, options):
+    mode = options.pdf_save_mode
+    if mode == PDF_SAVE_FULL:
+        return False
+    if mode == PDF_SAVE_AUTO and os.path.getsize(path) < options.pdf_incremental_min_mb * 1024 * 1024:
+        return False
+    # 打开时被修复过的文件、新建的文档等不能增量保存
+    return doc.can_save_incrementally()
+
+
+def add_pdf_watermark(input_pdf_path, options, log):
+    """
+    使用 PyMuPDF (fitz) 为PDF文件添加页眉式水印，并原地保存。
+    如果检测到已存在水印，则跳过。
+    """
+    filename = os.path.basename(input_pdf_path)
+    if not CHINESE_FONT_AVAILABLE:
+        log(f"[PDF] ❌ 失败: {filename} - 中文字体文件 '{CHINESE_FONT_PATH}' 未找到。")
+        return False
+
+    temp_output_path = input_pdf_path + ".tmp"
+    doc = None
+    try:
+        import fitz  # PyMuPDF
+
+        doc = fitz.open(input_pdf_path)
+        metrics.lap("open")
+
+        # 在处理前检查第一页是否存在水印
+        if doc.page_count > 0:
+            # 获取第一页的纯文本内容
+            first_page_text = doc[0].get_text("text")
+            # 通过一个独特的文本组合来判断水印是否存在，以降低误判率
+            # 例如，我们的水印包含 "打印对象"
+            if "打印对象" in first_page_text:
+                log(f"[PDF] ！ 跳过（已存在页眉水印）: {filename}")
+                doc.close()  # 在返回前必须关闭文档
+                doc = None
+                metrics.lap("analyze")
+                return True
+        metrics.lap("analyze")
+
+        font_buffer = _pdf_font_buffer()
+        total_pages = doc.page_count
+        for i in range(total_pages):
+            page = doc.load_page(i)
+            page_rect = page.rect
+            # 同一个文档中 MuPDF 按内容去重, 所有页面引用同一个字体对象
+            page.insert_font(fontname="china-font", fontbuffer=font_buffer)
+
+            dynamic_fontsize = max(9, int(page_rect.width / 60))
+            header_height = dynamic_fontsize * 1.8
+
+            header_text = f"打印对象：{filename}  第 {i + 1}/{total_pages} 页"
+
+            header_width = page_rect.width * 0.95
+            header_left = (page_rect.width - header_width) / 2
+            header_top = 5
+            header_rect = fitz.Rect(
+                header_left,
+                header_top,
+                header_left + header_width,
+                header_top + header_height
+            )
+
+            page.insert_textbox(
+                header_rect,
+                header_text,
+                fontsize=dynamic_fontsize,
+                color=(1, 0, 0),
+                fontname="china-font",
+                align=fitz.TEXT_ALIGN_CENTER,
+            )
+
+        # 只保留水印实际用到的字形, 避免把整个 msyh.ttc 写进每个 PDF
+        try:
+            doc.subset_fonts()
+        except Exception:
+            logger.warning(f"字体子集化失败, 将嵌入完整字体: {input_pdf_path}", exc_info=True)
+        metrics.lap("render")
+
+        if _use_incremental_save(input_pdf_path, doc, options):
+            # 增量更新: 原有对象保持不动, 只追加修改过的页面、新内容流和字体
+            doc.save(input_pdf_path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+            doc.close()
+            doc = None
+            metrics.lap("save")
+            log(f"[PDF] ✔ 成功 (增量保存): {filename}")
+            return True
+
+        doc.save(temp_output_path, garbage=4, deflate=True, clean=True)
+        doc.close()
+        doc = None
+
+        # 临时文件写入磁盘后原子替换: 任何时刻崩溃, 原文件要么不变, 要么是完整的新文件
+        replace_durably(temp_output_path, input_pdf_path)
+        metrics.lap("save")
+
+        log(f"[PDF] ✔ 成功: {filename}")
+        return True
+
+    except Exception as e:
+        log(f"[PDF] ❌ 失败: {filename} - {e}")
+        logger.error(f"处理PDF文件'{input_pdf_path}'失败.", exc_info=True)
+        if os.path.exists(temp_output_path):
+            os.remove(temp_output_path)
+        return False
+    finally:
+        # 确保任何情况下文档都会被关闭
+        if doc:
+            doc.close()
+
+
+# 水印类型 -> 处理函数
+WATERMARK_HANDLERS = {
+    "word": add_word_watermark,
+    "excel": add_excel_watermark,
+    "pic": add_picture_watermark,
+    "pdf": add_pdf_watermark,
+}
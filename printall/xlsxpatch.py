@@ -0,0 +1,565 @@
+# printall/xlsxpatch.py
+"""
+流式 Excel 水印: 直接修改 .xlsx 压缩包中的 XML, 不用 openpyxl 加载整个工作簿。
+
+与 add_excel_watermark 原来的 openpyxl 处理结果一致:
+  - 页眉中间为空时写入 "打印对象：文件名|工作表名 第 页/总页数";
+  - 多个工作表时给非空工作表设置标签颜色 (已设置的不变);
+  - 打印标题行设为第 1 行 (保留已有的打印标题列);
+  - 非空单元格加细边框, 第 1 行单元格水平/垂直居中。
+边框通过样式表实现: 每种原样式只追加一个带细边框 (和居中) 的样式,
+所有单元格共享同一个边框定义。每个工作表的单元格数据只顺序读写一遍,
+未修改的条目 (图片、共享字符串等) 原样复制压缩数据。
+"""
+import os
+import re
+import tempfile
+import xml.etree.ElementTree as ET
+from xml.parsers.expat import ExpatError
+
+from .ziputil import rewrite_zip, read_relationships, ZipRewriteError
+from .xmlstream import XmlPatcher, StopParsing, local_name, qname_prefix, escape_text, format_start
+
+HEADER_TEXT = "打印对象：&F|&A 第&P/&N页"
+TAB_COLOR = "00d86100"
+
+_R_ID_SUFFIX = "}id"
+
+# CT_Worksheet 中位于 headerFooter 之后的元素, 没有 headerFooter 时插在它们之前
+_AFTER_HEADER_FOOTER = {
+    "rowBreaks", "colBreaks", "customProperties", "cellWatches", "ignoredErrors",
+    "smartTags", "drawing", "legacyDrawing", "legacyDrawingHF", "drawingHF", "picture",
+    "oleObjects", "controls", "webPublishItems", "tableParts", "extLst",
+}
+# CT_Workbook 中位于 definedNames 之后的元素
+_AFTER_DEFINED_NAMES = {
+    "calcPr", "oleSize", "customWorkbookViews", "pivotCaches", "smartTagPr",
+    "smartTagTypes", "webPublishing", "fileRecoveryPr", "webPublishObjects", "extLst",
+}
+
+# 页眉格式代码 (字体、颜色、字号), 判断页眉中间是否有文字时忽略
+_HEADER_FORMAT_CODES = re.compile(r'&"[^"]+"|&K[A-Fa-f0-9]{6}|&\d+\s?')
+_HEADER_SECTIONS = re.compile(r"(&L(?P<left>.+?))?(&C(?P<center>.+?))?(&R(?P<right>.+?))?$", re.DOTALL)
+_CELL_ROW = re.compile(r"[A-Za-z]*(\d+)$")
+_COLUMN_RANGE = re.compile(r"\$?[A-Za-z]{1,3}:\$?[A-Za-z]{1,3}$")
+
+# 样式变体
+_BORDER = "border"
+_ALIGN = "align"
+_BORDER_ALIGN = "border+align"
+
+
+class XlsxPatchError(Exception):
+    """工作簿结构不适合流式处理, 应退回到 openpyxl"""
+
+
+def _quote_sheet_name(name):
+    return "'" + name.replace("'", "''") + "'"
+
+
+def _split_refs(text):
+    """按顶层逗号拆分引用 (工作表名中可能带逗号)"""
+    parts, current, quoted = [], [], False
+    for char in text:
+        if char == "'":
+            quoted = not quoted
+        if char == "," and not quoted:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    parts.append("".join(current))
+    return [part for part in parts if part]
+
+
+def print_titles_value(sheet_name, existing):
+    """第 1 行作为打印标题行, 保留已有的打印标题列"""
+    columns = [ref for ref in _split_refs(existing or "") if _COLUMN_RANGE.search(ref.rpartition("!")[2])]
+    return ",".join([f"{_quote_sheet_name(sheet_name)}!$1:$1"] + columns)
+
+
+def patch_odd_header(text):
+    """页眉中间部分没有文字时写入水印页眉; 无法解析时原样返回"""
+    match = _HEADER_SECTIONS.match(text or "")
+    if match is None:
+        return text
+    parts = match.groupdict()
+    if _HEADER_FORMAT_CODES.sub("", parts["center"] or "").strip():
+        return text
+    result = ""
+    if parts["left"]:
+        result += "&L" + parts["left"]
+    # 保留中间部分已有的字体等格式代码
+    result += "&C" + (parts["center"] or "") + HEADER_TEXT
+    if parts["right"]:
+        result += "&R" + parts["right"]
+    return result
+
+
+# --------------------------------------------------------------------------
+# 样式表
+# --------------------------------------------------------------------------
+
+class _StylesScanner(XmlPatcher):
+    """收集 borders 和 cellXfs 中每个子元素的原始 XML"""
+
+    def __init__(self):
+        super().__init__(lambda data: None)
+        self.borders = []
+        self.xfs = []
+        self.prefix = ""
+        self._child = None  # (开始位置, 是否为空元素)
+
+    def start(self, name, attrs):
+        depth = len(self.stack)
+        if depth == 0:
+            self.prefix = qname_prefix(name)
+        elif depth == 2 and local_name(self.stack[-1]) in ("borders", "cellXfs"):
+            pos = self.position()
+            self.hold(pos)
+            self._child = (pos, self.is_empty_tag(pos))
+
+    def end(self, name):
+        if len(self.stack) == 2 and self._child is not None:
+            pos, empty = self._child
+            self._child = None
+            end = self.tag_end(pos) if empty else self.tag_end(self.position())
+            markup = self.source(pos, end)
+            self.release()
+            if local_name(self.stack[-1]) == "borders":
+                self.borders.append(markup)
+            else:
+                self.xfs.append(markup)
+
+
+class _StylesRewriter(XmlPatcher):
+    """在 borders / cellXfs 末尾追加新的边框和样式, 并更新 count"""
+
+    def __init__(self, write, style_map):
+        super().__init__(write)
+        self.style_map = style_map
+        self._expanded = set()  # 原来是空元素、已经在 start 中插入了内容
+
+    def _additions(self, local):
+        if local == "borders":
+            return str(self.style_map.border_count), "".join(self.style_map.new_borders)
+        return str(self.style_map.xf_count), "".join(self.style_map.new_xfs)
+
+    def start(self, name, attrs):
+        local = local_name(name)
+        if len(self.stack) == 1 and local in ("borders", "cellXfs"):
+            count, markup = self._additions(local)
+            pos = self.position()
+            attrs = {**attrs, "count": count}
+            if self.is_empty_tag(pos):
+                self._expanded.add(local)
+                self.replace(pos, self.tag_end(pos), f"{format_start(name, attrs)}{markup}</{name}>")
+            else:
+                self.replace_tag(pos, name, attrs)
+
+    def end(self, name):
+        local = local_name(name)
+        if len(self.stack) == 1 and local in ("borders", "cellXfs") and local not in self._expanded:
+            _, markup = self._additions(local)
+            if markup:
+                self.insert(self.position(), markup)
+
+
+_XF_START = re.compile(r"^<(?P<name>[\w:.-]+)(?P<attrs>[^>]*?)\s*(?P<close>/?)>")
+_XF_ATTR = re.compile(r"""([\w:.-]+)\s*=\s*("[^"]*"|'[^']*')""")
+_XF_ALIGNMENT = re.compile(r"<(?:[\w.-]+:)?alignment\b[^>]*?(?:/>|>.*?</(?:[\w.-]+:)?alignment>)", re.DOTALL)
+
+
+def _normalize(markup):
+    return re.sub(r"\s*/>", "/>", re.sub(r">\s+<", "><", markup.strip()))
+
+
+class _StyleMap:
+    """原样式序号 + 变体 -> 新样式序号, 相同的样式只追加一次"""
+
+    def __init__(self, borders, xfs, prefix):
+        self._xfs = xfs
+        self._known_xfs = {}
+        for index, markup in enumerate(xfs):
+            self._known_xfs.setdefault(_normalize(markup), index)
+        self.new_borders = []
+        self.new_xfs = []
+        self._cache = {}
+        p = prefix
+        self._thin_border = (
+            f'<{p}border><{p}left style="thin"/><{p}right style="thin"/>'
+            f'<{p}top style="thin"/><{p}bottom style="thin"/><{p}diagonal/></{p}border>'
+        )
+        normalized = [_normalize(markup) for markup in borders]
+        if self._thin_border in normalized:
+            self.thin_border_id = normalized.index(self._thin_border)
+        else:
+            self.thin_border_id = len(borders)
+        self._border_count = len(borders)
+
+    @property
+    def border_count(self):
+        return self._border_count + len(self.new_borders)
+
+    @property
+    def xf_count(self):
+        return len(self._xfs) + len(self.new_xfs)
+
+    def get(self, original, variant):
+        key = (original, variant)
+        index = self._cache.get(key)
+        if index is not None:
+            return index
+        base = self._xfs[original] if 0 <= original < len(self._xfs) else self._xfs[0]
+        markup = self._derive(base, variant)
+        index = self._known_xfs.get(_normalize(markup))
+        if index is None:
+            if variant != _ALIGN and self.thin_border_id == self.border_count:
+                self.new_borders.append(self._thin_border)
+            index = self.xf_count
+            self.new_xfs.append(markup)
+            self._known_xfs[_normalize(markup)] = index
+        self._cache[key] = index
+        return index
+
+    def _derive(self, markup, variant):
+        match = _XF_START.match(markup)
+        if match is None:
+            raise XlsxPatchError("无法解析单元格样式")
+        name = match.group("name")
+        # 属性值保持原来的引号和转义形式
+        attrs = dict(_XF_ATTR.findall(match.group("attrs")))
+        inner = "" if match.group("close") else markup[match.end():markup.rfind("</")]
+        if variant in (_BORDER, _BORDER_ALIGN):
+            attrs["borderId"] = f'"{self.thin_border_id}"'
+            attrs["applyBorder"] = '"1"'
+        if variant in (_ALIGN, _BORDER_ALIGN):
+            attrs["applyAlignment"] = '"1"'
+            p = qname_prefix(name)
+            inner = f'<{p}alignment horizontal="center" vertical="center"/>' + _XF_ALIGNMENT.sub("", inner)
+        attr_text = "".join(f" {key}={value}" for key, value in attrs.items())
+        if inner:
+            return f"<{name}{attr_text}>{inner}</{name}>"
+        return f"<{name}{attr_text}/>"
+
+
+# --------------------------------------------------------------------------
+# 工作表
+# --------------------------------------------------------------------------
+
+class _SheetContentScanner(XmlPatcher):
+    """判断工作表是否为空 (与 openpyxl 中 max_row == max_column == 1 且 A1 为空的判断一致)"""
+
+    def __init__(self):
+        super().__init__(lambda data: None)
+        self.has_content = False
+        self._cells = 0
+        self._in_cell = False
+
+    def start(self, name, attrs):
+        local = local_name(name)
+        if local == "c" and self.stack and local_name(self.stack[-1]) == "row":
+            self._cells += 1
+            ref = attrs.get("r")
+            if self._cells > 1 or (ref is not None and ref.upper() != "A1"):
+                self.has_content = True
+                raise StopParsing()
+            self._in_cell = True
+        elif self._in_cell and local in ("v", "f", "is"):
+            self.has_content = True
+            raise StopParsing()
+
+    def end(self, name):
+        if local_name(name) == "c":
+            self._in_cell = False
+
+
+class _SheetRewriter(XmlPatcher):
+    def __init__(self, write, style_map, set_tab_color):
+        super().__init__(write)
+        self.style_map = style_map
+        self.need_tab_color = set_tab_color
+        self.prefix = ""
+        self._header_footer_done = False
+        self._first_child = None  # 等待第一个子元素时: (开始位置, 元素名, 要插入的 XML, 已有时不插入的元素)
+        self._odd_header = None   # 正在修改的 oddHeader 内容的开始位置
+        self._row = 0
+        self._cell = None         # 还没有决定样式的 <c>: (开始位置, 属性, 行号)
+
+    def _tab_color_markup(self):
+        return f'<{self.prefix}tabColor rgb="{TAB_COLOR}"/>'
+
+    def _odd_header_markup(self):
+        p = self.prefix
+        return f"<{p}oddHeader>{escape_text(patch_odd_header(''))}</{p}oddHeader>"
+
+    def _resolve_cell(self, has_value):
+        pos, attrs, row = self._cell
+        self._cell = None
+        if has_value:
+            variant = _BORDER_ALIGN if row == 1 else _BORDER
+        elif row == 1:
+            variant = _ALIGN
+        else:
+            return
+        style = self.style_map.get(int(attrs.get("s", "0")), variant)
+        self.set_attr(pos, "s", str(style))
+
+    def _resolve_first_child(self, local):
+        pos, name, markup, existing = self._first_child
+        self._first_child = None
+        if local != existing:
+            self.insert_child(pos, name, markup)
+
+    # sheetData 中的元素数量与单元格数量成正比, 用单独的回调处理, 尽量少做判断
+
+    def _begin_sheet_data(self, name):
+        prefix = qname_prefix(name)
+        self._row_name, self._cell_name = prefix + "row", prefix + "c"
+        self._value_names = {prefix + "v", prefix + "f", prefix + "is"}
+        self._data_depth = 0
+        self.set_handlers(self._data_start, self._data_end)
+
+    def _data_start(self, name, attrs):
+        depth = self._data_depth
+        self._data_depth = depth + 1
+        if self._cell is not None:
+            self._resolve_cell(name in self._value_names)
+        elif depth == 1 and name == self._cell_name:
+            ref = attrs.get("r")
+            match = _CELL_ROW.match(ref) if ref else None
+            self._cell = (self.position(), attrs, int(match.group(1)) if match else self._row)
+        elif depth == 0 and name == self._row_name:
+            row_ref = attrs.get("r")
+            self._row = int(row_ref) if row_ref else self._row + 1
+
+    def _data_end(self, name):
+        depth = self._data_depth - 1
+        if depth < 0:
+            # </sheetData>
+            self.set_handlers()
+            self._end(name)
+            return
+        self._data_depth = depth
+        if self._cell is not None:
+            # 没有子元素的 <c>
+            self._resolve_cell(False)
+        self.compact()
+
+    def start(self, name, attrs):
+        depth = len(self.stack)
+        local = local_name(name)
+        if depth == 0:
+            self.prefix = qname_prefix(name)
+        elif depth == 1:
+            p = self.prefix
+            if self.need_tab_color:
+                self.need_tab_color = False
+                if local == "sheetPr":
+                    self._first_child = (self.position(), name, self._tab_color_markup(), "tabColor")
+                else:
+                    self.insert(self.position(), f"<{p}sheetPr>{self._tab_color_markup()}</{p}sheetPr>")
+            if not self._header_footer_done and local in _AFTER_HEADER_FOOTER:
+                self._header_footer_done = True
+                self.insert(self.position(), f"<{p}headerFooter>{self._odd_header_markup()}</{p}headerFooter>")
+            if local == "headerFooter":
+                self._header_footer_done = True
+                self._first_child = (self.position(), name, self._odd_header_markup(), "oddHeader")
+            elif local == "sheetData" and not self.is_empty_tag(self.position()):
+                self._begin_sheet_data(name)
+        else:
+            if self._first_child is not None:
+                self._resolve_first_child(local)
+            if local == "oddHeader" and local_name(self.stack[-1]) == "headerFooter":
+                pos = self.position()
+                if not self.is_empty_tag(pos):
+                    self._odd_header = self.tag_end(pos)
+                    self.begin_text()
+
+    def end(self, name):
+        depth = len(self.stack)
+        if depth == 2 and self._odd_header is not None:
+            text = self.end_text()
+            self.replace(self._odd_header, self.position(), escape_text(patch_odd_header(text)))
+            self._odd_header = None
+        elif depth == 1 and self._first_child is not None:
+            self._resolve_first_child(None)
+        elif depth == 0 and not self._header_footer_done:
+            p = self.prefix
+            self.insert(self.position(), f"<{p}headerFooter>{self._odd_header_markup()}</{p}headerFooter>")
+
+
+# --------------------------------------------------------------------------
+# 工作簿
+# --------------------------------------------------------------------------
+
+class _WorkbookRewriter(XmlPatcher):
+    """设置每个工作表的打印标题行 (_xlnm.Print_Titles)"""
+
+    def __init__(self, write, worksheet_ids):
+        super().__init__(write)
+        self.worksheet_ids = worksheet_ids  # 工作表 (不含图表工作表) 的 r:id
+        self.prefix = ""
+        self._sheet_names = {}              # localSheetId -> 名称, 只含工作表
+        self._sheet_index = 0
+        self._pending = None                # 还没有 Print_Titles 的 localSheetId
+        self._defined_names_done = False
+        self._print_titles = None           # 正在修改的 Print_Titles: (localSheetId, 内容开始位置)
+
+    def _names_markup(self):
+        p = self.prefix
+        markup = "".join(
+            f'<{p}definedName name="_xlnm.Print_Titles" localSheetId="{index}">'
+            f"{escape_text(print_titles_value(name, ''))}</{p}definedName>"
+            for index, name in self._sheet_names.items()
+            if index in self._pending
+        )
+        self._pending.clear()
+        return markup
+
+    def start(self, name, attrs):
+        local = local_name(name)
+        depth = len(self.stack)
+        if depth == 0:
+            self.prefix = qname_prefix(name)
+        elif depth == 1:
+            if local == "definedNames":
+                self._defined_names_done = True
+                self._pending = set(self._sheet_names)
+                pos = self.position()
+                if self.is_empty_tag(pos):
+                    self.insert_child(pos, name, self._names_markup())
+            elif local in _AFTER_DEFINED_NAMES and not self._defined_names_done:
+                self._inject_defined_names()
+        elif depth == 2 and local == "sheet":
+            rel_id = next((value for key, value in attrs.items() if key.endswith(":id")), None)
+            if rel_id in self.worksheet_ids:
+                self._sheet_names[self._sheet_index] = attrs.get("name", "")
+            self._sheet_index += 1
+        elif depth == 2 and local == "definedName" and attrs.get("name") == "_xlnm.Print_Titles":
+            sheet_id = attrs.get("localSheetId")
+            pos = self.position()
+            if sheet_id is not None and int(sheet_id) in self._pending and not self.is_empty_tag(pos):
+                self._print_titles = (int(sheet_id), self.tag_end(pos))
+                self.begin_text()
+
+    def end(self, name):
+        depth = len(self.stack)
+        if depth == 2 and self._print_titles is not None:
+            index, content_start = self._print_titles
+            self._print_titles = None
+            self._pending.discard(index)
+            value = print_titles_value(self._sheet_names[index], self.end_text())
+            self.replace(content_start, self.position(), escape_text(value))
+        elif depth == 1 and local_name(name) == "definedNames" and self._pending:
+            self.insert(self.position(), self._names_markup())
+        elif depth == 0 and not self._defined_names_done:
+            self._inject_defined_names()
+
+    def _inject_defined_names(self):
+        self._defined_names_done = True
+        self._pending = set(self._sheet_names)
+        markup = self._names_markup()
+        if markup:
+            self.insert(self.position(), f"<{self.prefix}definedNames>{markup}</{self.prefix}definedNames>")
+
+
+# --------------------------------------------------------------------------
+# 入口
+# --------------------------------------------------------------------------
+
+def _locate_parts(zf):
+    """返回 (workbook 部件, styles 部件, [(r:id, 工作表部件)])"""
+    workbook = next(
+        (path for rel_type, path in read_relationships(zf, "").values()
+         if rel_type.endswith("/officeDocument")),
+        None,
+    )
+    if workbook is None:
+        raise XlsxPatchError("找不到 workbook 部件")
+    relationships = read_relationships(zf, workbook)
+    styles = next((path for rel_type, path in relationships.values() if rel_type.endswith("/styles")), None)
+    if styles is None:
+        raise XlsxPatchError("找不到 styles 部件")
+    worksheets = []
+    for _, elem in ET.iterparse(zf.open(workbook), events=("end",)):
+        tag = elem.tag.rpartition("}")[2]
+        if tag == "sheet":
+            rel_id = next((value for key, value in elem.attrib.items() if key.endswith(_R_ID_SUFFIX)), None)
+            rel_type, path = relationships.get(rel_id, ("", None))
+            if rel_type.endswith("/worksheet"):
+                worksheets.append((rel_id, path))
+        elif tag == "sheets":
+            break
+    return workbook, styles, worksheets
+
+
+def patch_xlsx(path):
+    """
+    为 .xlsx 添加页眉、标签颜色、打印标题和边框, 原地替换。
+    工作簿结构不支持时抛出 XlsxPatchError (文件保持不变)。
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".xlsxpatch_", suffix=".xlsx", dir=directory)
+    os.close(fd)
+    try:
+        _patch_to(path, temp_path)
+        os.replace(temp_path, path)
+    except (ZipRewriteError, ExpatError, ET.ParseError, KeyError, ValueError) as e:
+        raise XlsxPatchError(str(e)) from e
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _patch_to(path, temp_path):
+    state = {}
+
+    def prepare(zf):
+        workbook, styles, worksheets = _locate_parts(zf)
+        scanner = _StylesScanner()
+        with zf.open(styles) as f:
+            scanner.feed(f)
+        if not scanner.xfs:
+            raise XlsxPatchError("样式表中没有 cellXfs")
+        state.update(
+            workbook=workbook,
+            styles=styles,
+            sheets={part: rel_id for rel_id, part in worksheets},
+            multiple=len(worksheets) > 1,
+            style_map=_StyleMap(scanner.borders, scanner.xfs, scanner.prefix),
+        )
+
+    def rewrite(info, rewriter):
+        zf = rewriter.zip
+        if not state:
+            prepare(zf)
+        name = info.filename
+        if name == state["styles"]:
+            # 样式表在所有工作表处理完后写在最后, 这时才知道需要追加哪些样式
+            state["styles_info"] = info
+            return True
+        if name == state["workbook"]:
+            with zf.open(info) as f, rewriter.open(info) as out:
+                _WorkbookRewriter(out.write, set(state["sheets"].values())).feed(f)
+            return True
+        if name in state["sheets"]:
+            set_tab_color = False
+            if state["multiple"]:
+                scanner = _SheetContentScanner()
+                with zf.open(info) as f:
+                    scanner.feed(f)
+                set_tab_color = scanner.has_content
+            with zf.open(info) as f, rewriter.open(info) as out:
+                _SheetRewriter(out.write, state["style_map"], set_tab_color).feed(f)
+            return True
+        return False
+
+    def finish(rewriter):
+        info = state.get("styles_info")
+        if info is None:
+            return
+        with rewriter.zip.open(info) as f, rewriter.open(info) as out:
+            _StylesRewriter(out.write, state["style_map"]).feed(f)
+
+    rewrite_zip(path, temp_path, rewrite, finish)
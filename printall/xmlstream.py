@@ -0,0 +1,256 @@
+# printall/xmlstream.py
+"""
+基于 expat 的流式 XML 修改。
+
+XmlPatcher 把输入的字节原样复制到输出, 子类在 start / end 中用 replace / insert
+只改写需要修改的标签或文字, 其余内容 (格式、命名空间前缀等) 保持不变。
+输入按块读取, 已经输出的部分随即丢弃, 内存占用与文档大小无关。
+只支持 UTF-8 编码 (Office Open XML 的各部件都是 UTF-8)。
+"""
+import re
+import functools
+from xml.parsers import expat
+
+_READ_CHUNK = 256 * 1024
+_COMPACT_SIZE = 1024 * 1024  # 缓冲的输入超过这个大小时, 把已经确定的部分写出
+_FLUSH_SIZE = 1024 * 1024
+
+# 从 "<" 开始的一个完整标签 (属性值中可以出现 ">")
+_TAG = re.compile(rb"<[^>\"']*(?:(?:\"[^\"]*\"|'[^']*')[^>\"']*)*>")
+_SLASH = ord("/")
+
+_TEXT_SPECIAL = re.compile(r"[&<>]")
+_ATTR_SPECIAL = re.compile(r'[&<>"\n\r\t]')
+
+
+def local_name(qname):
+    return qname.rpartition(":")[2]
+
+
+def qname_prefix(qname):
+    """返回 "x:" 形式的前缀, 没有前缀时返回空字符串"""
+    prefix, sep, _ = qname.rpartition(":")
+    return prefix + sep
+
+
+def escape_text(text):
+    if _TEXT_SPECIAL.search(text) is None:
+        return text
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def escape_attr(value):
+    if _ATTR_SPECIAL.search(value) is None:
+        return value
+    return (
+        escape_text(value)
+        .replace('"', "&quot;")
+        .replace("\n", "&#10;")
+        .replace("\r", "&#13;")
+        .replace("\t", "&#9;")
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _attr_pattern(name):
+    return re.compile(rb"\s" + re.escape(name.encode("utf-8")) + rb"\s*=\s*(\"[^\"]*\"|'[^']*')")
+
+
+def format_start(name, attrs, empty=False):
+    """attrs 为 dict (保持原来的顺序)"""
+    attr_text = "".join(f' {key}="{escape_attr(value)}"' for key, value in attrs.items())
+    return f"<{name}{attr_text}{'/>' if empty else '>'}"
+
+
+class StopParsing(Exception):
+    """在 start / end 中抛出以提前结束解析 (不再产生输出)"""
+
+
+class XmlPatcher:
+    """
+    write: 接收 bytes 的函数 (例如 zip 条目写入流的 write)。
+    stack 中是当前所在的元素名 (含前缀), 在 start 中还不包含当前元素。
+    位置都是输入中的字节偏移, 由 position() 取得:
+      start 中为开始标签的 "<";
+      end 中为结束标签的 "<" (空元素 <x/> 则是 "/>" 之后)。
+    已经输出的内容不能再修改, 因此替换的位置必须递增;
+    需要回头读取的内容用 hold() 保留在缓冲区中。
+    """
+
+    def __init__(self, write):
+        self._write = write
+        self._buffer = bytearray()  # 尚未丢弃的输入
+        self._offset = 0            # _buffer[0] 在输入中的位置
+        self._copied = 0            # 这个位置之前的输入已经输出 (或被替换)
+        self._hold = None
+        self._output = []
+        self._output_size = 0
+        self._text = None
+        self.stack = []
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        parser.XmlDeclHandler = self._xml_decl
+        parser.StartElementHandler = self._start
+        parser.EndElementHandler = self._end
+        self._parser = parser
+
+    def feed(self, stream):
+        """从二进制流读取并处理整个文档"""
+        parser = self._parser
+        try:
+            while True:
+                chunk = stream.read(_READ_CHUNK)
+                if not chunk:
+                    break
+                self._buffer += chunk
+                parser.Parse(chunk, False)
+            parser.Parse(b"", True)
+        except StopParsing:
+            return
+        self._copy_to(self._offset + len(self._buffer))
+        self._flush()
+
+    # --- 供子类覆盖 ---
+
+    def start(self, name, attrs):
+        pass
+
+    def end(self, name):
+        pass
+
+    # --- 读取输入 ---
+
+    def position(self):
+        return self._parser.CurrentByteIndex
+
+    def tag_end(self, pos):
+        """开始标签位于 pos 时, 返回标签之后的位置"""
+        match = _TAG.match(self._buffer, pos - self._offset)
+        return self._offset + match.end()
+
+    def is_empty_tag(self, pos):
+        """pos 处的标签是否为 <x/> 形式"""
+        return self._buffer[self.tag_end(pos) - self._offset - 2] == _SLASH
+
+    def source(self, start, end):
+        return self._buffer[start - self._offset:end - self._offset].decode("utf-8")
+
+    def hold(self, pos):
+        """保留 pos 之后的输入, 直到 release()"""
+        self._hold = pos
+
+    def release(self):
+        self._hold = None
+
+    def set_handlers(self, start=None, end=None):
+        """
+        直接替换 expat 的元素回调 (用于元素很多的区域, 省去 stack 的维护);
+        不传参数时恢复。替换期间 stack 不变, 也不会自动写出缓冲的输入, 需要调用 compact()。
+        """
+        self._parser.StartElementHandler = start or self._start
+        self._parser.EndElementHandler = end or self._end
+
+    def compact(self):
+        """缓冲的输入较多时, 写出已经确定的部分"""
+        if len(self._buffer) > _COMPACT_SIZE:
+            self._compact()
+
+    def begin_text(self):
+        """开始收集文字, 由 end_text() 返回"""
+        self._text = []
+        self._parser.CharacterDataHandler = self._text.append
+
+    def end_text(self):
+        self._parser.CharacterDataHandler = None
+        text, self._text = "".join(self._text), None
+        return text
+
+    # --- 修改 ---
+
+    def replace(self, start, end, markup):
+        """用 markup (已转义的 XML) 替换输入中 [start, end) 的内容"""
+        self._copy_to(start)
+        self._emit(markup.encode("utf-8"))
+        self._copied = max(self._copied, end)
+
+    def insert(self, pos, markup):
+        self.replace(pos, pos, markup)
+
+    def replace_tag(self, pos, name, attrs):
+        """重写 pos 处的开始标签 (保持是否为空元素)"""
+        end = self.tag_end(pos)
+        empty = self._buffer[end - self._offset - 2] == _SLASH
+        self.replace(pos, end, format_start(name, attrs, empty))
+
+    def set_attr(self, pos, name, value):
+        """修改 pos 处开始标签中的一个属性 (没有时添加), 标签的其余部分原样保留"""
+        buffer, offset = self._buffer, self._offset
+        start = pos - offset
+        end = _TAG.match(buffer, start).end()
+        tag = buffer[start:end]
+        quoted = b'"' + escape_attr(value).encode("utf-8") + b'"'
+        match = _attr_pattern(name).search(tag)
+        if match:
+            new_tag = tag[:match.start(1)] + quoted + tag[match.end(1):]
+        else:
+            cut = end - start - (2 if buffer[end - 2] == _SLASH else 1)
+            new_tag = tag[:cut] + b" " + name.encode("utf-8") + b"=" + quoted + tag[cut:]
+        copied = self._copied - offset
+        if start > copied:
+            self._emit(buffer[copied:start])
+        self._emit(new_tag)
+        self._copied = end + offset
+
+    def insert_child(self, pos, name, markup):
+        """在开始标签位于 pos 的元素中插入第一个子元素, <x/> 会展开为 <x>...</x>"""
+        end = self.tag_end(pos)
+        if self._buffer[end - self._offset - 2] == _SLASH:
+            tag = self.source(pos, end - 2).rstrip()
+            self.replace(pos, end, f"{tag}>{markup}</{name}>")
+        else:
+            self.insert(end, markup)
+
+    # --- 内部 ---
+
+    def _emit(self, data):
+        if data:
+            self._output.append(data)
+            self._output_size += len(data)
+            if self._output_size >= _FLUSH_SIZE:
+                self._flush()
+
+    def _flush(self):
+        if self._output:
+            self._write(b"".join(self._output))
+            self._output.clear()
+        self._output_size = 0
+
+    def _copy_to(self, pos):
+        if pos > self._copied:
+            self._emit(self._buffer[self._copied - self._offset:pos - self._offset])
+            self._copied = pos
+
+    def _compact(self):
+        pos = self.position()
+        if self._hold is not None:
+            pos = min(pos, self._hold)
+        self._copy_to(pos)
+        keep = self._copied if self._hold is None else min(self._copied, self._hold)
+        del self._buffer[:keep - self._offset]
+        self._offset = keep
+
+    # --- expat 回调 ---
+
+    def _xml_decl(self, version, encoding, standalone):
+        if encoding and encoding.lower() not in ("utf-8", "utf8"):
+            raise ValueError(f"不支持的 XML 编码: {encoding}")
+
+    def _start(self, name, attrs):
+        self.start(name, attrs)
+        self.stack.append(name)
+
+    def _end(self, name):
+        self.stack.pop()
+        self.end(name)
+        if len(self._buffer) > _COMPACT_SIZE:
+            self._compact()
@@ -0,0 +1,275 @@
+# printall/ziputil.py
+"""
+按条目重写 zip 包 (docx/xlsx 等 Office 文件)。
+
+未修改的条目直接复制原来的压缩数据, 不解压也不重新压缩;
+修改的条目以流的方式边写边压缩, 内存占用与条目大小无关。
+只支持普通 (非 zip64、未加密) 的 zip 包, 其他情况抛出 ZipRewriteError,
+调用方可以退回到完整读写的方式。
+"""
+import os
+import time
+import zlib
+import struct
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_LOCAL_SIGNATURE = b"PK\003\004"
+_CENTRAL_HEADER = struct.Struct("<4s4B4HL2L5H2L")
+_CENTRAL_SIGNATURE = b"PK\001\002"
+_END_RECORD = struct.Struct("<4s4H2LH")
+_END_SIGNATURE = b"PK\005\006"
+
+_ZIP32_LIMIT = 0xFFFFFFFF
+_FLAG_ENCRYPTED = 0x1
+_FLAG_DATA_DESCRIPTOR = 0x8
+_FLAG_UTF8 = 0x800
+
+_COPY_CHUNK = 1024 * 1024
+
+_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+class ZipRewriteError(Exception):
+    """zip 包的结构不支持按条目重写"""
+
+
+def _dos_datetime(date_time):
+    year, month, day, hour, minute, second = date_time
+    dos_date = (max(year, 1980) - 1980) << 9 | month << 5 | day
+    dos_time = hour << 11 | minute << 5 | second // 2
+    return dos_time, dos_date
+
+
+def _encode_name(name):
+    try:
+        return name.encode("ascii"), 0
+    except UnicodeEncodeError:
+        return name.encode("utf-8"), _FLAG_UTF8
+
+
+class _Entry:
+    def __init__(self, name, flags, compress_type, date_time, crc, compress_size, file_size, external_attr):
+        self.name = name
+        self.flags = flags
+        self.compress_type = compress_type
+        self.date_time = date_time
+        self.crc = crc
+        self.compress_size = compress_size
+        self.file_size = file_size
+        self.external_attr = external_attr
+        self.offset = 0
+
+
+class _EntryWriter:
+    """新条目的写入流, 关闭时回填 CRC 和大小"""
+
+    def __init__(self, rewriter, entry):
+        self._rewriter = rewriter
+        self._entry = entry
+        self._compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        self._crc = 0
+        self._size = 0
+        self._compressed = 0
+
+    def write(self, data):
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        chunk = self._compressor.compress(data)
+        if chunk:
+            self._rewriter._fp.write(chunk)
+            self._compressed += len(chunk)
+        return len(data)
+
+    def close(self):
+        chunk = self._compressor.flush()
+        self._rewriter._fp.write(chunk)
+        self._compressed += len(chunk)
+        if self._size > _ZIP32_LIMIT or self._compressed > _ZIP32_LIMIT:
+            raise ZipRewriteError(f"条目过大, 需要 zip64: {self._entry.name}")
+        entry = self._entry
+        entry.crc, entry.file_size, entry.compress_size = self._crc, self._size, self._compressed
+        self._rewriter._finish_entry(entry)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+
+class ZipRewriter:
+    """
+    读取 src_path, 把条目写入 dst_path (可以在处理过程中决定每个条目是复制还是重写):
+
+        with ZipRewriter(src, dst) as rewriter:
+            for info in rewriter.infolist():
+                if 需要修改:
+                    with rewriter.open(info) as out:
+                        out.write(...)
+                else:
+                    rewriter.copy(info)
+    """
+
+    def __init__(self, src_path, dst_path):
+        self.zip = zipfile.ZipFile(src_path)
+        self._src = open(src_path, "rb")
+        self._fp = open(dst_path, "wb")
+        self._entries = []
+        self._names = set()
+        for info in self.zip.infolist():
+            if info.flag_bits & _FLAG_ENCRYPTED:
+                self.close(abort=True)
+                raise ZipRewriteError(f"不支持加密的条目: {info.filename}")
+            if max(info.header_offset, info.compress_size, info.file_size) >= _ZIP32_LIMIT:
+                self.close(abort=True)
+                raise ZipRewriteError(f"不支持 zip64 条目: {info.filename}")
+
+    def infolist(self):
+        return self.zip.infolist()
+
+    def copy(self, info):
+        """原样复制条目的压缩数据"""
+        self._src.seek(info.header_offset)
+        header = self._src.read(_LOCAL_HEADER.size)
+        if len(header) != _LOCAL_HEADER.size or header[:4] != _LOCAL_SIGNATURE:
+            raise ZipRewriteError(f"本地文件头损坏: {info.filename}")
+        fields = _LOCAL_HEADER.unpack(header)
+        name_length, extra_length = fields[-2], fields[-1]
+        self._src.seek(name_length + extra_length, os.SEEK_CUR)
+        entry = _Entry(
+            info.filename,
+            info.flag_bits & ~_FLAG_DATA_DESCRIPTOR,
+            info.compress_type,
+            info.date_time,
+            info.CRC,
+            info.compress_size,
+            info.file_size,
+            info.external_attr,
+        )
+        self._start_entry(entry)
+        remaining = info.compress_size
+        while remaining:
+            chunk = self._src.read(min(_COPY_CHUNK, remaining))
+            if not chunk:
+                raise ZipRewriteError(f"条目数据不完整: {info.filename}")
+            self._fp.write(chunk)
+            remaining -= len(chunk)
+        self._finish_entry(entry)
+
+    def open(self, info_or_name):
+        """返回新条目的写入流; 传入原条目时沿用其名称、时间和属性"""
+        if isinstance(info_or_name, zipfile.ZipInfo):
+            name, date_time, external_attr = (
+                info_or_name.filename, info_or_name.date_time, info_or_name.external_attr
+            )
+        else:
+            name, date_time, external_attr = info_or_name, time.localtime()[:6], 0
+        _, utf8_flag = _encode_name(name)
+        entry = _Entry(name, utf8_flag, zipfile.ZIP_DEFLATED, date_time, 0, 0, 0, external_attr)
+        self._start_entry(entry)
+        return _EntryWriter(self, entry)
+
+    def _local_header(self, entry):
+        encoded_name, utf8_flag = _encode_name(entry.name)
+        dos_time, dos_date = _dos_datetime(entry.date_time)
+        header = _LOCAL_HEADER.pack(
+            _LOCAL_SIGNATURE, 20, 0, entry.flags | utf8_flag, entry.compress_type,
+            dos_time, dos_date, entry.crc, entry.compress_size, entry.file_size,
+            len(encoded_name), 0,
+        )
+        return header + encoded_name
+
+    def _start_entry(self, entry):
+        if entry.name in self._names:
+            raise ZipRewriteError(f"条目重复: {entry.name}")
+        self._names.add(entry.name)
+        entry.offset = self._fp.tell()
+        if entry.offset >= _ZIP32_LIMIT:
+            raise ZipRewriteError("输出文件过大, 需要 zip64")
+        self._fp.write(self._local_header(entry))
+
+    def _finish_entry(self, entry):
+        # 新条目的 CRC 和大小在写完数据后才知道, 回到文件头补上
+        end = self._fp.tell()
+        self._fp.seek(entry.offset)
+        self._fp.write(self._local_header(entry))
+        self._fp.seek(end)
+        self._entries.append(entry)
+
+    def _write_central_directory(self):
+        start = self._fp.tell()
+        for entry in self._entries:
+            encoded_name, utf8_flag = _encode_name(entry.name)
+            dos_time, dos_date = _dos_datetime(entry.date_time)
+            self._fp.write(_CENTRAL_HEADER.pack(
+                _CENTRAL_SIGNATURE, 20, 0, 20, 0, entry.flags | utf8_flag, entry.compress_type,
+                dos_time, dos_date, entry.crc, entry.compress_size, entry.file_size,
+                len(encoded_name), 0, 0, 0, 0, entry.external_attr, entry.offset,
+            ))
+            self._fp.write(encoded_name)
+        size = self._fp.tell() - start
+        if len(self._entries) > 0xFFFF or start + size >= _ZIP32_LIMIT:
+            raise ZipRewriteError("条目过多或文件过大, 需要 zip64")
+        self._fp.write(_END_RECORD.pack(
+            _END_SIGNATURE, 0, 0, len(self._entries), len(self._entries), size, start, 0,
+        ))
+
+    def close(self, abort=False):
+        try:
+            if not abort:
+                self._write_central_directory()
+        finally:
+            self._fp.close()
+            self._src.close()
+            self.zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(abort=exc_type is not None)
+
+
+def rewrite_zip(src_path, dst_path, rewrite, finish=None):
+    """
+    逐个条目处理 src_path 并写入 dst_path。
+    rewrite(info, rewriter) 处理了该条目 (写入了新内容) 时返回 True, 否则原样复制;
+    推迟处理的条目可以在 finish(rewriter) 中写入 (位于其他条目之后)。
+    失败时删除不完整的 dst_path。
+    """
+    try:
+        with ZipRewriter(src_path, dst_path) as rewriter:
+            for info in rewriter.infolist():
+                if not rewrite(info, rewriter):
+                    rewriter.copy(info)
+            if finish is not None:
+                finish(rewriter)
+    except BaseException:
+        if os.path.exists(dst_path):
+            os.remove(dst_path)
+        raise
+
+
+def read_relationships(zf, part):
+    """读取 Office 文件中 part 的关系 (part 为空字符串时读取包的关系), 返回 {Id: (Type, 目标部件路径)}"""
+    directory, filename = posixpath.split(part)
+    rels_name = posixpath.join(directory, "_rels", filename + ".rels")
+    try:
+        root = ET.fromstring(zf.read(rels_name))
+    except KeyError:
+        return {}
+    relationships = {}
+    for rel in root.iter(_REL_NS + "Relationship"):
+        if rel.get("TargetMode") == "External":
+            continue
+        target = rel.get("Target", "")
+        if target.startswith("/"):
+            path = target.lstrip("/")
+        else:
+            path = posixpath.normpath(posixpath.join(directory, target))
+        relationships[rel.get("Id")] = (rel.get("Type", ""), path)
+    return relationships
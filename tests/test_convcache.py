@@ -0,0 +1,133 @@
+import os
+
+import pytest
+
+from printall import convcache
+from printall.convcache import ConversionCache
+
+FAKE_SOFFICE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools", "fake_soffice.py")
+
+
+def _builder(size, calls=None):
+    """生成一个 size 字节的 "PDF"; calls 记录调用次数"""
+    def build(temp_dir):
+        if calls is not None:
+            calls.append(temp_dir)
+        path = os.path.join(temp_dir, "out.pdf")
+        with open(path, "wb") as f:
+            f.write(b"%PDF" + b"\0" * (size - 4))
+        return path
+
+    return build
+
+
+def _set_age(path, seconds_ago):
+    """把缓存文件的最近使用时间设置为 seconds_ago 秒以前"""
+    when = os.path.getmtime(path) - seconds_ago
+    os.utime(path, (when, when))
+
+
+class _FakePool:
+    """只记录转换次数的 Office 进程池"""
+
+    def __init__(self, soffice_path):
+        self.soffice_path = soffice_path
+        self.converted = []
+
+    def convert_to_pdf(self, src, outdir, timeout=60):
+        self.converted.append(src)
+        return _builder(64)(outdir)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ConversionCache(str(tmp_path / "cache"), max_bytes=1000)
+
+
+def test_second_request_is_a_hit(cache):
+    calls = []
+    path, hit = cache.get_or_build("a" * 64, _builder(100, calls))
+    assert not hit and path == cache.path_for("a" * 64) and os.path.getsize(path) == 100
+    assert cache.get_or_build("a" * 64, _builder(100, calls)) == (path, True)
+    assert len(calls) == 1
+    # 临时目录已经删除
+    assert not [name for name in os.listdir(cache.cache_dir) if name.startswith("convert_")]
+
+
+def test_build_returning_none_is_not_cached(cache):
+    assert cache.get_or_build("a" * 64, lambda temp_dir: None) == (None, False)
+    assert cache.lookup("a" * 64) is None
+
+
+def test_pin_and_unpin_are_counted(cache):
+    path, _ = cache.get_or_build("a" * 64, _builder(100), pin=True)
+    assert cache.get_or_build("a" * 64, _builder(100), pin=True) == (path, True)
+    # 不固定的请求不改变计数
+    cache.get_or_build("a" * 64, _builder(100))
+    assert cache._pins[path] == 2
+    cache.unpin(path)
+    assert cache._pins[path] == 1
+    cache.unpin(path)
+    assert path not in cache._pins
+    assert cache._key_locks == {}
+
+
+def test_lru_eviction_under_the_cap(cache):
+    a, b, c = (cache.get_or_build(key * 64, _builder(300))[0] for key in "abc")
+    _set_age(a, 100)
+    _set_age(b, 50)
+    _set_age(c, 10)
+    # 再次使用 a, a 成为最近使用的文件
+    assert cache.lookup("a" * 64) == a
+    # 总大小 1200 超过上限 1000, 从最久没有使用的 b 开始淘汰, 回到上限的 90% 为止
+    cache.get_or_build("d" * 64, _builder(300))
+    assert [key for key in "abcd" if cache.lookup(key * 64)] == ["a", "c", "d"]
+    assert cache._total == 900
+
+
+def test_evicting_a_pinned_entry_keeps_it(cache):
+    pinned, _ = cache.get_or_build("a" * 64, _builder(400), pin=True)
+    _set_age(pinned, 100)
+    other, _ = cache.get_or_build("b" * 64, _builder(400))
+    _set_age(other, 50)
+    cache.get_or_build("c" * 64, _builder(400))
+    # 最旧的 a 被固定, 跳过它淘汰 b
+    assert os.path.exists(pinned)
+    assert not os.path.exists(other)
+    cache.unpin(pinned)
+    cache.get_or_build("d" * 64, _builder(400))
+    assert not os.path.exists(pinned)
+
+
+def test_key_changes_with_libreoffice_version(tmp_path, monkeypatch):
+    monkeypatch.setattr(convcache, "_version_cache", {})
+    program = tmp_path / "program"
+    program.mkdir()
+    soffice = program / "soffice"
+    soffice.write_bytes(b"")
+    (program / "version.ini").write_text("[Version]\nbuildid=7.6.4.1\n")
+    src = tmp_path / "a.docx"
+    src.write_bytes(b"docx")
+    cache = ConversionCache(str(tmp_path / "cache"))
+    pool = _FakePool(str(soffice))
+    first, hit = cache.get_or_convert(str(src), pool)
+    assert not hit
+    assert cache.get_or_convert(str(src), pool) == (first, True)
+
+    # 升级 LibreOffice 后 (新进程重新读取版本), 旧的转换结果不再命中
+    (program / "version.ini").write_text("[Version]\nbuildid=24.2.0.3\n")
+    monkeypatch.setattr(convcache, "_version_cache", {})
+    second, hit = cache.get_or_convert(str(src), pool)
+    assert not hit and second != first
+    assert pool.converted == [str(src), str(src)]
+
+    # 文件内容改变同样不会命中
+    src.write_bytes(b"changed docx")
+    assert cache.get_or_convert(str(src), pool)[1] is False
+
+
+@pytest.mark.skipif(os.name == "nt", reason="假 soffice 需要能直接执行 .py 脚本")
+def test_version_from_soffice_when_no_version_file(monkeypatch):
+    monkeypatch.setattr(convcache, "_version_cache", {})
+    assert convcache.libreoffice_version(FAKE_SOFFICE) == "LibreOffice 7.6.4.1 fake-soffice"
+    assert convcache._version_cache == {FAKE_SOFFICE: "LibreOffice 7.6.4.1 fake-soffice"}
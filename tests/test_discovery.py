@@ -0,0 +1,87 @@
+import os
+import sys
+import locale
+import functools
+
+import pytest
+
+from printall import discovery
+
+
+@pytest.fixture(autouse=True)
+def restore_collation():
+    saved = discovery._system_key, locale.setlocale(locale.LC_COLLATE)
+    yield
+    discovery._system_key = saved[0]
+    locale.setlocale(locale.LC_COLLATE, saved[1])
+
+
+def _sorted(names):
+    return sorted(names, key=discovery.natural_key)
+
+
+# 模拟中文区域设置的 strxfrm: 汉字按拼音, 全角标点与半角相同
+_PINYIN = {"阿": "a", "安": "an", "张": "zhang", "图": "tu"}
+_FULLWIDTH = {"（": "(", "）": ")", "，": ","}
+
+
+def _fake_strxfrm(text):
+    return "".join(_PINYIN.get(c, _FULLWIDTH.get(c, c.lower())) for c in text)
+
+
+def test_builtin_key_orders_numbers_by_value_with_non_ascii_names():
+    names = ["图10.jpg", "图2.jpg", "图1.jpg", "Äpfel 3.png", "äpfel 20.png"]
+    assert _sorted(names) == ["Äpfel 3.png", "äpfel 20.png", "图1.jpg", "图2.jpg", "图10.jpg"]
+
+
+def test_builtin_key_is_deterministic_for_case_and_leading_zeros():
+    assert _sorted(["b.pdf", "B.pdf", "a01.pdf", "a1.pdf"]) == ["a01.pdf", "a1.pdf", "B.pdf", "b.pdf"]
+
+
+def test_transform_key_uses_locale_order_for_text():
+    discovery._system_key = functools.partial(discovery._transform_key, transform=_fake_strxfrm)
+    names = ["张1.docx", "阿10.docx", "阿2.docx", "安.docx"]
+    # 按码位 "张" (U+5F20) 在 "阿" (U+963F) 之前, 按拼音在之后
+    assert _sorted(names) == ["阿2.docx", "阿10.docx", "安.docx", "张1.docx"]
+
+
+def test_transform_key_keeps_numbers_and_prefixes_in_order():
+    discovery._system_key = functools.partial(discovery._transform_key, transform=_fake_strxfrm)
+    assert _sorted(["ab", "a10", "a", "a9", "a（1）"]) == ["a", "a9", "a10", "a（1）", "ab"]
+
+
+def test_path_key_groups_subfolders_with_non_ascii_names():
+    discovery._system_key = functools.partial(discovery._transform_key, transform=_fake_strxfrm)
+    root = os.path.join("root")
+    paths = [
+        os.path.join(root, "张", "1.jpg"),
+        os.path.join(root, "阿", "10.jpg"),
+        os.path.join(root, "阿", "2.jpg"),
+        os.path.join(root, "图.jpg"),
+    ]
+    assert discovery.sort_paths(paths, root) == [paths[2], paths[1], paths[3], paths[0]]
+
+
+def _has_locale(name):
+    try:
+        locale.setlocale(locale.LC_COLLATE, name)
+        return True
+    except locale.Error:
+        return False
+    finally:
+        locale.setlocale(locale.LC_COLLATE, "C")
+
+
+@pytest.mark.skipif(sys.platform == "win32" or not _has_locale("zh_CN.UTF-8"), reason="需要 zh_CN.UTF-8 区域设置")
+def test_system_collation_sorts_chinese_by_pinyin(monkeypatch):
+    monkeypatch.setenv("LC_ALL", "zh_CN.UTF-8")
+    discovery.use_system_collation()
+    assert discovery._system_key is not None
+    assert _sorted(["张2.pdf", "阿10.pdf", "阿9.pdf"]) == ["阿9.pdf", "阿10.pdf", "张2.pdf"]
+
+
+@pytest.mark.skipif(sys.platform != "win32", reason="只在 Windows 上使用 LCMapStringEx")
+def test_windows_collation_orders_numbers_by_value():
+    discovery.use_system_collation()
+    assert discovery._system_key is not None
+    assert _sorted(["图10.jpg", "图2.jpg", "b.pdf", "A.pdf"]) == ["A.pdf", "b.pdf", "图2.jpg", "图10.jpg"]
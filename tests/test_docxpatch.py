@@ -0,0 +1,139 @@
+import shutil
+import zipfile
+
+import pytest
+
+docx = pytest.importorskip("docx")
+from docx.enum.section import WD_SECTION
+from docx.shared import Inches
+
+from printall.docxpatch import patch_docx_header
+from printall.watermark import add_word_watermark, WatermarkOptions
+
+HEADER_TEXT = "打印对象：src.docx"
+
+
+def _save(document, tmp_path):
+    path = tmp_path / "src.docx"
+    document.save(path)
+    return path
+
+
+def _header_part_count(path):
+    with zipfile.ZipFile(path) as zf:
+        return sum(1 for name in zf.namelist() if name.startswith("word/header"))
+
+
+def _describe_header(header):
+    paragraphs = []
+    for paragraph in header.paragraphs:
+        runs = [
+            (run.text, run.font.name, run.font.size, run.font.color.rgb if run.font.color.type else None)
+            for run in paragraph.runs
+        ]
+        paragraphs.append((paragraph.text, paragraph.alignment, runs))
+    return header.is_linked_to_previous, paragraphs
+
+
+def _describe(path):
+    document = docx.Document(path)
+    return [
+        {
+            "default": _describe_header(section.header),
+            "first": _describe_header(section.first_page_header),
+            "even": _describe_header(section.even_page_header),
+            "different_first": section.different_first_page_header_footer,
+            "body": [p.text for p in document.paragraphs],
+        }
+        for section in document.sections
+    ]
+
+
+def _both(path, tmp_path):
+    """(流式修改的结果, python-docx 处理的结果, 流式修改是否改动了文件)"""
+    # 页眉文字由文件名决定, 两份副本放在不同目录中, 文件名都是 src.docx
+    streamed, fallback = tmp_path / "streamed" / "src.docx", tmp_path / "python-docx" / "src.docx"
+    for copy in (streamed, fallback):
+        copy.parent.mkdir()
+        shutil.copy(path, copy)
+    modified = patch_docx_header(str(streamed), HEADER_TEXT)
+    messages = []
+    assert add_word_watermark(str(fallback), WatermarkOptions(word_streaming=False), messages.append)
+    return streamed, fallback, modified
+
+
+@pytest.fixture
+def multi_section(tmp_path):
+    document = docx.Document()
+    document.add_paragraph("第一节")
+    first = document.sections[0]
+    first.left_margin = first.right_margin = Inches(0.5)
+    second = document.add_section(WD_SECTION.NEW_PAGE)
+    second.page_width, second.page_height = second.page_height, second.page_width
+    second.header.is_linked_to_previous = False
+    second.header.paragraphs[0].text = "第二节页眉"
+    document.add_paragraph("第二节")
+    return _save(document, tmp_path)
+
+
+def test_no_header_part_creates_one(tmp_path):
+    document = docx.Document()
+    document.add_paragraph("正文")
+    path = _save(document, tmp_path)
+    assert _header_part_count(path) == 0
+    streamed, fallback, modified = _both(path, tmp_path)
+    assert modified
+    assert _header_part_count(streamed) == 1
+    assert _describe(streamed) == _describe(fallback)
+    header = docx.Document(streamed).sections[0].header
+    assert header.paragraphs[0].text == HEADER_TEXT
+
+
+def test_multiple_sections_only_first_default_header(multi_section, tmp_path):
+    streamed, fallback, modified = _both(multi_section, tmp_path)
+    assert modified
+    assert _describe(streamed) == _describe(fallback)
+    sections = _describe(streamed)
+    assert sections[0]["default"][1][0][0] == HEADER_TEXT
+    assert sections[1]["default"][1][0][0] == "第二节页眉"
+    # 字号按第一节的版心宽度计算: (8.5 - 1) 英寸 = 540 磅, 540 / 60 = 9
+    run = sections[0]["default"][1][0][2][0]
+    assert (run[1], run[2].pt, str(run[3])) == ("宋体", 9.0, "FF0000")
+
+
+def test_first_page_and_even_headers_are_left_alone(tmp_path):
+    document = docx.Document()
+    section = document.sections[0]
+    section.different_first_page_header_footer = True
+    section.first_page_header.paragraphs[0].text = "首页页眉"
+    document.settings.odd_and_even_pages_header_footer = True
+    section.even_page_header.paragraphs[0].text = "偶数页页眉"
+    for i in range(3):
+        document.add_paragraph(f"第 {i + 1} 段")
+    path = _save(document, tmp_path)
+    streamed, fallback, modified = _both(path, tmp_path)
+    assert modified
+    assert _describe(streamed) == _describe(fallback)
+    result = _describe(streamed)[0]
+    assert result["default"][1][0][0] == HEADER_TEXT
+    assert result["first"][1][0][0] == "首页页眉"
+    assert result["even"][1][0][0] == "偶数页页眉"
+
+
+def test_existing_header_text_is_kept(tmp_path):
+    document = docx.Document()
+    document.sections[0].header.paragraphs[0].text = "已有页眉"
+    path = _save(document, tmp_path)
+    before = path.read_bytes()
+    streamed, fallback, modified = _both(path, tmp_path)
+    assert not modified
+    assert streamed.read_bytes() == before
+    assert _describe(streamed) == _describe(fallback)
+
+
+def test_rerun_on_watermarked_file_is_a_no_op(multi_section, tmp_path):
+    assert patch_docx_header(str(multi_section), HEADER_TEXT)
+    once = multi_section.read_bytes()
+    assert not patch_docx_header(str(multi_section), HEADER_TEXT)
+    assert multi_section.read_bytes() == once
+    assert _header_part_count(multi_section) == 2
@@ -0,0 +1,71 @@
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+from printall.impose import Imposer, booklet_order
+
+
+def _source(tmp_path, name, pages):
+    path = tmp_path / name
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), f"{name} {i + 1}")
+    doc.save(path)
+    doc.close()
+    return str(path)
+
+
+def _texts(path):
+    with fitz.open(path) as doc:
+        return [page.get_text() for page in doc]
+
+
+def test_booklet_order():
+    assert booklet_order(4) == [(3, 0), (1, 2)]
+    assert booklet_order(5) == [(None, 0), (1, None), (None, 2), (3, 4)]
+
+
+def test_pack_continues_on_the_same_sheet(tmp_path):
+    imposer = Imposer("4up", str(tmp_path), pack=True)
+    assert imposer.add(_source(tmp_path, "a.pdf", 3), "a.pdf") == []
+    assert imposer.add(_source(tmp_path, "b.pdf", 2), "b.pdf") == []
+    [job] = imposer.finish()
+    assert (job.sources, job.pages, job.sheets) == (["a.pdf", "b.pdf"], 5, 2)
+    assert len(_texts(job.path)) == 2
+
+
+def test_failed_document_is_rolled_back_in_pack_mode(tmp_path, monkeypatch):
+    imposer = Imposer("4up", str(tmp_path), pack=True)
+    imposer.add(_source(tmp_path, "a.pdf", 3), "a.pdf")
+    show = Imposer._show
+    calls = []
+
+    def fail_on_fourth_page(self, rect, src, pno, label_band=False):
+        calls.append(pno)
+        if pno == 3:
+            raise RuntimeError("损坏的页面")
+        show(self, rect, src, pno, label_band)
+
+    # b 的前三页已经排入 (第 1 张纸的最后一格和第 2 张纸), 第 4 页出错
+    monkeypatch.setattr(Imposer, "_show", fail_on_fourth_page)
+    with pytest.raises(RuntimeError):
+        imposer.add(_source(tmp_path, "b.pdf", 5), "b.pdf")
+    assert calls == [0, 1, 2, 3]
+    monkeypatch.setattr(Imposer, "_show", show)
+    imposer.add(_source(tmp_path, "c.pdf", 1), "c.pdf")
+    [job] = imposer.finish()
+    assert (job.sources, job.pages, job.sheets) == (["a.pdf", "c.pdf"], 4, 1)
+    [text] = _texts(job.path)
+    assert "b.pdf" not in text
+    assert all(f"a.pdf {i}" in text for i in (1, 2, 3)) and "c.pdf 1" in text
+
+
+def test_failed_first_document_discards_the_output(tmp_path, monkeypatch):
+    def fail(self, rect, src, pno, label_band=False):
+        raise RuntimeError("损坏的页面")
+
+    imposer = Imposer("2up", str(tmp_path), pack=True)
+    monkeypatch.setattr(Imposer, "_show", fail)
+    with pytest.raises(RuntimeError):
+        imposer.add(_source(tmp_path, "a.pdf", 2), "a.pdf")
+    assert imposer.finish() == []
@@ -0,0 +1,145 @@
+import os
+import json
+
+import pytest
+
+from printall import journal as jobjournal
+from printall import parallel, cli
+from printall.journal import JobJournal, JournalError, open_last_run
+from printall.printing import PrintEngine, PrintOptions
+from printall.spool import FileBackend
+from printall.watermark import WatermarkOptions
+
+
+class Interrupted(BaseException):
+    """模拟任务中途被中断 (Ctrl+C、进程被结束等)"""
+
+
+def _states(directory, command):
+    """用另一个连接读取已经提交到磁盘的状态"""
+    other = JobJournal.open(command, str(directory))
+    try:
+        return {os.path.basename(item.path): item.state for item in other.unfinished()}, other.state_counts()
+    finally:
+        other.close()
+
+
+@pytest.fixture
+def folder(tmp_path):
+    folder = tmp_path / "files"
+    folder.mkdir()
+    for name in ("a.pdf", "b.pdf", "bad.pdf", "c.pdf", "d.pdf"):
+        (folder / name).write_bytes(b"%PDF-1.4\n")
+    return folder
+
+
+def test_state_transitions_are_committed(tmp_path, folder):
+    journal = JobJournal.open("watermark", str(tmp_path))
+    journal.start(str(folder), {"kinds": ["pdf"]})
+    paths = [str(folder / name) for name in ("a.pdf", "b.pdf", "bad.pdf")]
+    for path, _ in journal.queued((path, "pdf") for path in paths):
+        # 产出时 queued 状态已经提交, 另一个连接可以读到
+        assert _states(tmp_path, "watermark")[0][os.path.basename(path)] == jobjournal.QUEUED
+    journal.mark(paths[0], jobjournal.IN_PROGRESS, sync=True)
+    assert _states(tmp_path, "watermark")[0]["a.pdf"] == jobjournal.IN_PROGRESS
+    journal.mark(paths[0], jobjournal.DONE, sync=True)
+    journal.mark(paths[2], jobjournal.FAILED, "损坏", sync=True)
+    unfinished, counts = _states(tmp_path, "watermark")
+    assert unfinished == {"b.pdf": jobjournal.QUEUED, "bad.pdf": jobjournal.FAILED}
+    assert counts == {jobjournal.DONE: 1, jobjournal.QUEUED: 1, jobjournal.FAILED: 1}
+    assert [item.error for item in journal.unfinished()] == [None, "损坏"]
+    assert journal.last_run().finished is None
+    journal.finish()
+    assert journal.last_run().finished is not None
+    journal.close()
+
+
+def test_start_clears_the_previous_run(tmp_path, folder):
+    journal = JobJournal.open("print", str(tmp_path))
+    journal.start(str(folder), {"n": 1})
+    journal.queue(str(folder / "a.pdf"), "pdf", sync=True)
+    journal.start(str(folder), {"n": 2})
+    assert journal.unfinished() == []
+    assert journal.last_run().params == {"n": 2}
+    journal.close()
+
+
+def test_no_previous_run(tmp_path):
+    with pytest.raises(JournalError):
+        open_last_run("watermark", str(tmp_path))
+    assert cli.main(["-q", "--journal-dir", str(tmp_path), "print", "--resume"]) == cli.EXIT_SETUP
+
+
+def _recording_handler(calls, fail_at=None, interrupt_at=None):
+    """记录处理的文件和水印位置; 第 fail_at 个文件处理失败, 处理第 interrupt_at 个文件时中断"""
+    def handler(path, options, log):
+        calls.append((os.path.basename(path), options.position))
+        if len(calls) == interrupt_at:
+            raise Interrupted()
+        return len(calls) != fail_at
+
+    return handler
+
+
+def test_resume_watermark_after_interrupted_run(tmp_path, folder, monkeypatch):
+    calls = []
+    monkeypatch.setitem(parallel.WATERMARK_HANDLERS, "pdf", _recording_handler(calls, fail_at=2, interrupt_at=3))
+    journal = JobJournal.open("watermark", str(tmp_path))
+    with pytest.raises(Interrupted):
+        parallel.run_watermark_batch(str(folder), {"pdf"}, WatermarkOptions(position="左上角"), workers=1,
+                                     journal=journal)
+    journal.close()
+    processed = [name for name, _ in calls]
+    assert len(processed) == 3
+    # 第 1 个文件成功, 第 2 个失败, 第 3 个处理中被中断, 其余两个还在队列中
+    unfinished, _ = _states(tmp_path, "watermark")
+    assert unfinished == {
+        processed[1]: jobjournal.FAILED,
+        processed[2]: jobjournal.IN_PROGRESS,
+        **{name: jobjournal.QUEUED for name in os.listdir(folder) if name not in processed},
+    }
+
+    calls.clear()
+    monkeypatch.setitem(parallel.WATERMARK_HANDLERS, "pdf", _recording_handler(calls))
+    journal, run = open_last_run("watermark", str(tmp_path))
+    counts = parallel.resume_watermark_batch(journal, run, workers=1)
+    journal.close()
+    # 只处理上次没有完成的文件 (包括失败的), 水印参数与上次相同
+    assert sorted(calls) == sorted((name, "左上角") for name in unfinished)
+    assert counts["total"] == 4 and counts["failed"] == 0
+    assert _states(tmp_path, "watermark") == ({}, {jobjournal.DONE: 5})
+
+
+def test_resume_print_after_interrupted_run(tmp_path, folder, monkeypatch):
+    out = tmp_path / "printed"
+    options = PrintOptions(printer="test", extensions=("pdf",), backend=f"file:{out}", prepare_workers=1)
+    submit = FileBackend.submit
+
+    def interrupt_at_c(self, pdf_path, printer, title):
+        if title == "c.pdf":
+            raise Interrupted()
+        submit(self, pdf_path, printer, title)
+
+    monkeypatch.setattr(FileBackend, "submit", interrupt_at_c)
+    engine = PrintEngine(soffice_path=None)
+    journal = JobJournal.open("print", str(tmp_path))
+    with pytest.raises(Interrupted):
+        engine.run(str(folder), options, lambda message: None, journal=journal)
+    journal.close()
+    unfinished, _ = _states(tmp_path, "print")
+    assert unfinished == {"c.pdf": jobjournal.IN_PROGRESS, "d.pdf": jobjournal.QUEUED}
+
+    monkeypatch.setattr(FileBackend, "submit", submit)
+    journal, run = open_last_run("print", str(tmp_path))
+    messages = []
+    summary = engine.resume(journal, run, messages.append)
+    journal.close()
+    engine.close()
+    assert [os.path.basename(p) for p in summary.printed] == ["c.pdf", "d.pdf"]
+    # 上次中断在发送过程中的文件会提示可能已经部分打印
+    assert any("c.pdf" in message and "部分打印" in message for message in messages)
+    with open(out / "jobs.jsonl", encoding="utf-8") as f:
+        jobs = [json.loads(line) for line in f]
+    # 打印参数 (打印机、后端) 从任务日志还原, 每个文件只成功发送一次
+    assert [job["title"] for job in jobs] == ["a.pdf", "b.pdf", "bad.pdf", "c.pdf", "d.pdf"]
+    assert {job["printer"] for job in jobs} == {"test"}
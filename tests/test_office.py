@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import threading
+
+import pytest
+
+from printall import office
+from printall.office import OfficePool, OfficeError
+
+FAKE_SOFFICE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools", "fake_soffice.py")
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="假 soffice 需要能直接执行 .py 脚本")
+
+
+@pytest.fixture
+def call_log(tmp_path, monkeypatch):
+    """假 soffice 的调用记录; 环境变量在启动工作进程前设置, 由工作进程和 soffice 继承"""
+    path = tmp_path / "calls.jsonl"
+    monkeypatch.setenv("FAKE_SOFFICE_CALL_LOG", str(path))
+    monkeypatch.delenv("FAKE_SOFFICE_DELAY", raising=False)
+
+    def read():
+        if not path.exists():
+            return []
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line)["argv"] for line in f]
+
+    return read
+
+
+@pytest.fixture
+def documents(tmp_path):
+    folder = tmp_path / "docs"
+    folder.mkdir()
+    paths = []
+    for i in range(6):
+        path = folder / f"doc_{i}.docx"
+        path.write_bytes(b"not really a docx")
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture
+def pool_factory():
+    pools = []
+
+    def create(**kwargs):
+        pool = OfficePool(FAKE_SOFFICE, **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield create
+    for pool in pools:
+        pool.close()
+
+
+def _profiles(calls):
+    return {arg for argv in calls for arg in argv if arg.startswith("-env:UserInstallation=")}
+
+
+def test_concurrent_conversions_use_separate_workers(documents, tmp_path, call_log, monkeypatch, pool_factory):
+    monkeypatch.setenv("FAKE_SOFFICE_DELAY", "0.5")
+    pool = pool_factory(size=3)
+    outdir = tmp_path / "out"
+    outdir.mkdir()
+    results, errors = [], []
+
+    def convert(path):
+        try:
+            results.append(pool.convert_to_pdf(path, str(outdir)))
+        except Exception as e:
+            errors.append(e)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=convert, args=(path,)) for path in documents]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    assert not errors
+    assert sorted(os.path.basename(p) for p in results) == [f"doc_{i}.pdf" for i in range(6)]
+    assert all(os.path.getsize(p) > 0 for p in results)
+    # 6 个转换分给 3 个工作进程, 每个工作进程使用自己的配置目录
+    assert len(_profiles(call_log())) == 3
+    assert elapsed < 6 * 0.5
+
+
+def test_crashed_worker_is_replaced(documents, tmp_path, call_log, pool_factory):
+    pool = pool_factory(size=1)
+    pool.convert_to_pdf(documents[0], str(tmp_path))
+    [worker] = pool._idle
+    worker._process.kill()
+    worker._process.wait()
+    # 健康检查发现工作进程已退出, 换一个新的工作进程 (新的配置目录) 处理
+    assert os.path.exists(pool.convert_to_pdf(documents[1], str(tmp_path)))
+    assert len(_profiles(call_log())) == 2
+    assert pool._started == 1
+
+
+def test_timeout_kills_soffice_and_keeps_the_pool_usable(documents, tmp_path, call_log, monkeypatch, pool_factory):
+    monkeypatch.setenv("FAKE_SOFFICE_DELAY", "3")
+    pool = pool_factory(size=1)
+    start = time.perf_counter()
+    with pytest.raises(OfficeError):
+        pool.convert_to_pdf(documents[0], str(tmp_path), timeout=1)
+    assert time.perf_counter() - start < 3
+    # soffice 已被结束: 等它原本的延迟过去后也不会写出 PDF
+    time.sleep(2.5)
+    assert not (tmp_path / "doc_0.pdf").exists()
+    assert pool._started == 1
+
+
+def test_cli_fallback_without_worker_interpreter(documents, tmp_path, call_log, monkeypatch, pool_factory):
+    monkeypatch.setattr(office, "worker_command", lambda soffice_path: None)
+    pool = pool_factory(size=1)
+    pdf_path = pool.convert_to_pdf(documents[0], str(tmp_path))
+    assert os.path.basename(pdf_path) == "doc_0.pdf"
+    [worker] = pool._idle
+    assert worker.mode == "cli" and worker._process is None
+    printed = tmp_path / "printed.jsonl"
+    monkeypatch.setenv("FAKE_SOFFICE_PRINT_LOG", str(printed))
+    pool.print_file(documents[1], "test-printer")
+    with open(printed, encoding="utf-8") as f:
+        assert json.loads(f.readline()) == {"printer": "test-printer", "file": documents[1]}
+
+
+def test_closed_pool_rejects_requests(documents, tmp_path, pool_factory):
+    pool = pool_factory(size=1)
+    pool.close()
+    with pytest.raises(OfficeError):
+        pool.convert_to_pdf(documents[0], str(tmp_path))
@@ -0,0 +1,32 @@
+import os
+import multiprocessing
+
+import pytest
+
+from printall import parallel
+from printall.watermark import WatermarkOptions
+
+
+def _fake_handler(path, options, log):
+    # 模拟工作进程在处理某个文件时被系统杀死
+    if "crash" in os.path.basename(path):
+        os._exit(1)
+    log(f"ok: {path}")
+    return True
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="需要 fork 让工作进程继承替换后的处理函数")
+def test_broken_pool_fails_only_in_flight_files(tmp_path, monkeypatch):
+    monkeypatch.setitem(parallel.WATERMARK_HANDLERS, "pdf", _fake_handler)
+    names = ["a.pdf", "b.pdf", "crash.pdf", "d.pdf", "e.pdf"]
+    for name in names:
+        (tmp_path / name).write_bytes(b"%PDF-1.4\n")
+    results = {}
+    # 内存预算极小: 同时只有一个文件在处理, 进程池损坏时处理中的只有 crash.pdf
+    counts = parallel.run_watermark_batch(
+        str(tmp_path), {"pdf"}, WatermarkOptions(), workers=2, memory_budget=1,
+        on_result=lambda result: results.__setitem__(os.path.basename(result.path), result.ok),
+    )
+    assert counts["total"] == len(names)
+    assert counts["failed"] == 1
+    assert results == {name: name != "crash.pdf" for name in names}
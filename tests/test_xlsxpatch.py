@@ -0,0 +1,182 @@
+import re
+import shutil
+import zipfile
+
+import pytest
+
+openpyxl = pytest.importorskip("openpyxl")
+from openpyxl.styles import Font
+
+from printall.xlsxpatch import patch_xlsx, HEADER_TEXT
+from printall.watermark import add_excel_watermark, WatermarkOptions
+
+
+_SHARED_STRINGS_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"
+_SHARED_STRINGS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings"
+
+
+def _use_shared_strings(path, sheet, refs):
+    """
+    openpyxl 把字符串都写成内联字符串, 把 sheet 中 refs 单元格改为共享字符串,
+    其余单元格保持内联字符串。
+    """
+    with zipfile.ZipFile(path) as zf:
+        entries = {info.filename: zf.read(info).decode("utf-8") for info in zf.infolist()}
+    strings = []
+
+    def share(match):
+        strings.append(match.group(3))
+        return f'<c r="{match.group(1)}"{match.group(2)} t="s"><v>{len(strings) - 1}</v></c>'
+
+    pattern = rf'<c r="({"|".join(refs)})"([^>]*?) t="inlineStr"><is><t>(.*?)</t></is></c>'
+    entries[sheet], count = re.subn(pattern, share, entries[sheet])
+    assert count == len(refs)
+    items = "".join(f"<si><t>{text}</t></si>" for text in strings)
+    entries["xl/sharedStrings.xml"] = (
+        '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+        f' count="{len(strings)}" uniqueCount="{len(strings)}">{items}</sst>'
+    )
+    entries["xl/_rels/workbook.xml.rels"] = entries["xl/_rels/workbook.xml.rels"].replace(
+        "</Relationships>",
+        f'<Relationship Id="rIdShared" Type="{_SHARED_STRINGS_REL}" Target="sharedStrings.xml"/></Relationships>',
+    )
+    entries["[Content_Types].xml"] = entries["[Content_Types].xml"].replace(
+        "</Types>", f'<Override PartName="/xl/sharedStrings.xml" ContentType="{_SHARED_STRINGS_TYPE}"/></Types>',
+    )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in entries.items():
+            zf.writestr(name, data)
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "数据, 一"
+    # 第 1 行: A1:B1 合并, C1 不存在
+    ws["A1"] = "标题"
+    ws.merge_cells("A1:B1")
+    ws["D1"] = "右"
+    ws["A2"] = "共享字符串"
+    ws["A2"].font = Font(bold=True)
+    ws["B2"] = 2
+    ws["D3"] = "inline"
+    ws.oddHeader.left.text = "左侧"
+    ws.oddFooter.center.text = "页脚"
+    wb.create_sheet("空")
+    colored = wb.create_sheet("S3")
+    colored["B2"] = 1
+    colored.sheet_properties.tabColor = "FF0000"
+    path = tmp_path / "src.xlsx"
+    wb.save(path)
+    # 第 1 行和 A2 用共享字符串, D3 仍是内联字符串
+    _use_shared_strings(path, "xl/worksheets/sheet1.xml", ["A1", "D1", "A2"])
+    return path
+
+
+def _source_cells(path):
+    """源文件中每个工作表实际存在的单元格"""
+    wb = openpyxl.load_workbook(path)
+    return {ws.title: {c.coordinate for row in ws.iter_rows() for c in row if c.has_style or c.value is not None}
+            for ws in wb.worksheets}
+
+
+def _describe(path, cells):
+    wb = openpyxl.load_workbook(path)
+    result = {}
+    for ws in wb.worksheets:
+        header = ws.oddHeader
+        sheet = {
+            "header": (header.left.text, header.center.text, header.right.text),
+            "footer": ws.oddFooter.center.text,
+            "tab": ws.sheet_properties.tabColor.rgb if ws.sheet_properties.tabColor else None,
+            "titles": ws.print_title_rows,
+            "merged": sorted(str(r) for r in ws.merged_cells.ranges),
+        }
+        for ref in sorted(cells[ws.title]):
+            c = ws[ref]
+            b, a = c.border, c.alignment
+            sheet[ref] = (
+                c.value, b.left.style, b.right.style, b.top.style, b.bottom.style,
+                a.horizontal, a.vertical, c.font.b,
+            )
+        result[ws.title] = sheet
+    return result
+
+
+def _both(workbook, tmp_path):
+    streamed, fallback = tmp_path / "streamed.xlsx", tmp_path / "openpyxl.xlsx"
+    shutil.copy(workbook, streamed)
+    shutil.copy(workbook, fallback)
+    patch_xlsx(str(streamed))
+    messages = []
+    assert add_excel_watermark(str(fallback), WatermarkOptions(excel_streaming=False), messages.append)
+    return streamed, fallback
+
+
+def test_streamed_output_matches_openpyxl(workbook, tmp_path):
+    streamed, fallback = _both(workbook, tmp_path)
+    cells = _source_cells(workbook)
+    assert _describe(streamed, cells) == _describe(fallback, cells)
+
+
+def test_existing_header_and_footer(workbook, tmp_path):
+    streamed, _ = _both(workbook, tmp_path)
+    sheet = _describe(streamed, _source_cells(workbook))["数据, 一"]
+    assert sheet["header"] == ("左侧", HEADER_TEXT, None)
+    assert sheet["footer"] == "页脚"
+    assert sheet["titles"] == "$1:$1"
+
+
+def test_existing_center_header_is_kept(workbook, tmp_path):
+    wb = openpyxl.load_workbook(workbook)
+    wb.worksheets[0].oddHeader.center.text = "已有页眉"
+    wb.save(workbook)
+    streamed, fallback = _both(workbook, tmp_path)
+    cells = _source_cells(workbook)
+    assert _describe(streamed, cells)["数据, 一"]["header"][1] == "已有页眉"
+    assert _describe(streamed, cells) == _describe(fallback, cells)
+
+
+def test_row_one_merged_and_missing_cells(workbook, tmp_path):
+    streamed, fallback = _both(workbook, tmp_path)
+    ws = openpyxl.load_workbook(streamed)["数据, 一"]
+    assert ws["A1"].border.left.style == "thin"
+    assert (ws["A1"].alignment.horizontal, ws["A1"].alignment.vertical) == ("center", "center")
+    # 合并区域中的 B1 与 openpyxl 一样只居中, 没有值所以没有边框
+    assert ws["B1"].border.left.style is None
+    assert ws["D1"].border.left.style == "thin"
+    # 不存在的单元格不会为了居中而创建 (openpyxl 会创建空的 C1), 打印效果相同
+    with zipfile.ZipFile(streamed) as zf:
+        assert 'r="C1"' not in zf.read("xl/worksheets/sheet1.xml").decode("utf-8")
+    assert openpyxl.load_workbook(fallback)["数据, 一"]["C1"].value is None
+
+
+def test_shared_and_inline_strings(workbook, tmp_path):
+    streamed, _ = _both(workbook, tmp_path)
+    with zipfile.ZipFile(workbook) as src, zipfile.ZipFile(streamed) as dst:
+        # 共享字符串表不需要修改, 原样复制
+        assert src.read("xl/sharedStrings.xml") == dst.read("xl/sharedStrings.xml")
+        sheet = dst.read("xl/worksheets/sheet1.xml").decode("utf-8")
+    assert re.search(r'<c r="D3"[^>]* t="inlineStr"[^>]*><is><t>inline</t></is></c>', sheet)
+    ws = openpyxl.load_workbook(streamed)["数据, 一"]
+    assert ws["A2"].value == "共享字符串" and ws["A2"].border.left.style == "thin" and ws["A2"].font.b
+    assert ws["D3"].value == "inline" and ws["D3"].border.left.style == "thin"
+
+
+def test_second_run_is_idempotent(workbook, tmp_path):
+    patch_xlsx(str(workbook))
+    with zipfile.ZipFile(workbook) as zf:
+        first = {info.filename: zf.read(info) for info in zf.infolist()}
+    patch_xlsx(str(workbook))
+    with zipfile.ZipFile(workbook) as zf:
+        second = {info.filename: zf.read(info) for info in zf.infolist()}
+    assert second == first
+
+
+def test_tab_colour_only_on_non_empty_sheets_without_one(workbook, tmp_path):
+    streamed, _ = _both(workbook, tmp_path)
+    sheets = _describe(streamed, _source_cells(workbook))
+    assert sheets["数据, 一"]["tab"] == "00d86100"
+    assert sheets["空"]["tab"] is None
+    assert sheets["S3"]["tab"] == "00FF0000"
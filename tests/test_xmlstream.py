@@ -0,0 +1,92 @@
+import io
+
+import pytest
+
+from printall import xmlstream
+from printall.xmlstream import XmlPatcher, StopParsing, escape_attr, escape_text, format_start, local_name
+
+
+class _Marker(XmlPatcher):
+    """给每个 <c> 设置 s="9", 在 <root> 末尾插入 <end/>, 把 <t> 的文字改为大写"""
+
+    def __init__(self, write):
+        super().__init__(write)
+        self._text_start = None
+
+    def start(self, name, attrs):
+        if local_name(name) == "c":
+            self.set_attr(self.position(), "s", "9")
+        elif local_name(name) == "t" and not self.is_empty_tag(self.position()):
+            self._text_start = self.tag_end(self.position())
+            self.begin_text()
+
+    def end(self, name):
+        if self._text_start is not None and local_name(name) == "t":
+            self.replace(self._text_start, self.position(), escape_text(self.end_text().upper()))
+            self._text_start = None
+        elif not self.stack:
+            self.insert(self.position(), "<end/>")
+
+
+def _patch(data, patcher=_Marker):
+    out = io.BytesIO()
+    patcher(out.write).feed(io.BytesIO(data))
+    return out.getvalue()
+
+
+SOURCE = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<x:root xmlns:x="urn:x">\n'
+    '  <!-- 注释 --><x:c r="A1"  s=\'1\'><x:t xml:space="preserve">a &amp; b</x:t></x:c>\n'
+    '  <x:c r="A2" t="a>b"/><x:t/>\n'
+    "</x:root>"
+).encode("utf-8")
+
+EXPECTED = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<x:root xmlns:x="urn:x">\n'
+    '  <!-- 注释 --><x:c r="A1"  s="9"><x:t xml:space="preserve">A &amp; B</x:t></x:c>\n'
+    '  <x:c r="A2" t="a>b" s="9"/><x:t/>\n'
+    "<end/></x:root>"
+).encode("utf-8")
+
+
+def test_patch_keeps_everything_else_byte_for_byte():
+    assert _patch(SOURCE) == EXPECTED
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 64])
+def test_patch_across_chunk_and_compact_boundaries(monkeypatch, chunk):
+    monkeypatch.setattr(xmlstream, "_READ_CHUNK", chunk)
+    monkeypatch.setattr(xmlstream, "_COMPACT_SIZE", 16)
+    monkeypatch.setattr(xmlstream, "_FLUSH_SIZE", 8)
+    assert _patch(SOURCE) == EXPECTED
+
+
+def test_large_document_is_streamed(monkeypatch):
+    monkeypatch.setattr(xmlstream, "_READ_CHUNK", 4096)
+    monkeypatch.setattr(xmlstream, "_COMPACT_SIZE", 4096)
+    rows = "".join(f'<c r="A{i}"><t>v{i}</t></c>' for i in range(5000))
+    result = _patch(f"<root>{rows}</root>".encode("utf-8"))
+    expected = "".join(f'<c r="A{i}" s="9"><t>V{i}</t></c>' for i in range(5000))
+    assert result == f"<root>{expected}<end/></root>".encode("utf-8")
+
+
+def test_stop_parsing_produces_no_output():
+    class Stop(XmlPatcher):
+        def start(self, name, attrs):
+            if name == "b":
+                raise StopParsing()
+
+    assert _patch(b"<a><b/></a>", Stop) == b""
+
+
+def test_non_utf8_encoding_is_rejected():
+    with pytest.raises(ValueError):
+        _patch('<?xml version="1.0" encoding="GBK"?><a/>'.encode("gbk"), XmlPatcher)
+
+
+def test_escaping():
+    assert escape_text("a<b & c>") == "a&lt;b &amp; c&gt;"
+    assert escape_attr('"x"\n\t') == "&quot;x&quot;&#10;&#9;"
+    assert format_start("x:c", {"r": "A1", "v": "<"}, empty=True) == '<x:c r="A1" v="&lt;"/>'
@@ -0,0 +1,111 @@
+import os
+import zipfile
+
+import pytest
+
+from printall.ziputil import ZipRewriter, ZipRewriteError, rewrite_zip, read_relationships
+
+
+def _raw_data(path, name):
+    """条目的压缩数据 (不解压)"""
+    with zipfile.ZipFile(path) as zf:
+        info = zf.getinfo(name)
+        with open(path, "rb") as f:
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = int.from_bytes(f.read(2), "little"), int.from_bytes(f.read(2), "little")
+            f.seek(name_length + extra_length, os.SEEK_CUR)
+            return f.read(info.compress_size)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    path = tmp_path / "src.zip"
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("a.xml", "<a>" + "x" * 10000 + "</a>")
+        zf.writestr("media/图片.bin", os.urandom(2048), compress_type=zipfile.ZIP_STORED)
+        zf.writestr("styles.xml", "<styles/>")
+        zf.writestr("b.xml", "<b/>")
+    return path
+
+
+def test_untouched_entries_are_copied_raw(archive, tmp_path):
+    dst = tmp_path / "dst.zip"
+
+    def rewrite(info, rewriter):
+        if info.filename != "b.xml":
+            return False
+        with rewriter.open(info) as out:
+            out.write(b"<b>")
+            out.write(b"new</b>")
+        return True
+
+    rewrite_zip(archive, dst, rewrite)
+    with zipfile.ZipFile(dst) as zf:
+        assert zf.testzip() is None
+        assert [info.filename for info in zf.infolist()] == ["a.xml", "media/图片.bin", "styles.xml", "b.xml"]
+        assert zf.read("b.xml") == b"<b>new</b>"
+        assert zf.getinfo("media/图片.bin").compress_type == zipfile.ZIP_STORED
+    for name in ("a.xml", "media/图片.bin", "styles.xml"):
+        assert _raw_data(dst, name) == _raw_data(archive, name)
+
+
+def test_deferred_entry_is_written_last(archive, tmp_path):
+    dst = tmp_path / "dst.zip"
+    deferred = {}
+
+    def rewrite(info, rewriter):
+        if info.filename == "styles.xml":
+            deferred["info"] = info
+            return True
+        return False
+
+    def finish(rewriter):
+        with rewriter.zip.open(deferred["info"]) as f, rewriter.open(deferred["info"]) as out:
+            out.write(f.read().replace(b"/>", b' count="1"/>'))
+
+    rewrite_zip(archive, dst, rewrite, finish)
+    with zipfile.ZipFile(dst) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist()[-1] == "styles.xml"
+        assert zf.read("styles.xml") == b'<styles count="1"/>'
+        assert len(zf.namelist()) == 4
+
+
+def test_failed_rewrite_removes_partial_output(archive, tmp_path):
+    dst = tmp_path / "dst.zip"
+
+    def rewrite(info, rewriter):
+        if info.filename == "styles.xml":
+            raise ValueError("boom")
+        return False
+
+    with pytest.raises(ValueError):
+        rewrite_zip(archive, dst, rewrite)
+    assert not dst.exists()
+
+
+def test_duplicate_entry_is_rejected(archive, tmp_path):
+    with pytest.raises(ZipRewriteError):
+        with ZipRewriter(archive, tmp_path / "dst.zip") as rewriter:
+            info = rewriter.infolist()[0]
+            rewriter.copy(info)
+            rewriter.copy(info)
+
+
+def test_read_relationships_resolves_targets(tmp_path):
+    path = tmp_path / "rels.zip"
+    rel_ns = "http://schemas.openxmlformats.org/package/2006/relationships"
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("xl/_rels/workbook.xml.rels", (
+            f'<Relationships xmlns="{rel_ns}">'
+            '<Relationship Id="rId1" Type="t/worksheet" Target="worksheets/sheet1.xml"/>'
+            '<Relationship Id="rId2" Type="t/styles" Target="/xl/styles.xml"/>'
+            '<Relationship Id="rId3" Type="t/hyperlink" Target="http://example.com" TargetMode="External"/>'
+            "</Relationships>"
+        ))
+    with zipfile.ZipFile(path) as zf:
+        assert read_relationships(zf, "xl/workbook.xml") == {
+            "rId1": ("t/worksheet", "xl/worksheets/sheet1.xml"),
+            "rId2": ("t/styles", "xl/styles.xml"),
+        }
+        assert read_relationships(zf, "") == {}
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# tools/bench_corpus.py
+"""
+基准测试用的合成文件集。
+
+相同的 --scale 和 --seed 总是生成完全相同的文件 (zip 内的时间戳、文档属性中的
+日期都固定), corpus.json 中记录每个文件的 SHA-256 和整体指纹,
+tools/bench_suite.py 据此判断两次结果是否在同一批文件上测得。
+
+目录结构:
+    word/    .docx: 没有页眉 / 页眉段落为空 / 页眉已有文字, 部分嵌入图片
+    excel/   .xlsx: 多个工作表 (其中一个为空), 行数按规模配置
+    pic/     .jpg / .png / .bmp, 多种像素数
+    pdf/     1 页到 1000 页的 PDF
+    print/   页数检查用的 .docx 和 .pdf
+
+用法:
+    python tools/bench_corpus.py                    # 生成 small 规模到 .bench_corpus/small
+    python tools/bench_corpus.py --scale medium --out /tmp/corpus
+"""
+import os
+import io
+import sys
+import json
+import random
+import shutil
+import hashlib
+import zipfile
+import argparse
+import datetime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CORPUS_DIR = os.path.join(REPO_DIR, ".bench_corpus")
+
+# 文件集格式变化时加一, 旧的文件集会重新生成
+CORPUS_VERSION = 1
+
+SCALES = {
+    "small": {
+        "docx": 6, "docx_paragraphs": 200, "docx_images": 1,
+        "xlsx": 2, "xlsx_sheets": 3, "xlsx_rows": 2000,
+        "megapixels": (1, 4), "pdf_pages": (1, 10, 100),
+        "print_docx": 3,
+    },
+    "medium": {
+        "docx": 9, "docx_paragraphs": 2000, "docx_images": 4,
+        "xlsx": 3, "xlsx_sheets": 3, "xlsx_rows": 20000,
+        "megapixels": (1, 4, 12), "pdf_pages": (1, 10, 100, 1000),
+        "print_docx": 6,
+    },
+    "large": {
+        "docx": 12, "docx_paragraphs": 5000, "docx_images": 8,
+        "xlsx": 3, "xlsx_sheets": 4, "xlsx_rows": 200000,
+        "megapixels": (1, 4, 12, 24), "pdf_pages": (1, 10, 100, 1000, 1000),
+        "print_docx": 12,
+    },
+}
+
+# zip 条目时间和文档属性中的日期, 保证多次生成的字节相同
+FIXED_ZIP_TIME = (2020, 1, 1, 0, 0, 0)
+FIXED_DATE = datetime.datetime(2020, 1, 1)
+
+WORDS = (
+    "打印", "文件", "水印", "页眉", "表格", "报告", "季度", "预算", "合同", "附件",
+    "invoice", "summary", "total", "report", "draft", "review", "budget", "page",
+)
+
+
+def _image(width, height, rng):
+    """确定性的测试图片: 渐变背景加随机色块, 压缩率介于照片和纯色图之间"""
+    from PIL import Image, ImageDraw
+
+    gradient = Image.linear_gradient("L")
+    red = gradient.resize((width, height))
+    green = gradient.rotate(90).resize((width, height))
+    blue = gradient.rotate(45).resize((width, height))
+    image = Image.merge("RGB", (red, green, blue))
+    draw = ImageDraw.Draw(image)
+    for _ in range(60):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1 = min(width, x0 + rng.randrange(1, max(2, width // 4)))
+        y1 = min(height, y0 + rng.randrange(1, max(2, height // 4)))
+        color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        if rng.random() < 0.5:
+            draw.rectangle((x0, y0, x1, y1), fill=color)
+        else:
+            draw.ellipse((x0, y0, x1, y1), fill=color)
+    return image
+
+
+def _size_for(megapixels):
+    """4:3 的宽高"""
+    height = int((megapixels * 1_000_000 * 3 / 4) ** 0.5)
+    return height * 4 // 3, height
+
+
+def _sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _normalize_zip(path):
+    """固定 zip 条目时间和 docProps/core.xml 中的日期"""
+    import re
+
+    stamp = FIXED_DATE.strftime("%Y-%m-%dT%H:%M:%SZ")
+    with zipfile.ZipFile(path) as src:
+        entries = [(info, src.read(info)) for info in src.infolist()]
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as dst:
+        for info, data in entries:
+            if info.filename == "docProps/core.xml":
+                data = re.sub(
+                    rb"(<dcterms:(?:created|modified)[^>]*>)[^<]*(<)",
+                    lambda m: m.group(1) + stamp.encode() + m.group(2),
+                    data,
+                )
+            dst.writestr(zipfile.ZipInfo(info.filename, FIXED_ZIP_TIME), data, zipfile.ZIP_DEFLATED)
+
+
+def make_docx(path, paragraphs, images, header, rng):
+    """header: None (没有页眉), "empty" (页眉段落为空) 或 "text" (页眉已有文字)"""
+    import docx
+    from docx.shared import Inches
+
+    document = docx.Document()
+    document.core_properties.created = FIXED_DATE
+    document.core_properties.modified = FIXED_DATE
+    if header == "empty":
+        document.sections[0].header.paragraphs[0].text = ""
+    elif header == "text":
+        document.sections[0].header.paragraphs[0].text = "已有页眉"
+    document.add_heading(_sentence(rng, 4), level=1)
+    for index in range(paragraphs):
+        document.add_paragraph(_sentence(rng, rng.randrange(8, 40)))
+        if images and index % max(1, paragraphs // images) == 0:
+            buffer = io.BytesIO()
+            _image(1600, 1200, rng).save(buffer, "PNG")
+            buffer.seek(0)
+            document.add_picture(buffer, width=Inches(5))
+            images -= 1
+    document.save(path)
+    _normalize_zip(path)
+
+
+def make_xlsx(path, sheets, rows, rng):
+    import openpyxl
+
+    workbook = openpyxl.Workbook(write_only=True)
+    workbook.properties.created = FIXED_DATE
+    workbook.properties.modified = FIXED_DATE
+    for index in range(sheets):
+        sheet = workbook.create_sheet(f"数据{index + 1}")
+        sheet.append(["编号", "名称", "数量", "单价", "金额", "备注"])
+        for row in range(rows):
+            quantity = rng.randrange(1, 500)
+            price = round(rng.uniform(1, 1000), 2)
+            note = _sentence(rng, 3) if rng.random() < 0.3 else None
+            sheet.append([row + 1, rng.choice(WORDS), quantity, price, round(quantity * price, 2), note])
+    workbook.create_sheet("空白")
+    workbook.save(path)
+    _normalize_zip(path)
+
+
+def make_pdf(path, pages, rng):
+    import fitz
+
+    document = fitz.open()
+    for number in range(pages):
+        page = document.new_page(width=595, height=842)
+        y = 72
+        for _ in range(30):
+            page.insert_text((72, y), f"{number + 1:04d} {_sentence(rng, 8)}", fontsize=10)
+            y += 24
+    document.set_metadata({"title": os.path.basename(path), "producer": "printall-benchmarks"})
+    document.save(path, garbage=3, deflate=True, no_new_id=True)
+    document.close()
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def generate(out_dir, scale="small", seed=1234):
+    """生成文件集, 返回 manifest (同时写入 out_dir/corpus.json)"""
+    config = SCALES[scale]
+    rng = random.Random(seed)
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    for sub in ("word", "excel", "pic", "pdf", "print"):
+        os.makedirs(os.path.join(out_dir, sub))
+
+    header_kinds = (None, "empty", "text")
+    for index in range(config["docx"]):
+        header = header_kinds[index % len(header_kinds)]
+        name = f"doc_{index + 1:02d}_{header or 'noheader'}.docx"
+        images = config["docx_images"] if index % 2 == 0 else 0
+        make_docx(os.path.join(out_dir, "word", name), config["docx_paragraphs"], images, header, rng)
+
+    for index in range(config["xlsx"]):
+        make_xlsx(
+            os.path.join(out_dir, "excel", f"book_{index + 1:02d}.xlsx"),
+            config["xlsx_sheets"], config["xlsx_rows"], rng,
+        )
+
+    for megapixels in config["megapixels"]:
+        image = _image(*_size_for(megapixels), rng)
+        base = os.path.join(out_dir, "pic", f"img_{megapixels:02d}mp")
+        image.save(base + ".jpg", "JPEG", quality=90)
+        image.save(base + ".png", "PNG")
+        image.save(base + ".bmp", "BMP")
+
+    for index, pages in enumerate(config["pdf_pages"]):
+        make_pdf(os.path.join(out_dir, "pdf", f"pdf_{index + 1:02d}_{pages}p.pdf"), pages, rng)
+
+    for index in range(config["print_docx"]):
+        make_docx(os.path.join(out_dir, "print", f"print_{index + 1:02d}.docx"), 60, 0, None, rng)
+    for index, pages in enumerate(config["pdf_pages"]):
+        make_pdf(os.path.join(out_dir, "print", f"print_{index + 1:02d}_{pages}p.pdf"), pages, rng)
+
+    files = {}
+    for root, _, names in os.walk(out_dir):
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, out_dir).replace(os.sep, "/")
+            if rel != "corpus.json":
+                files[rel] = {"size": os.path.getsize(path), "sha256": _file_digest(path)}
+    fingerprint = hashlib.sha256(
+        json.dumps(files, sort_keys=True).encode("utf-8")
+    ).hexdigest()[:16]
+    manifest = {
+        "version": CORPUS_VERSION,
+        "scale": scale,
+        "seed": seed,
+        "fingerprint": fingerprint,
+        "files": dict(sorted(files.items())),
+    }
+    with open(os.path.join(out_dir, "corpus.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def load_or_generate(out_dir, scale="small", seed=1234):
+    """已有同一规模和种子的文件集且文件完整时直接使用, 否则重新生成"""
+    try:
+        with open(os.path.join(out_dir, "corpus.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if (manifest.get("version"), manifest.get("scale"), manifest.get("seed")) == (CORPUS_VERSION, scale, seed):
+            if all(
+                os.path.getsize(os.path.join(out_dir, rel)) == info["size"]
+                for rel, info in manifest["files"].items()
+            ):
+                return manifest
+    except (OSError, ValueError, KeyError):
+        pass
+    return generate(out_dir, scale, seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成 PrintALL 基准测试文件集")
+    parser.add_argument("--scale", choices=list(SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", default=None, help="输出目录 (默认 .bench_corpus/<规模>)")
+    args = parser.parse_args()
+    out_dir = args.out or os.path.join(DEFAULT_CORPUS_DIR, args.scale)
+    manifest = generate(out_dir, args.scale, args.seed)
+    total = sum(info["size"] for info in manifest["files"].values())
+    print(f"{len(manifest['files'])} 个文件, {total / 1024 / 1024:.1f} MB, 指纹 {manifest['fingerprint']}: {out_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
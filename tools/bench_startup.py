@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# tools/bench_startup.py
+"""
+启动时间基准: 测量从启动解释器到主窗口第一次绘制完成 (time-to-first-window) 的耗时。
+
+每轮在新的子进程中导入 app.py、创建 PrintALLApp 并执行一次 root.update(),
+取多轮的中位数。没有图形界面 (例如 Linux 服务器上没有 $DISPLAY) 时自动退回到
+只测量 `import app` 的耗时。
+
+以下情况返回非 0 退出码, 可以放在构建流程中防止启动时间回退:
+  - 启动后已经加载了重量级依赖 (PyMuPDF、python-docx、openpyxl、PIL、pypdf、pywin32);
+  - 中位数超过 --max-ms;
+  - 中位数比 --baseline 中记录的值慢了 --tolerance 以上。
+
+用法:
+    python tools/bench_startup.py --runs 7
+    python tools/bench_startup.py --write-baseline startup.json
+    python tools/bench_startup.py --baseline startup.json --tolerance 0.2
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 子进程: 输出一行 JSON 后立即退出
+PROBE = r"""
+import os, sys, json
+sys.path.insert(0, {repo!r})
+mode = {mode!r}
+if mode == "window":
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        print(json.dumps({{"no_display": True}}), flush=True)
+        os._exit(0)
+    root.withdraw()
+    import app
+    app.PrintALLApp(root)
+    root.deiconify()
+    root.update()
+else:
+    import app
+from printall.deps import HEAVY_MODULES
+print(json.dumps({{"heavy": [m for m in HEAVY_MODULES if m in sys.modules]}}), flush=True)
+os._exit(0)
+"""
+
+
+def run_once(mode):
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE.format(repo=REPO_DIR, mode=mode)],
+        cwd=REPO_DIR,
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+    )
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"启动探测失败:\n{proc.stderr}")
+    # 最后一行是探测结果, 前面可能有应用自身的输出
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return elapsed_ms, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PrintALL 启动时间基准")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--mode", choices=["auto", "window", "import"], default="auto")
+    parser.add_argument("--max-ms", type=float, default=None, help="中位数上限 (毫秒)")
+    parser.add_argument("--baseline", default=None, help="与之比较的基准文件 (JSON)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="允许比基准慢的比例")
+    parser.add_argument("--write-baseline", default=None, help="把本次结果写入基准文件")
+    args = parser.parse_args()
+
+    mode = "window" if args.mode == "auto" else args.mode
+    # 第一轮只用于预热磁盘缓存和 .pyc, 不计入结果
+    _, result = run_once(mode)
+    if result.get("no_display"):
+        if args.mode == "window":
+            print("没有可用的图形界面, 无法测量窗口启动时间。", file=sys.stderr)
+            return 2
+        mode = "import"
+        run_once(mode)
+
+    timings, heavy = [], set()
+    for _ in range(args.runs):
+        elapsed_ms, result = run_once(mode)
+        timings.append(elapsed_ms)
+        heavy.update(result["heavy"])
+    median_ms = statistics.median(timings)
+
+    report = {
+        "mode": mode,
+        "runs": args.runs,
+        "median_ms": round(median_ms, 1),
+        "min_ms": round(min(timings), 1),
+        "max_ms": round(max(timings), 1),
+        "heavy_modules_loaded": sorted(heavy),
+        "python": sys.version.split()[0],
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    failures = []
+    if heavy:
+        failures.append(f"启动时加载了重量级依赖: {', '.join(sorted(heavy))}")
+    if args.max_ms is not None and median_ms > args.max_ms:
+        failures.append(f"启动中位数 {median_ms:.0f} ms 超过上限 {args.max_ms:.0f} ms")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("mode") != mode:
+            failures.append(f"基准的测量方式 ({baseline.get('mode')}) 与本次 ({mode}) 不同")
+        else:
+            limit = baseline["median_ms"] * (1 + args.tolerance)
+            if median_ms > limit:
+                failures.append(
+                    f"启动中位数 {median_ms:.0f} ms 比基准 {baseline['median_ms']:.0f} ms"
+                    f" 慢了 {args.tolerance:.0%} 以上"
+                )
+    if args.write_baseline:
+        with open(args.write_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for failure in failures:
+        print(f"❌ {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# tools/bench_suite.py
+"""
+处理流程基准: 在 tools/bench_corpus.py 生成的固定文件集上测量各处理函数的吞吐量和峰值内存。
+
+每个基准在新的子进程中运行 (峰值 RSS 互不影响), 依赖在计时前导入;
+每轮处理的是文件集的一份新副本, 复制不计入耗时。取多轮耗时的中位数。
+页数检查使用 tools/fake_soffice.py 代替 LibreOffice, 因此可以在 Linux 上运行,
+测得的是页数分级、转换缓存和工作进程池本身的开销。
+
+以下情况返回非 0 退出码:
+  - 有文件处理失败;
+  - 某项吞吐量比 --baseline 中记录的值低了 --tolerance 以上, 或峰值内存高了 --tolerance 以上;
+  - picture 基准中, 按缩小分辨率解码算出的水印区域亮度与全分辨率相差超过 --brightness-tolerance;
+  - 基准文件使用的文件集 (指纹) 与本次不同。
+
+用法:
+    python tools/bench_suite.py
+    python tools/bench_suite.py --scale medium --only word excel --repeat 5
+    python tools/bench_suite.py --write-baseline bench.json
+    python tools/bench_suite.py --baseline bench.json --tolerance 0.2
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TOOLS_DIR)
+FAKE_SOFFICE = os.path.join(TOOLS_DIR, "fake_soffice.py")
+
+# 名称 -> (文件集中的子目录, 说明)
+BENCHMARKS = {
+    "word": ("word", "add_word_watermark (流式修改页眉)"),
+    "word-python-docx": ("word", "add_word_watermark (python-docx)"),
+    "excel": ("excel", "add_excel_watermark (流式修改)"),
+    "excel-openpyxl": ("excel", "add_excel_watermark (openpyxl)"),
+    "picture": ("pic", "add_picture_watermark"),
+    "pdf": ("pdf", "add_pdf_watermark"),
+    "page-count": ("print", "PrintEngine.page_count (假 soffice)"),
+    "image-merge": ("pic", "PrintEngine.merge_images"),
+}
+
+# 缩放解码的亮度分析与全分辨率结果允许的最大差值 (0-255)
+BRIGHTNESS_TOLERANCE = 2.0
+
+_HEAVY_IMPORTS = ("docx", "openpyxl", "PIL.Image", "fitz", "pypdf")
+
+# config.CHINESE_FONT_PATH 是 Windows 路径, 在其他系统上改用这些目录中找到的字体
+_FONT_DIRS = ("/usr/share/fonts", "/usr/local/share/fonts", "/Library/Fonts", "/System/Library/Fonts")
+
+
+def find_font():
+    sys.path.insert(0, REPO_DIR)
+    from printall.config import CHINESE_FONT_PATH, CHINESE_FONT_AVAILABLE
+
+    if CHINESE_FONT_AVAILABLE:
+        return CHINESE_FONT_PATH
+    candidates = []
+    for font_dir in _FONT_DIRS:
+        for root, _, names in os.walk(font_dir):
+            candidates.extend(os.path.join(root, n) for n in names if n.lower().endswith((".ttf", ".ttc", ".otf")))
+    # 优先使用中文字体, 与实际使用时的字形数量接近
+    candidates.sort(key=lambda p: (not any(k in p.lower() for k in ("cjk", "wqy", "hei", "song")), p))
+    return candidates[0] if candidates else None
+
+
+def _peak_rss_mb(children=False):
+    """本进程 (或已结束的子进程中) 的峰值 RSS (MB), 不支持的平台 (Windows) 返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位为 KB, macOS 上为字节
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_child(name, work_dir, soffice_path, font_path):
+    """在子进程中执行一个基准, 结果以一行 JSON 输出到标准输出"""
+    import importlib
+
+    sys.path.insert(0, REPO_DIR)
+    for module in _HEAVY_IMPORTS:
+        importlib.import_module(module)
+    from printall import watermark
+    from printall.watermark import (
+        WatermarkOptions, add_word_watermark, add_excel_watermark,
+        add_picture_watermark, add_pdf_watermark, picture_watermark_brightness,
+    )
+    from printall.printing import PrintEngine
+    from printall.convcache import ConversionCache
+
+    sub_dir = os.path.join(work_dir, BENCHMARKS[name][0])
+    files = sorted(os.path.join(sub_dir, f) for f in os.listdir(sub_dir))
+    total_bytes = sum(os.path.getsize(f) for f in files)
+    if font_path:
+        watermark.CHINESE_FONT_PATH = font_path
+        watermark.CHINESE_FONT_AVAILABLE = True
+    messages = []
+    log = messages.append
+    failed = 0
+    brightness_max_diff = None
+    if name == "picture":
+        # 在处理 (改写图片) 之前核对缩放解码的亮度误差, 不计入耗时
+        brightness_max_diff = max((
+            abs(picture_watermark_brightness(f, WatermarkOptions())
+                - picture_watermark_brightness(f, WatermarkOptions(), reduced=False))
+            for f in files
+        ), default=0.0)
+
+    start = time.perf_counter()
+    if name in ("word", "word-python-docx"):
+        options = WatermarkOptions(word_streaming=name == "word")
+        failed = sum(not add_word_watermark(f, options, log) for f in files)
+    elif name in ("excel", "excel-openpyxl"):
+        options = WatermarkOptions(excel_streaming=name == "excel")
+        failed = sum(not add_excel_watermark(f, options, log) for f in files)
+    elif name == "picture":
+        options = WatermarkOptions()
+        failed = sum(not add_picture_watermark(f, options, log) for f in files)
+    elif name == "pdf":
+        options = WatermarkOptions()
+        failed = sum(not add_pdf_watermark(f, options, log) for f in files)
+    elif name == "page-count":
+        engine = PrintEngine(soffice_path, ConversionCache(os.path.join(work_dir, "cache")))
+        try:
+            failed = sum(engine.page_count(f, log)[0] is None for f in files)
+        finally:
+            engine.close()
+    elif name == "image-merge":
+        output_path = os.path.join(work_dir, "merged.pdf")
+        # 使用空的缓存目录, 测量的是实际合并而不是命中缓存
+        engine = PrintEngine(conversion_cache=ConversionCache(os.path.join(work_dir, "cache")))
+        if engine.merge_images(files, output_path, 100, log) is None:
+            failed = len(files)
+    seconds = time.perf_counter() - start
+
+    print(json.dumps({
+        "seconds": seconds,
+        "files": len(files),
+        "bytes": total_bytes,
+        "failed": failed,
+        "errors": [m for m in messages if "❌" in m][:5],
+        "brightness_max_diff": brightness_max_diff,
+        "peak_rss_mb": _peak_rss_mb(),
+        "peak_rss_children_mb": _peak_rss_mb(children=True),
+    }, ensure_ascii=False), flush=True)
+
+
+def run_once(name, corpus_dir, soffice_path, font_path):
+    sub = BENCHMARKS[name][0]
+    with tempfile.TemporaryDirectory(prefix="printall-bench-") as work_dir:
+        shutil.copytree(os.path.join(corpus_dir, sub), os.path.join(work_dir, sub))
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", name, work_dir,
+             "--soffice", soffice_path, "--font", font_path or ""],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+        )
+    if proc.returncode != 0:
+        raise RuntimeError(f"基准 {name} 运行失败:\n{proc.stderr}")
+    # 最后一行是结果, 前面可能有依赖库自身的输出
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def run_benchmark(name, corpus_dir, soffice_path, font_path, repeat):
+    runs = [run_once(name, corpus_dir, soffice_path, font_path) for _ in range(repeat)]
+    seconds = statistics.median(r["seconds"] for r in runs)
+    first = runs[0]
+    rss = [r["peak_rss_mb"] for r in runs if r["peak_rss_mb"] is not None]
+    children = [r["peak_rss_children_mb"] for r in runs if r["peak_rss_children_mb"] is not None]
+    return {
+        "description": BENCHMARKS[name][1],
+        "files": first["files"],
+        "mb": round(first["bytes"] / 1024 / 1024, 2),
+        "median_s": round(seconds, 3),
+        "min_s": round(min(r["seconds"] for r in runs), 3),
+        "files_per_s": round(first["files"] / seconds, 2) if seconds else None,
+        "mb_per_s": round(first["bytes"] / 1024 / 1024 / seconds, 2) if seconds else None,
+        "peak_rss_mb": max(rss) if rss else None,
+        "peak_rss_children_mb": max(children) if children else None,
+        "failed": max(r["failed"] for r in runs),
+        "errors": first["errors"],
+        "brightness_max_diff": None if first["brightness_max_diff"] is None else round(first["brightness_max_diff"], 3),
+    }
+
+
+def compare(results, baseline, tolerance):
+    failures = []
+    for name, result in results.items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if not base:
+            continue
+        if base.get("files_per_s") and result["files_per_s"] is not None:
+            limit = base["files_per_s"] * (1 - tolerance)
+            if result["files_per_s"] < limit:
+                failures.append(
+                    f"{name}: 吞吐量 {result['files_per_s']} 文件/秒 比基准 {base['files_per_s']}"
+                    f" 低了 {tolerance:.0%} 以上"
+                )
+        if base.get("peak_rss_mb") and result["peak_rss_mb"] is not None:
+            limit = base["peak_rss_mb"] * (1 + tolerance)
+            if result["peak_rss_mb"] > limit:
+                failures.append(
+                    f"{name}: 峰值内存 {result['peak_rss_mb']} MB 比基准 {base['peak_rss_mb']} MB"
+                    f" 高了 {tolerance:.0%} 以上"
+                )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PrintALL 处理流程基准")
+    parser.add_argument("--child", nargs=2, metavar=("NAME", "WORK_DIR"), help=argparse.SUPPRESS)
+    parser.add_argument("--scale", default="small", help="文件集规模: small / medium / large")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--corpus", default=None, help="文件集目录 (默认 .bench_corpus/<规模>)")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=None, help="只运行这些基准")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--soffice", default=FAKE_SOFFICE, help="页数检查使用的 soffice (默认假 soffice)")
+    parser.add_argument("--font", default=None, help="水印字体 (默认 config 中的中文字体, 不存在时自动查找)")
+    parser.add_argument("--baseline", default=None, help="与之比较的基准文件 (JSON)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="允许比基准差的比例")
+    parser.add_argument(
+        "--brightness-tolerance", type=float, default=BRIGHTNESS_TOLERANCE,
+        help="picture 基准中缩放解码与全分辨率的水印区域亮度允许的最大差值 (0-255)",
+    )
+    parser.add_argument("--write-baseline", default=None, help="把本次结果写入基准文件")
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child[0], args.child[1], args.soffice, args.font)
+        return 0
+
+    sys.path.insert(0, TOOLS_DIR)
+    import bench_corpus
+
+    if args.scale not in bench_corpus.SCALES:
+        parser.error(f"未知的规模: {args.scale}")
+    corpus_dir = args.corpus or os.path.join(bench_corpus.DEFAULT_CORPUS_DIR, args.scale)
+    manifest = bench_corpus.load_or_generate(corpus_dir, args.scale, args.seed)
+
+    font_path = args.font or find_font()
+    results = {}
+    for name in args.only or BENCHMARKS:
+        print(f"运行 {name} ...", file=sys.stderr, flush=True)
+        results[name] = run_benchmark(name, corpus_dir, args.soffice, font_path, args.repeat)
+
+    report = {
+        "scale": args.scale,
+        "corpus_fingerprint": manifest["fingerprint"],
+        "repeat": args.repeat,
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "font": font_path,
+        "benchmarks": results,
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    failures = [
+        f"{name}: {result['failed']} 个文件处理失败 {result['errors']}"
+        for name, result in results.items() if result["failed"]
+    ]
+    failures.extend(
+        f"{name}: 缩放解码的水印区域亮度与全分辨率相差 {result['brightness_max_diff']:.2f},"
+        f" 超过 {args.brightness_tolerance}"
+        for name, result in results.items()
+        if (result["brightness_max_diff"] or 0) > args.brightness_tolerance
+    )
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("corpus_fingerprint") != manifest["fingerprint"]:
+            failures.append(
+                f"基准的文件集 ({baseline.get('scale')}, {baseline.get('corpus_fingerprint')})"
+                f" 与本次 ({args.scale}, {manifest['fingerprint']}) 不同"
+            )
+        else:
+            failures.extend(compare(results, baseline, args.tolerance))
+    if args.write_baseline:
+        with open(args.write_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for failure in failures:
+        print(f"❌ {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# tools/fake_soffice.py
+"""
+假的 soffice, 用于在没有安装 LibreOffice 的 Linux 机器上测试转换/打印流程。
+
+把 "LibreOffice 路径" 指向本脚本即可 (需要可执行权限)。支持的参数:
+    --version
+    --convert-to pdf --outdir <目录> <文件>   生成空白页 PDF
+    --pt <打印机> <文件>                      把打印请求追加到 FAKE_SOFFICE_PRINT_LOG
+
+环境变量:
+    FAKE_SOFFICE_DELAY       每次调用前等待的秒数, 模拟冷启动 (默认 0)
+    FAKE_SOFFICE_PAGES       生成的页数; 不设置时 .docx 读取 docProps/app.xml 中的页数, 否则为 1
+    FAKE_SOFFICE_PRINT_LOG   打印请求记录文件 (每行一个 JSON)
+    FAKE_SOFFICE_CALL_LOG    每次调用的参数记录文件 (每行一个 JSON), 用于统计转换次数
+"""
+import os
+import re
+import sys
+import json
+import time
+import zipfile
+
+VERSION = "LibreOffice 7.6.4.1 fake-soffice"
+
+
+def blank_pdf(pages):
+    """生成指定页数的空白 A4 PDF (手写最小结构, 不依赖第三方库)"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join("%d 0 R" % (3 + i) for i in range(pages))
+    objects.append(("<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages)).encode())
+    for _ in range(pages):
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] >>")
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def page_count_for(src):
+    if os.environ.get("FAKE_SOFFICE_PAGES"):
+        return int(os.environ["FAKE_SOFFICE_PAGES"])
+    try:
+        with zipfile.ZipFile(src) as zf:
+            app_xml = zf.read("docProps/app.xml").decode("utf-8", "ignore")
+        match = re.search(r"<(?:\w+:)?Pages>(\d+)<", app_xml)
+        if match:
+            return max(1, int(match.group(1)))
+    except (OSError, KeyError, zipfile.BadZipFile):
+        pass
+    return 1
+
+
+def append_log(env_name, payload):
+    path = os.environ.get(env_name)
+    if path:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(payload, ensure_ascii=False) + "\n")
+
+
+def main(argv):
+    append_log("FAKE_SOFFICE_CALL_LOG", {"argv": argv, "time": time.time()})
+    delay = float(os.environ.get("FAKE_SOFFICE_DELAY", "0") or 0)
+    if delay:
+        time.sleep(delay)
+    args = [a for a in argv if not a.startswith("-env:")]
+    if "--version" in args:
+        print(VERSION)
+        return 0
+    if "--convert-to" in args:
+        outdir = args[args.index("--outdir") + 1] if "--outdir" in args else os.getcwd()
+        src = args[-1]
+        if not os.path.isfile(src):
+            print("Error: source file could not be loaded", file=sys.stderr)
+            return 1
+        target = os.path.join(outdir, os.path.splitext(os.path.basename(src))[0] + ".pdf")
+        with open(target, "wb") as f:
+            f.write(blank_pdf(page_count_for(src)))
+        print("convert %s -> %s using filter : writer_pdf_Export" % (src, target))
+        return 0
+    if "--pt" in args:
+        printer = args[args.index("--pt") + 1]
+        src = args[-1]
+        if not os.path.isfile(src):
+            print("Error: source file could not be loaded", file=sys.stderr)
+            return 1
+        append_log("FAKE_SOFFICE_PRINT_LOG", {"printer": printer, "file": src})
+        return 0
+    print("fake soffice: unsupported arguments: %s" % " ".join(argv), file=sys.stderr)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))